@@ -1,52 +1,109 @@
 #!../.venv/bin/python
-import csv
-from utils.jira_utils import (fetch_custom_fields, query_issues_using_field, FILE_WRITE_MODE, JsonFieldNames,
-                              LOG_FETCH_FIELDS)
+import argparse
+from utils.issue_index import read_indexed_field_usage, update_issue_index
+from utils.jira_utils import (fetch_custom_fields, query_issues_using_field_exchange, run_exchanges, scan_field_usage,
+                              JIRA_CLIENT, JsonFieldNames, LOG_FETCH_FIELDS, POOL_SIZE)
+from utils.report_sink import REPORT_FORMAT_CSV, REPORT_FORMATS, open_report_sink
+from utils.run_metrics import METRICS, PHASE_FETCH, PHASE_QUERY
 
 # key global variables
-OUTPUT_CSV_FILENAME = "1_custom_field_usage_report.csv"
+OUTPUT_FILENAME_STEM = "1_custom_field_usage_report"
 HEADER_FIELD_NAMES = ["custom_field_id", "custom_field_name", "issues_using_field"]
 
+# command line arguments
+MODE_ARGUMENT = "--mode"
+MODE_INCREMENTAL = "incremental"
+MODE_INDEX = "index"
+MODE_QUERY = "query"
+MODE_SCAN = "scan"
+MODE_HELP = (f"'{MODE_QUERY}' runs one JQL count query per custom field; '{MODE_SCAN}' pages through all issues once "
+             f"and counts every field locally; '{MODE_INDEX}' reads the counts from the local issue index built by "
+             f"4_issue_field_index.py; '{MODE_INCREMENTAL}' first applies the issues changed since the index's last "
+             f"sync, then reads from it")
+FORMAT_ARGUMENT = "--format"
+FORMAT_HELP = ("format of the report file, named after the format; 'parquet' needs the optional pyarrow package "
+               "(default: %(default)s)")
+EVENT_LOOP_ARGUMENT = "--event-loop"
+EVENT_LOOP_HELP = (f"run the '{MODE_QUERY}' mode count queries as coroutines on one asyncio event loop (needs aiohttp) "
+                   f"instead of on worker threads")
+REFRESH_METADATA_ARGUMENT = "--refresh-metadata"
+REFRESH_METADATA_HELP = "ignore the local metadata cache and re-download the custom fields"
+RPS_ARGUMENT = "--rps"
+RPS_HELP = f"maximum number of '{MODE_QUERY}' mode count queries started per second (default: unlimited)"
+WORKERS_ARGUMENT = "--workers"
+WORKERS_HELP = f"number of '{MODE_QUERY}' mode count queries kept in flight at once (default: 1, serial)"
+
 # console log messages
 LOG_QUERY_FIELD_USAGE = "Querying usage for field '{field_name}' ({clause_name})..."
+LOG_SCAN_FIELD_USAGE = "Scanning issues for usage of {count} custom fields..."
 LOG_WRITE_SUCCESS = "Custom field usage data has been written to {filename} successfully."
 
 
-def write_field_usage_to_csv(field_usage_data):
+def query_field_usage_exchange(field):
     """
-    Write the custom field usage data to a CSV file.
-    :param field_usage_data: List of dictionaries containing field usage data.
-    :return: None
+    Exchange querying the number of issues using a single custom field across all projects.
+    :param field: Custom field (as a dictionary) from fetch_custom_fields.
+    :return: Exchange generator returning the number of issues using the field.
     """
-    with open(OUTPUT_CSV_FILENAME, FILE_WRITE_MODE) as csvfile:
-        csv_writer = csv.writer(csvfile)
-        csv_writer.writerow(HEADER_FIELD_NAMES)
-        for field in field_usage_data:
-            csv_writer.writerow([field[JsonFieldNames.ID], field[JsonFieldNames.NAME], field[JsonFieldNames.USAGE]])
+    clause_name = field[JsonFieldNames.CLAUSE_NAMES][0]
+    schema_type = field.get(JsonFieldNames.SCHEMA, {}).get(JsonFieldNames.TYPE, JsonFieldNames.UNKNOWN)
+    print(LOG_QUERY_FIELD_USAGE.format(field_name=field[JsonFieldNames.NAME], clause_name=clause_name))
+    return (yield from query_issues_using_field_exchange(clause_name, schema_type))
+
 
-    print(LOG_WRITE_SUCCESS.format(filename=OUTPUT_CSV_FILENAME))
+def parse_arguments():
+    """
+    Parse the command line arguments for the script.
+    :return: The parsed arguments namespace.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(MODE_ARGUMENT, choices=[MODE_QUERY, MODE_SCAN, MODE_INDEX, MODE_INCREMENTAL],
+                        default=MODE_QUERY, help=MODE_HELP)
+    parser.add_argument(FORMAT_ARGUMENT, choices=REPORT_FORMATS, default=REPORT_FORMAT_CSV, help=FORMAT_HELP)
+    parser.add_argument(EVENT_LOOP_ARGUMENT, action="store_true", help=EVENT_LOOP_HELP)
+    parser.add_argument(REFRESH_METADATA_ARGUMENT, action="store_true", help=REFRESH_METADATA_HELP)
+    parser.add_argument(RPS_ARGUMENT, type=float, default=None, help=RPS_HELP)
+    parser.add_argument(WORKERS_ARGUMENT, type=int, default=1, help=WORKERS_HELP)
+    return parser.parse_args()
 
 
 def main():
     """
     The script processes custom fields data, queries for their usage in issues, and outputs the resulting data
-    to a CSV file. It fetches the custom fields, queries issues for each field's usage, and records the
-    information in a structured format.
+    to a report file (CSV by default). It fetches the custom fields, queries issues for each field's usage
+    (optionally several queries at once, counts them all from a single scan over the issues in scan mode, or reads
+    them from the local issue index in index mode), and writes each field's row to the report as soon as its usage
+    is known.
     :return: None
     """
+    arguments = parse_arguments()
+
     print(LOG_FETCH_FIELDS)
-    custom_fields = fetch_custom_fields()
-
-    field_usage_data = []
-    for field in custom_fields:
-        clause_name = field[JsonFieldNames.CLAUSE_NAMES][0]
-        schema_type = field.get(JsonFieldNames.SCHEMA, {}).get(JsonFieldNames.TYPE, JsonFieldNames.UNKNOWN)
-        print(LOG_QUERY_FIELD_USAGE.format(field_name=field[JsonFieldNames.NAME], clause_name=clause_name))
-        usage = query_issues_using_field(clause_name, schema_type)
-        field_usage_data.append({JsonFieldNames.ID: field[JsonFieldNames.ID], JsonFieldNames.NAME: field[
-            JsonFieldNames.NAME], JsonFieldNames.USAGE: usage})
-
-    write_field_usage_to_csv(field_usage_data)
+    with METRICS.phase(PHASE_FETCH):
+        custom_fields = fetch_custom_fields(arguments.refresh_metadata)
+
+    with METRICS.phase(PHASE_QUERY), open_report_sink(OUTPUT_FILENAME_STEM, HEADER_FIELD_NAMES,
+                                                      arguments.format) as report:
+        if arguments.mode == MODE_SCAN:
+            print(LOG_SCAN_FIELD_USAGE.format(count=len(custom_fields)))
+            scanned_usage = scan_field_usage(custom_fields)
+            usages = [scanned_usage[field[JsonFieldNames.ID]] for field in custom_fields]
+        elif arguments.mode in [MODE_INDEX, MODE_INCREMENTAL]:
+            if arguments.mode == MODE_INCREMENTAL:
+                update_issue_index(custom_fields)
+            indexed_usage = read_indexed_field_usage()
+            usages = [indexed_usage.get(field[JsonFieldNames.ID], 0) for field in custom_fields]
+        else:
+            # results come back in the same 'id' order as custom_fields, however many queries run at once
+            JIRA_CLIENT.set_pool_size(max(arguments.workers, POOL_SIZE))
+            usages = run_exchanges(map(query_field_usage_exchange, custom_fields), arguments.workers, arguments.rps,
+                                   arguments.event_loop)
+
+        # the query mode's results stream in while this loop consumes them, and go to the report in batches
+        for field, usage in zip(custom_fields, usages):
+            report.add([field[JsonFieldNames.ID], field[JsonFieldNames.NAME], usage])
+
+    print(LOG_WRITE_SUCCESS.format(filename=report.filename))
 
 
 if __name__ == "__main__":
@@ -1,10 +1,15 @@
 #!../.venv/bin/python
-import csv
-from utils.jira_utils import (fetch_custom_fields, fetch_projects, query_issues_using_field, FILE_WRITE_MODE,
-                              JsonFieldNames, LOG_FETCH_FIELDS)
+import argparse
+from itertools import product
+from utils.issue_index import read_indexed_field_usage, update_issue_index
+from utils.jira_utils import (fetch_custom_fields, fetch_projects, probe_jql_strategies,
+                              query_issues_using_field_exchange, run_exchanges, scan_field_usage_by_project,
+                              JIRA_CLIENT, JsonFieldNames, LOG_FETCH_FIELDS, POOL_SIZE, PROJECT)
+from utils.report_sink import REPORT_FORMAT_CSV, REPORT_FORMATS, open_report_sink
+from utils.run_metrics import METRICS, PHASE_FETCH, PHASE_QUERY
 
 # key global variables
-OUTPUT_CSV_FILENAME = "2_custom_field_usage_by_project.csv"
+OUTPUT_FILENAME_STEM = "2_custom_field_usage_by_project"
 HEADER_FIELD_NAMES = [
     "custom_field_id",
     "custom_field_name",
@@ -13,70 +18,127 @@ HEADER_FIELD_NAMES = [
     "issues_using_field"
 ]
 
+# command line arguments
+MODE_ARGUMENT = "--mode"
+MODE_INCREMENTAL = "incremental"
+MODE_INDEX = "index"
+MODE_QUERY = "query"
+MODE_SCAN = "scan"
+MODE_HELP = (f"'{MODE_QUERY}' runs one JQL count query per (custom field, project) pair; '{MODE_SCAN}' builds the "
+             f"whole matrix from one pass over all issues; '{MODE_INDEX}' reads it from the local issue index built by "
+             f"4_issue_field_index.py; '{MODE_INCREMENTAL}' first applies the issues changed since the index's last "
+             f"sync, then reads from it")
+FORMAT_ARGUMENT = "--format"
+FORMAT_HELP = ("format of the report file, named after the format; 'parquet' needs the optional pyarrow package "
+               "(default: %(default)s)")
+EVENT_LOOP_ARGUMENT = "--event-loop"
+EVENT_LOOP_HELP = (f"run the '{MODE_QUERY}' mode count queries as coroutines on one asyncio event loop (needs aiohttp) "
+                   f"instead of on worker threads")
+PROBE_JQL_ARGUMENT = "--probe-jql"
+PROBE_JQL_HELP = (f"in '{MODE_QUERY}' mode, learn the working JQL condition for 'any' type fields once up front "
+                  f"instead of on their first failing project query (always on with --workers above 1 or "
+                  f"--event-loop, where concurrent first queries would all fail)")
+REFRESH_METADATA_ARGUMENT = "--refresh-metadata"
+REFRESH_METADATA_HELP = "ignore the local metadata cache and re-download the custom fields and projects"
+RPS_ARGUMENT = "--rps"
+RPS_HELP = f"maximum number of '{MODE_QUERY}' mode count queries started per second (default: unlimited)"
+WORKERS_ARGUMENT = "--workers"
+WORKERS_HELP = f"number of '{MODE_QUERY}' mode count queries kept in flight at once (default: 1, serial)"
+
 # console log messages
 LOG_FETCH_PROJECTS = "Fetching projects..."
 LOG_QUERY_FIELD_USAGE = (
     "Querying usage for field '{field_name}' in project '{project_name}'..."
 )
+LOG_SCAN_FIELD_USAGE = "Scanning issues for usage of {field_count} custom fields across {project_count} projects..."
 LOG_WRITE_SUCCESS = "Custom field usage data (by project) has been written to {filename} successfully."
 
 
-def write_field_usage_to_csv(field_usage_data):
+def query_field_usage_in_project_exchange(field_and_project):
     """
-    Takes a list of field usage data dictionaries, writes it to a CSV file using pre-defined headers,
-    and confirms successful writing through a log message. Each dictionary in the input expects to have specific
-    field keys to extract relevant data for writing to the CSV file.
-    :param field_usage_data: List of dictionaries containing field usage information.
-    :return: None
+    Exchange querying the number of issues using a single custom field within a single project.
+    :param field_and_project: Tuple of a custom field and a project (as dictionaries).
+    :return: Exchange generator returning the number of issues in the project using the field.
     """
-    with open(OUTPUT_CSV_FILENAME, FILE_WRITE_MODE) as csvfile:
-        csv_writer = csv.writer(csvfile)
-        csv_writer.writerow(HEADER_FIELD_NAMES)
-        for field in field_usage_data:
-            csv_writer.writerow([
-                field[JsonFieldNames.ID],
-                field[JsonFieldNames.NAME],
-                field[JsonFieldNames.PROJECT_KEY],
-                field[JsonFieldNames.PROJECT_NAME],
-                field[JsonFieldNames.USAGE]
-            ])
+    field, project = field_and_project
+    clause_name = field[JsonFieldNames.CLAUSE_NAMES][0]
+    schema_type = field.get(JsonFieldNames.SCHEMA, {}).get(JsonFieldNames.TYPE, JsonFieldNames.UNKNOWN)
+    print(LOG_QUERY_FIELD_USAGE.format(
+        field_name=field[JsonFieldNames.NAME],
+        project_name=project[JsonFieldNames.NAME]
+    ))
+    return (yield from query_issues_using_field_exchange(clause_name, schema_type, project[JsonFieldNames.KEY]))
+
 
-    print(LOG_WRITE_SUCCESS.format(filename=OUTPUT_CSV_FILENAME))
+def parse_arguments():
+    """
+    Parse the command line arguments for the script.
+    :return: The parsed arguments namespace.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(MODE_ARGUMENT, choices=[MODE_QUERY, MODE_SCAN, MODE_INDEX, MODE_INCREMENTAL],
+                        default=MODE_QUERY, help=MODE_HELP)
+    parser.add_argument(FORMAT_ARGUMENT, choices=REPORT_FORMATS, default=REPORT_FORMAT_CSV, help=FORMAT_HELP)
+    parser.add_argument(EVENT_LOOP_ARGUMENT, action="store_true", help=EVENT_LOOP_HELP)
+    parser.add_argument(PROBE_JQL_ARGUMENT, action="store_true", help=PROBE_JQL_HELP)
+    parser.add_argument(REFRESH_METADATA_ARGUMENT, action="store_true", help=REFRESH_METADATA_HELP)
+    parser.add_argument(RPS_ARGUMENT, type=float, default=None, help=RPS_HELP)
+    parser.add_argument(WORKERS_ARGUMENT, type=int, default=1, help=WORKERS_HELP)
+    return parser.parse_args()
 
 
 def main():
     """
     Executes the main workflow for retrieving the projects and custom field data, querying usage statistics for each
-    field across projects, and writing the results to a CSV file. The function involves multiple stages,
-    including fetching data, iterating over projects and fields, querying field usage, and saving the gathered
-    information. It operates as the pipeline of data processing to generate structured field usage analytics.
+    field across projects, and writing the results to a report file (CSV by default). The function involves multiple
+    stages, including fetching data, iterating over projects and fields, querying field usage (optionally several
+    queries at once, aggregating it per project from a single scan over the issues in scan mode, or reading it from
+    the local issue index in index mode), and streaming each (field, project) row to the report in batches as soon
+    as its usage is known, rather than holding the whole matrix in memory. It operates as the pipeline of data
+    processing to generate structured field usage analytics.
     :return: None
     """
-    print(LOG_FETCH_PROJECTS)
-    projects = fetch_projects()
-
-    print(LOG_FETCH_FIELDS)
-    custom_fields = fetch_custom_fields()
-
-    field_usage_data = []
-    for field in custom_fields:
-        clause_name = field[JsonFieldNames.CLAUSE_NAMES][0]
-        schema_type = field.get(JsonFieldNames.SCHEMA, {}).get(JsonFieldNames.TYPE, JsonFieldNames.UNKNOWN)
-        for project in projects:
-            print(LOG_QUERY_FIELD_USAGE.format(
-                field_name=field[JsonFieldNames.NAME],
-                project_name=project[JsonFieldNames.NAME]
-            ))
-            usage = query_issues_using_field(clause_name, schema_type, project[JsonFieldNames.KEY])
-            field_usage_data.append({
-                JsonFieldNames.ID: field[JsonFieldNames.ID],
-                JsonFieldNames.NAME: field[JsonFieldNames.NAME],
-                JsonFieldNames.PROJECT_KEY: project[JsonFieldNames.KEY],
-                JsonFieldNames.PROJECT_NAME: project[JsonFieldNames.NAME],
-                JsonFieldNames.USAGE: usage
-            })
-
-    write_field_usage_to_csv(field_usage_data)
+    arguments = parse_arguments()
+
+    with METRICS.phase(PHASE_FETCH):
+        print(LOG_FETCH_PROJECTS)
+        projects = fetch_projects(arguments.refresh_metadata)
+
+        print(LOG_FETCH_FIELDS)
+        custom_fields = fetch_custom_fields(arguments.refresh_metadata)
+
+    with METRICS.phase(PHASE_QUERY), open_report_sink(OUTPUT_FILENAME_STEM, HEADER_FIELD_NAMES,
+                                                      arguments.format) as report:
+        if arguments.mode == MODE_SCAN:
+            print(LOG_SCAN_FIELD_USAGE.format(field_count=len(custom_fields), project_count=len(projects)))
+            scanned_usage = scan_field_usage_by_project(custom_fields)
+            usages = (scanned_usage[field[JsonFieldNames.ID]][project[JsonFieldNames.KEY]]
+                      for field, project in product(custom_fields, projects))
+        elif arguments.mode in [MODE_INDEX, MODE_INCREMENTAL]:
+            if arguments.mode == MODE_INCREMENTAL:
+                update_issue_index(custom_fields)
+            indexed_usage = read_indexed_field_usage(PROJECT)
+            usages = (indexed_usage.get(field[JsonFieldNames.ID], {}).get(project[JsonFieldNames.KEY], 0)
+                      for field, project in product(custom_fields, projects))
+        else:
+            # results come back in (field 'id', project) order, however many queries run at once
+            JIRA_CLIENT.set_pool_size(max(arguments.workers, POOL_SIZE))
+            if arguments.probe_jql or arguments.workers > 1 or arguments.event_loop:
+                probe_jql_strategies(custom_fields, arguments.workers)
+            usages = run_exchanges(map(query_field_usage_in_project_exchange, product(custom_fields, projects)),
+                                   arguments.workers, arguments.rps, arguments.event_loop)
+
+        # the query mode's results stream in while this loop consumes them, and go to the report in batches
+        for (field, project), usage in zip(product(custom_fields, projects), usages):
+            report.add([
+                field[JsonFieldNames.ID],
+                field[JsonFieldNames.NAME],
+                project[JsonFieldNames.KEY],
+                project[JsonFieldNames.NAME],
+                usage
+            ])
+
+    print(LOG_WRITE_SUCCESS.format(filename=report.filename))
 
 
 if __name__ == "__main__":
@@ -1,314 +1,1102 @@
 #!../.venv/bin/python
-import csv
+import argparse
+import json
+import os
+import sys
+from collections import Counter, deque, namedtuple
+from datetime import datetime, timedelta, timezone
+from enum import StrEnum
 from http import HTTPStatus
-import requests
-from utils.jira_utils import (FIELDS, FILE_APPEND_MODE, FILE_WRITE_MODE, IS_NOT_EMPTY_CLAUSE, MAX_RESULTS, START_AT,
-                              START_AT_VALUE)
-from utils.jira_utils import HEADERS, JIRA_BASE_URL, JsonFieldNames, SEARCH_ENDPOINT
+from utils.issue_backup import BACKUP_FORMAT_CSV, BACKUP_FORMATS, BackupWriter, get_backup_filename
+from utils.jira_utils import FIELDS, FILE_APPEND_MODE, FILE_READ_MODE, FILE_WRITE_MODE, IS_NOT_EMPTY_CLAUSE
+from utils.jira_utils import HTTP_POST, HTTP_PUT, POOL_SIZE, SCAN_PAGE_SIZE, TRANSPORT_ERRORS, JiraRequest
+from utils.jira_utils import ISSUE_ENDPOINT, JIRA_CLIENT, OPTION_CATALOG, SEARCH_ENDPOINT, JsonFieldNames, run_exchanges
+from utils.jira_utils import count_issues, load_json_file, scan_issue_pages
+from utils.run_metrics import METRICS, RUN_NAME, load_request_seconds
 
 # key global Variables
 MULTI_SELECT_SOURCE = "10112"
 MULTI_SELECT_DESTINATION = "10113"
-UPDATE_ENDPOINT = f"{JIRA_BASE_URL}/rest/api/2/issue/"
-SAVE_FILENAME = "3-after_current_multi_select_fields.csv"
+UPDATE_ENDPOINT = ISSUE_ENDPOINT
+SAVE_FILENAME_STEM = "3-after_current_multi_select_fields"
+JOURNAL_FILENAME = "3-copy_multi_select_journal.jsonl"
+DRY_RUN_FILENAME = "3-copy_multi_select_dry_run.jsonl"
 
 # additional global variables
-ALLOWED_VALUES = "allowedValues"
-EDIT_META = "editmeta"
-ALLOWED_VALUES_REQUEST = f"?expand={EDIT_META}&{FIELDS}="
 CUSTOM_FIELD_JQL = "cf[{source}]"
 CUSTOM_FIELD_JSON = "customfield_"
+DESTINATION_FIELD = "destination_field"
 DESTINATION_VALUES = "destination_values"
-ISSUES = "issues"
+DRY_RUN_METRICS_SUFFIX = "-dry-run"  # keeps the real runs' metrics, whose update timings the estimates come from
+ISSUE_ID = "issue_id"
 ISSUE_KEY = "issue_key"
-ORDER = "order by ID"
-PAGE_SIZE = 50
+PAGE_SIZE = SCAN_PAGE_SIZE
+UPDATE_RETRY_ROUNDS = 3
+SOURCE_FIELD = "source_field"
 SOURCE_VALUES = "source_values"
 VALUE = "value"
 
+# a source to destination field pair of a copy plan, with optional JQL narrowing the issues it applies to
+CopyPair = namedtuple("CopyPair", ["source", "destination", "jql"])
+DEFAULT_COPY_PLAN = [CopyPair(MULTI_SELECT_SOURCE, MULTI_SELECT_DESTINATION, None)]
+
+# journal and dry run record keys and events
+BACKUP_FORMAT = "backup_format"
+BACKUP_ROWS = "backup_rows"
+COUNTS = "counts"
+CREATED = "created"
+CURSOR = "cursor"
+ESTIMATE = "estimate"
+OFFSET = "offset"
+DESTINATION = "destination"
+EVENT = "event"
+PAIRS = "pairs"
+EVENT_BACKUP = "backup"
+EVENT_CHECKPOINT = "checkpoint"
+EVENT_FINISH = "finish"
+EVENT_RESULT = "result"
+EVENT_START = "start"
+EVENT_SUMMARY = "summary"
+EVENT_UPDATE = "update"
+SOURCE = "source"
+STATUS = "status"
+VALUES = "values"
+
+# command line arguments
+APPLY_DRY_RUN_ARGUMENT = "--apply-dry-run"
+APPLY_DRY_RUN_HELP = (f"apply the updates a --dry-run saved (default file: {DRY_RUN_FILENAME}) without scanning and "
+                      f"diffing the issues again, backing up the values the dry run saw; changes made in Jira since "
+                      f"the dry run get overwritten")
+BACKUP_FORMAT_ARGUMENT = "--backup-format"
+BACKUP_FORMAT_HELP = ("format of the backup file: CSV, or gzip compressed JSON lines that load faster for a restore "
+                      "(default: csv; a resumed run keeps the format it started with)")
+DRY_RUN_ARGUMENT = "--dry-run"
+DRY_RUN_HELP = (f"change nothing: count and diff the issues, estimate the requests and time the copy takes with the "
+                f"given --workers and --rps, and save the planned updates to {DRY_RUN_FILENAME} for "
+                f"{APPLY_DRY_RUN_ARGUMENT}")
+EVENT_LOOP_ARGUMENT = "--event-loop"
+EVENT_LOOP_HELP = ("apply the issue updates as coroutines on one asyncio event loop (needs aiohttp) instead of on "
+                   "worker threads, with --workers of them in flight")
+PLAN_ARGUMENT = "--plan"
+PLAN_HELP = ('JSON file listing the field pairs to copy in one pass, as [{"source": "10112", "destination": "10113", '
+             '"jql": "project = SCRUM"}, ...] with "jql" optional (default: the MULTI_SELECT_SOURCE and '
+             'MULTI_SELECT_DESTINATION pair)')
+REFRESH_METADATA_ARGUMENT = "--refresh-metadata"
+REFRESH_METADATA_HELP = "ignore the local option catalog cache and re-download the fields' options"
+RESUME_ARGUMENT = "--resume"
+RESUME_HELP = ("continue an interrupted run from its journal, keeping the backup file and skipping the pages and "
+               "updates already completed")
+RPS_ARGUMENT = "--rps"
+RPS_HELP = "maximum number of issue updates started per second (default: unlimited)"
+WORKERS_ARGUMENT = "--workers"
+WORKERS_HELP = "number of issue updates kept in flight at once (default: 1, serial)"
+
 # console error and Log messages
-ERROR_MSG_APPEND_LOAD = "Error appending backup file. Issue key: {issue_key} Error: {error}"
-ERROR_MSG_FETCH_ISSUES = ("Error fetching issues with source field '{source_field}'. Status Code: {status_code}. "
-                          "Response: {response}")
-ERROR_MSG_FETCH_OPTIONS = "Error fetching options for field '{field_id}', status: {status_code}, response: {response}"
-ERROR_MSG_FETCH_OPTIONS_SHORT = "Error fetching options for field '{field_id}': {error}"
-LOG_SAVE_SUCCESS = "Successfully saved issue '{issue_key}'."
-LOG_FETCH_ISSUES = "Fetching issues with source field '{field}'..."
+ERROR_MSG_DRY_RUN = "Error: Invalid dry run file '{filename}': {error}"
+ERROR_MSG_DRY_RUN_INCOMPLETE = "it has no summary, so the dry run did not finish; run it again"
+ERROR_MSG_DRY_RUN_PAIRS = "it plans a different copy plan {pairs}"
+ERROR_MSG_JOURNAL_FIELDS = ("Error: The journal '{filename}' belongs to a different copy plan {pairs}; move it away "
+                            "or run without {argument} to start over.")
+ERROR_MSG_PLAN = "Error: Invalid copy plan '{filename}': {error}"
+ERROR_MSG_PLAN_DESTINATION = "field '{destination}' is the destination of more than one pair"
+ERROR_MSG_PLAN_EMPTY = "it has to be a non-empty list of pairs"
+ERROR_MSG_PLAN_PAIR = "pair {pair} needs a 'source' and a different 'destination' field"
+LOG_FETCH_ALLOWED_VALUES = ("Fetching the allowed values of source field '{source}' and destination field "
+                            "'{destination}'...")
+LOG_APPLY_DRY_RUN = ("Applying the dry run from {created} ({age} ago): {updates} updates planned, {up_to_date} issues "
+                     "up to date, {no_mapping} without a valid mapping.")
+LOG_COUNT_ISSUES = "Counting issues with source fields {fields}..."
+LOG_DRY_RUN_COUNTS = ("Dry run: {candidates} issues have source values; {updates} need an update, {up_to_date} are "
+                      "up to date, {no_mapping} have no valid mapping.")
+LOG_DRY_RUN_ESTIMATE = ("Estimate: {put_requests} PUT requests at {request_seconds:.3f}s each ({latency_source}) with "
+                        "{workers} in flight{rate}; about {apply_duration} to apply the dry run, or about "
+                        "{full_run_duration} for a full run that also pages through {search_requests} search pages.")
+LOG_DRY_RUN_RATE = " and at most {rps:g} per second"
+LOG_DRY_RUN_SAVED = f"Planned updates have been saved to {{filename}}; apply them with {APPLY_DRY_RUN_ARGUMENT}."
+LOG_FETCH_ISSUES = "Fetching issues with source fields {fields}..."
+LOG_LATENCY_LAST_RUN = "observed in the last run"
+LOG_LATENCY_DRY_RUN = "no update timings yet, so observed for this dry run's searches"
 LOG_OPTION_MAPPING_CREATED = "Dynamic option mapping created: {mapping}"
 LOG_PAYLOAD_PREVIEW = "Updating issue '{issue_key}' with payload: {payload}"
 LOG_SKIP_ISSUE = "Skipping issue '{issue_key}' because the destination values are already up-to-date."
-LOG_SKIP_NO_VALID_VALUES = ("Skipping issue '{issue_key}' as no valid mappings were found for source value ids: {"
-                            "value_ids}")
-LOG_UPDATE_FAILURE = ("Failed to update issue '{issue_key}' for field '{field}'. Status Code: {status_code}. Response: "
+LOG_SKIP_NO_VALID_VALUES = ("Skipping field '{field}' of issue '{issue_key}' as no valid mappings were found for "
+                            "source value ids: {value_ids}")
+LOG_UPDATE_FAILURE = ("Failed to update issue '{issue_key}' for fields {fields}. Status Code: {status_code}. Response: "
                       "{response}")
+LOG_RESUME = ("Resuming from the journal after issue ID {cursor}: {completed} issues already done, {failed} failed "
+              "updates queued for retry.")
+LOG_RESUME_FINISHED = "The journal records a finished run; only issues created since will be processed."
+LOG_RETRY_FAILED_UPDATES = "Retrying {count} failed updates (round {round} of {rounds})..."
 LOG_UPDATE_SUCCESS = "Successfully updated issue '{issue_key}'."
+LOG_UPDATE_SUMMARY = "Update results: {updated} updated, {skipped} skipped, {failed} failed."
+LOG_UPDATES_STILL_FAILING = "Issues still failing to update after {rounds} retry rounds: {issue_keys}"
 LOG_UPDATE_INFO = "Updating issue '{issue_key}' with normalized destination values: {values}"
-WARNING_NO_ISSUES_TO_FETCH_DESTINATION_FIELDS = ("Warning: No issues available to fetch destination field allowed "
-                                                 "values.")
+WARNING_NO_ISSUES_TO_FETCH_ALLOWED_VALUES = "Warning: No issues available to fetch the fields' allowed values."
 WARNING_NO_OPTIONS_FOUND = "Warning: No options found for field '{field}'"
 
 
-def get_field_options_from_issues(field_id, issues):
+def build_field_option_mapping(pair, force_refresh=False):
     """
-    Build options for a specific field from issue data.
-    :param field_id: The custom field ID (for example, 10112 or 10113).
-    :param issues: List of issues containing the populated field values.
-    :return: A dictionary mapping the option values to option IDs.
+    Build a dynamic mapping between a pair's source and destination field options based on shared values, up front
+    from both fields' options in the option catalog so the issues can stream through afterwards. Where the catalog
+    cannot fetch a field's options itself, it falls back to the edit metadata of the first issue the pair applies to.
+    :param pair: The CopyPair to map the options of.
+    :param force_refresh: When True, bypass the option catalog cache and re-download the options.
+    :return: A dictionary mapping the source option IDs to destination option IDs.
     """
-    options = {}
-    field_json = f"{CUSTOM_FIELD_JSON}{field_id}"
+    print(LOG_FETCH_ALLOWED_VALUES.format(source=pair.source, destination=pair.destination))
+    source_field = f"{CUSTOM_FIELD_JSON}{pair.source}"
+    destination_field = f"{CUSTOM_FIELD_JSON}{pair.destination}"
+    source_options = OPTION_CATALOG.get(source_field, force_refresh=force_refresh)
+    destination_options = OPTION_CATALOG.get(destination_field, force_refresh=force_refresh)
 
-    for issue in issues:
-        # safely retrieve the field's values or default to an empty list
-        field_values = issue.get(FIELDS, {}).get(field_json, [])
+    if not source_options or not destination_options:
+        first_page = next(scan_issue_pages([source_field], get_pair_jql(pair), page_size=1), [])
+        if first_page:
+            first_issue_key = first_page[0][JsonFieldNames.KEY]
+            source_options = source_options or OPTION_CATALOG.get(source_field, first_issue_key)
+            destination_options = destination_options or OPTION_CATALOG.get(destination_field, first_issue_key)
+        else:
+            print(WARNING_NO_ISSUES_TO_FETCH_ALLOWED_VALUES)
 
-        # ensure field_values is an iterable list, otherwise skip if None or invalid
-        if not isinstance(field_values, list):
-            continue
+    if not source_options:
+        print(f"{WARNING_NO_OPTIONS_FOUND.format(field=f'{CUSTOM_FIELD_JSON}{pair.source}')}.")
+    if not destination_options:
+        print(f"{WARNING_NO_OPTIONS_FOUND.format(field=f'{CUSTOM_FIELD_JSON}{pair.destination}')}.")
 
-        for option in field_values:
-            # ensure option contains the required keys
-            if JsonFieldNames.ID in option and VALUE in option:
-                options[option[VALUE]] = option[JsonFieldNames.ID]
+    # map source IDs to destination IDs based on matching values
+    field_option_mapping = {
+        source_id: destination_options.get_id(value)
+        for value, source_id in source_options.ids_by_value.items()
+        if destination_options.get_id(value)  # match source values with destination values
+    }
 
-    return options
+    print(LOG_OPTION_MAPPING_CREATED.format(mapping=field_option_mapping))
+    return field_option_mapping
 
 
-def get_allowed_values_for_field(issue_key, field_id):
+class UpdateStatus(StrEnum):
     """
-    Fetch the allowed values for a Jira custom field using UPDATE_ENDPOINT.
-    :param issue_key: The key of the issue (for example, "SCRUM-1").
-    :param field_id: The ID of the custom field (for example, MULTI_SELECT_DESTINATION).
-    :return: A dictionary mapping option values to option IDs.
+    A class representing enumeration of the outcomes of a single issue update.
     """
-    endpoint = f"{UPDATE_ENDPOINT}{issue_key}{ALLOWED_VALUES_REQUEST}{CUSTOM_FIELD_JSON}{field_id}"
-    response = requests.get(endpoint, headers=HEADERS)
+    FAILED = "failed"
+    SKIPPED = "skipped"
+    UPDATED = "updated"
 
-    if response.status_code != HTTPStatus.OK:
-        print(
-            ERROR_MSG_FETCH_OPTIONS.format(
-                field_id=field_id, status_code=response.status_code, response=response.text
-            )
-        )
-        return {}
 
-    # extract allowed values from the API response
-    try:
-        allowed_values = (
-            response.json()
-            .get(EDIT_META, {})
-            .get(FIELDS, {})
-            .get(f"{CUSTOM_FIELD_JSON}{field_id}", {})
-            .get(ALLOWED_VALUES, [])
-        )
-        return {option[VALUE]: option[JsonFieldNames.ID] for option in allowed_values}
-    except Exception as error:
-        print(
-            ERROR_MSG_FETCH_OPTIONS_SHORT.format(
-                field_id=field_id, error=str(error)
-            )
-        )
-        return {}
+class DiffOutcome(StrEnum):
+    """
+    A class representing enumeration of the outcomes of diffing a single issue.
+    """
+    NO_MAPPING = "no_mapping"
+    UP_TO_DATE = "up_to_date"
+    UPDATE = "update"
 
 
-def build_field_option_mapping(issues):
+class IssueRecord:
     """
-    Build a dynamic mapping between source and destination field options based on shared values.
-    Approach is from: https://confluence.atlassian.com/jirakb/how-to-retrieve-available-options-for-a-multi-select-customfield-via-jira-rest-api-815566715.html
-    :return: A dictionary mapping the source option IDs to destination option IDs.
+    A compact, slotted record of an issue for the in-memory diff, in place of its nested JSON: the issue ID and key,
+    and the option IDs of every scanned field as frozensets of integers, shared between issues holding the same
+    options.
     """
-    source_options = get_field_options_from_issues(MULTI_SELECT_SOURCE, issues)
-    print(LOG_FETCH_ISSUES.format(field=f"{CUSTOM_FIELD_JSON}{MULTI_SELECT_DESTINATION}"))
-    first_issue_key = issues[0][JsonFieldNames.KEY] if issues else None
+    __slots__ = ("issue_id", "issue_key", "option_ids")
 
-    if first_issue_key:
-        destination_options = get_allowed_values_for_field(first_issue_key, MULTI_SELECT_DESTINATION)
-    else:
-        destination_options = {}
-        print(WARNING_NO_ISSUES_TO_FETCH_DESTINATION_FIELDS)
+    def __init__(self, issue_id, issue_key, option_ids):
+        """
+        :param issue_id: ID of the issue (as an integer).
+        :param issue_key: Key of the issue (for example, "PROJ-123").
+        :param option_ids: Tuple of the frozensets of option IDs of the scanned fields, in get_scan_fields order.
+        """
+        self.issue_id = issue_id
+        self.issue_key = issue_key
+        self.option_ids = option_ids
 
-    if not source_options:
-        print(f"{WARNING_NO_OPTIONS_FOUND.format(field=f'{CUSTOM_FIELD_JSON}{MULTI_SELECT_SOURCE}')}.")
-    if not destination_options:
-        print(f"{WARNING_NO_OPTIONS_FOUND.format(field=f'{CUSTOM_FIELD_JSON}{MULTI_SELECT_DESTINATION}')}.")
 
-    # map source IDs to destination IDs based on matching values
-    field_option_mapping = {
-        source_id: destination_options[value]
-        for value, source_id in source_options.items()
-        if value in destination_options  # match source values with destination values
-    }
+class OptionIdTable:
+    """
+    A pair's precomputed source to destination option ID table. It remembers the desired destination option IDs of
+    every distinct set of source option IDs, so diffing an issue that holds a combination seen before allocates
+    nothing.
+    """
 
-    print(LOG_OPTION_MAPPING_CREATED.format(mapping=field_option_mapping))
-    return field_option_mapping
+    def __init__(self, field_option_mapping):
+        """
+        :param field_option_mapping: Dictionary mapping source option IDs to destination option IDs, from
+            build_field_option_mapping.
+        """
+        self.destination_ids = {int(source_id): int(destination_id)
+                                for source_id, destination_id in field_option_mapping.items()}
+        self.desired_ids = {}
 
+    def map(self, source_ids):
+        """
+        Map a set of source option IDs to the destination option IDs they have mappings for.
+        :param source_ids: Frozenset of source option IDs (as integers).
+        :return: Frozenset of the destination option IDs.
+        """
+        desired_ids = self.desired_ids.get(source_ids)
+        if desired_ids is None:
+            desired_ids = frozenset(self.destination_ids[option_id] for option_id in source_ids
+                                    if option_id in self.destination_ids)  # only include valid mappings
+            self.desired_ids[source_ids] = desired_ids
+        return desired_ids
 
-def update_field(issue_key, desired_values):
+
+# a pending update of one issue's destination fields, and its outcome with the HTTP status code when a request got sent
+IssueUpdate = namedtuple("IssueUpdate", ["issue_id", "issue_key", "desired_values"])
+UpdateResult = namedtuple("UpdateResult", ["issue_key", "status", "status_code"])
+
+
+def update_field_exchange(issue_key, desired_values):
     """
-    Update the destination multi-select field for a specific issue.
+    Exchange updating the destination multi-select fields for a specific issue, all in a single request.
     :param issue_key: Key of the issue to update (for example, "PROJ-123").
-    :param desired_values: list of destination option IDs.
-    :return: None
+    :param desired_values: Dictionary mapping destination field IDs to lists of destination option IDs.
+    :return: Exchange generator returning the UpdateResult with the outcome of the update.
     """
-    # skip the update if there are no valid destination IDs
+    # skip the update if no destination field has valid destination IDs
     if not desired_values:
-        print(LOG_SKIP_NO_VALID_VALUES.format(issue_key=issue_key, value_ids=desired_values))
-        return
+        return UpdateResult(issue_key, UpdateStatus.SKIPPED, None)
 
     # create the update payload
     payload = {
-        FIELDS: {
-            f"{CUSTOM_FIELD_JSON}{MULTI_SELECT_DESTINATION}": desired_values
-        }
+        FIELDS: desired_values
     }
 
     print(LOG_PAYLOAD_PREVIEW.format(issue_key=issue_key, payload=str(payload))) # for debugging; str used for enums
 
-    response = requests.put(f"{UPDATE_ENDPOINT}{issue_key}", headers=HEADERS, json=payload)
-
-    if response.status_code == HTTPStatus.NO_CONTENT:
-        print(LOG_UPDATE_SUCCESS.format(issue_key=issue_key))
-    else:
+    try:
+        response = yield JiraRequest(HTTP_PUT, f"{UPDATE_ENDPOINT}{issue_key}", {"json": payload})
+    except TRANSPORT_ERRORS as error:
         print(LOG_UPDATE_FAILURE.format(
             issue_key=issue_key,
-            field=f"{CUSTOM_FIELD_JSON}{MULTI_SELECT_DESTINATION}",
-            status_code=response.status_code,
-            response=response.text
+            fields=list(desired_values),
+            status_code=None,
+            response=str(error)
         ))
+        return UpdateResult(issue_key, UpdateStatus.FAILED, None)
 
+    if response.status_code == HTTPStatus.NO_CONTENT:
+        print(LOG_UPDATE_SUCCESS.format(issue_key=issue_key))
+        return UpdateResult(issue_key, UpdateStatus.UPDATED, response.status_code)
 
-def get_issues_with_source_field_values(start_at=START_AT_VALUE, page_size=PAGE_SIZE):
+    print(LOG_UPDATE_FAILURE.format(
+        issue_key=issue_key,
+        fields=list(desired_values),
+        status_code=response.status_code,
+        response=response.text
+    ))
+    return UpdateResult(issue_key, UpdateStatus.FAILED, response.status_code)
+
+
+def update_issue_exchange(update):
     """
-    Fetch issues that have values in the source multi-select custom field.
-    :param start_at: Start index for pagination.
-    :param page_size: Number of issues to fetch per page.
-    :return: List of issues.
+    Exchange logging and applying a single IssueUpdate, for running on the update worker pool or event loop.
+    :param update: The IssueUpdate to apply.
+    :return: Exchange generator returning a tuple of the IssueUpdate and the UpdateResult with its outcome.
     """
-    custom_field_jql = f"{CUSTOM_FIELD_JQL.format(source=MULTI_SELECT_SOURCE)}"
-    jql = f"{custom_field_jql} {IS_NOT_EMPTY_CLAUSE} {ORDER}"
-    payload = {
-        JsonFieldNames.JQL: jql,
-        START_AT: start_at,
-        MAX_RESULTS: page_size,
-        FIELDS: [f"{CUSTOM_FIELD_JSON}{MULTI_SELECT_SOURCE}", f"{CUSTOM_FIELD_JSON}{MULTI_SELECT_DESTINATION}"],
-    }
+    # for debugging
+    print(LOG_UPDATE_INFO.format(
+        issue_key=update.issue_key,
+        values=update.desired_values))
+    return update, (yield from update_field_exchange(update.issue_key, update.desired_values))
 
-    response = requests.post(SEARCH_ENDPOINT, headers=HEADERS, json=payload)
 
-    if response.status_code != HTTPStatus.OK:
-        print(ERROR_MSG_FETCH_ISSUES.format(
-            source_field=custom_field_jql,
-            status_code=response.status_code,
-            response=response.text
-        ))
-        return []
+def apply_updates(updates, journal, max_workers=1, requests_per_second=None, event_loop=False):
+    """
+    Apply the updates on a bounded worker pool (or event loop) with an optional rate limit, recording every outcome
+    in the journal.
+    Every issue gets its own result; failed updates (including the ones a resumed journal still lists as failed) go to
+    a retry queue that gets retried in up to UPDATE_RETRY_ROUNDS further rounds once the stream ends.
+    :param updates: Iterable of IssueUpdate tuples, at most one per issue.
+    :param journal: The CopyJournal of the run.
+    :param max_workers: Maximum number of updates in flight at once.
+    :param requests_per_second: (Optional) Maximum number of updates started per second.
+    :param event_loop: Whether to run the updates as coroutines on one event loop instead of on worker threads.
+    :return: Dictionary counting the final UpdateStatus of every issue.
+    """
+    status_counts = {status: 0 for status in UpdateStatus}
+    retry_queue = list(journal.failed_updates.values())
+    for update, result in run_exchanges(map(update_issue_exchange, updates), max_workers, requests_per_second,
+                                        event_loop):
+        journal.record_result(update, result)
+        if result.status == UpdateStatus.FAILED:
+            retry_queue.append(update)
+        else:
+            status_counts[result.status] += 1
+
+    for retry_round in range(1, UPDATE_RETRY_ROUNDS + 1):
+        if not retry_queue:
+            break
+        print(LOG_RETRY_FAILED_UPDATES.format(count=len(retry_queue), round=retry_round, rounds=UPDATE_RETRY_ROUNDS))
+        failed_updates, retry_queue = retry_queue, []
+        for update, result in run_exchanges(map(update_issue_exchange, failed_updates), max_workers,
+                                            requests_per_second, event_loop):
+            journal.record_result(update, result)
+            if result.status == UpdateStatus.FAILED:
+                retry_queue.append(update)
+            else:
+                status_counts[result.status] += 1
 
-    return response.json().get(ISSUES, [])
+    status_counts[UpdateStatus.FAILED] = len(retry_queue)
+    if retry_queue:
+        print(LOG_UPDATES_STILL_FAILING.format(rounds=UPDATE_RETRY_ROUNDS,
+                                               issue_keys=[update.issue_key for update in retry_queue]))
+    print(LOG_UPDATE_SUMMARY.format(updated=status_counts[UpdateStatus.UPDATED],
+                                    skipped=status_counts[UpdateStatus.SKIPPED],
+                                    failed=status_counts[UpdateStatus.FAILED]))
+    return status_counts
 
 
-def create_save_file(issue_key, source_values, destination_values):
+def load_copy_plan(filename):
     """
-    Append the current state of an issue's source and destination fields to the save file.
-    :param issue_key: The key of the issue (for example, "PROJ-123").
-    :param source_values: Current values in the source field (a list of objects).
-    :param destination_values: Current values in the destination field (a list of objects).
-    :return: None
+    Load and validate a copy plan file, exiting with an error if it is invalid.
+    :param filename: Path of the JSON plan file.
+    :return: List of CopyPair tuples, with the field IDs in their numeric form (for example, "10112").
     """
-    try:
-        # extract the VALUE fields from the raw JSON objects
-        source_values_cleaned = [entry[VALUE] for entry in source_values]
-        destination_values_cleaned = [entry[VALUE] for entry in destination_values] if destination_values else ""
+    plan = load_json_file(filename, None)
+    if not isinstance(plan, list) or not plan:
+        print(ERROR_MSG_PLAN.format(filename=filename, error=ERROR_MSG_PLAN_EMPTY))
+        sys.exit(1)
 
-        # write the cleaned-up values
-        with open(SAVE_FILENAME, FILE_APPEND_MODE) as save_file:
-            writer = csv.writer(save_file)
-            writer.writerow([issue_key, source_values_cleaned, destination_values_cleaned])
-        print(LOG_SAVE_SUCCESS.format(issue_key=issue_key))
-    except Exception as error:
-        print(ERROR_MSG_APPEND_LOAD.format(issue_key=issue_key, error=str(error)))
+    pairs = []
+    for entry in plan:
+        source = str(entry.get(SOURCE, "")).removeprefix(CUSTOM_FIELD_JSON) if isinstance(entry, dict) else ""
+        destination = str(entry.get(DESTINATION, "")).removeprefix(CUSTOM_FIELD_JSON) if source else ""
+        if not source or not destination or source == destination:
+            print(ERROR_MSG_PLAN.format(filename=filename, error=ERROR_MSG_PLAN_PAIR.format(pair=entry)))
+            sys.exit(1)
+        if destination in {pair.destination for pair in pairs}:
+            print(ERROR_MSG_PLAN.format(filename=filename,
+                                        error=ERROR_MSG_PLAN_DESTINATION.format(destination=destination)))
+            sys.exit(1)
+        pairs.append(CopyPair(source, destination, entry.get(JsonFieldNames.JQL) or None))
+    return pairs
 
 
-def initialize_save_file():
+def get_pair_jql(pair):
     """
-    Initialize the save file with headers if it doesn't exist or gets overwritten.
-    :return: None
+    Build the JQL matching the issues a pair applies to: the ones with a source value, within the pair's JQL if any.
+    :param pair: The CopyPair.
+    :return: The JQL string.
     """
-    with open(SAVE_FILENAME, FILE_WRITE_MODE) as save_file:
-        writer = csv.writer(save_file)
-        writer.writerow([ISSUE_KEY, SOURCE_VALUES, DESTINATION_VALUES])  # save file headers
+    jql = f"{CUSTOM_FIELD_JQL.format(source=pair.source)} {IS_NOT_EMPTY_CLAUSE}"
+    return f"{jql} AND ({pair.jql})" if pair.jql else jql
 
 
-def main():
+def get_copy_jql(pairs):
     """
-    The script processes and updates issues with specific custom field values in a paginated manner using the JIRA API.
-    Initially, it retrieves issues containing relevant field values, collects them for processing, and writes the
-    current state into a save file as a backup. Subsequently, it builds a mapping of field option IDs and applies updates
-    to the required field values for each issue, ensuring the changes are necessary before updating.
-    :return: None
+    Build the JQL matching the issues any pair of the copy plan applies to.
+    :param pairs: List of CopyPair tuples of the copy plan.
+    :return: The JQL string.
     """
-    custom_source_json = f"{CUSTOM_FIELD_JSON}{MULTI_SELECT_SOURCE}"
+    return " OR ".join(f"({get_pair_jql(pair)})" for pair in pairs) if len(pairs) > 1 else get_pair_jql(pairs[0])
 
-    # initialize the save file
-    initialize_save_file()
 
-    print(LOG_FETCH_ISSUES.format(field=f"{CUSTOM_FIELD_JQL.format(source=MULTI_SELECT_SOURCE)}"))
-    start_at = START_AT_VALUE
-    issues_with_field_values = []  # collect all issues for processing field options
-    while True:
-        # fetch issues with pagination
-        issues = get_issues_with_source_field_values(start_at=start_at, page_size=PAGE_SIZE)
-        # print(f"Fetched {len(issues)} issues: {issues}...") # for debugging
-        if not issues:
-            break
+def get_scan_fields(pairs):
+    """
+    List the fields the scan projects: the union of every pair's source and destination fields.
+    :param pairs: List of CopyPair tuples of the copy plan.
+    :return: Sorted list of the field IDs (for example, ["customfield_10112", "customfield_10113"]).
+    """
+    return sorted({f"{CUSTOM_FIELD_JSON}{field}" for pair in pairs for field in (pair.source, pair.destination)})
+
+
+def get_pair_field_indexes(pairs):
+    """
+    Look up where each pair's source and destination fields sit in the IssueRecord option IDs.
+    :param pairs: List of CopyPair tuples of the copy plan.
+    :return: Dictionary mapping each CopyPair to a (source index, destination index) tuple.
+    """
+    field_indexes = {field_id: index for index, field_id in enumerate(get_scan_fields(pairs))}
+    return {pair: (field_indexes[f"{CUSTOM_FIELD_JSON}{pair.source}"],
+                   field_indexes[f"{CUSTOM_FIELD_JSON}{pair.destination}"]) for pair in pairs}
+
+
+def get_issues_with_source_field_values(pairs, page_size=PAGE_SIZE, after_id=0):
+    """
+    Fetch issues that have values in any pair's source multi-select custom field (within the pair's JQL, if any), a
+    page at a time, in a single scan projecting the union of every pair's source and destination fields. Uses keyset
+    pagination ('id > last seen id') so the updates this script makes mid-run cannot shift, skip, or repeat issues.
+    :param pairs: List of CopyPair tuples of the copy plan.
+    :param page_size: Number of issues to fetch per page; the server may cap it lower.
+    :param after_id: (Optional) Only fetch issues with a higher ID, for example to resume from a journal checkpoint.
+    :return: Generator yielding the pages (as lists of issues).
+    """
+    yield from scan_issue_pages(get_scan_fields(pairs), get_copy_jql(pairs), page_size, after_id)
+
+
+def get_option_ids(options, option_values):
+    """
+    Collect the option IDs of a field value, noting each option's value for the backup along the way.
+    :param options: The field value from the issue JSON (a list of option objects, or None).
+    :param option_values: Dictionary of the field mapping option IDs to option values, updated in place.
+    :return: Frozenset of the option IDs (as integers).
+    """
+    option_ids = []
+    for option in options or []:
+        option_id = int(option[JsonFieldNames.ID])
+        option_values.setdefault(option_id, option[VALUE])
+        option_ids.append(option_id)
+    return frozenset(option_ids)
 
-        issues_with_field_values.extend(issues)  # collect the issues
 
+def parse_issue_pages(issue_pages, fields, option_values):
+    """
+    Pipeline stage that turns each page of issue JSON into IssueRecord instances as soon as it arrives, so the nested
+    JSON can be freed right away. Equal option ID sets get shared between the records, and the option values go into
+    one small table per field (for the backup) rather than staying with every issue.
+    :param issue_pages: Iterable of pages (as lists of issues) from get_issues_with_source_field_values.
+    :param fields: List of the scanned field IDs, from get_scan_fields.
+    :param option_values: List of one dictionary per scanned field mapping option IDs to values, updated in place.
+    :return: Generator yielding pages as lists of IssueRecord instances.
+    """
+    shared_option_ids = {}
+    for issues in issue_pages:
+        records = []
         for issue in issues:
-            issue_key = issue[JsonFieldNames.KEY]
-            fields = issue[FIELDS]
+            issue_fields = issue[FIELDS]
+            option_ids = tuple(
+                shared_option_ids.setdefault(ids, ids) for ids in (
+                    get_option_ids(issue_fields.get(field_id), values)
+                    for field_id, values in zip(fields, option_values)
+                )
+            )
+            records.append(IssueRecord(int(issue[JsonFieldNames.ID]), issue[JsonFieldNames.KEY], option_ids))
+        yield records
+
+
+def get_scoped_pairs(pairs):
+    """
+    Group the pairs whose JQL the main scan cannot settle by itself by that JQL. When every pair has the same JQL, the
+    main scan's JQL already holds it for every issue, so no pair needs a scope; otherwise each distinct JQL does.
+    :param pairs: List of CopyPair tuples of the copy plan.
+    :return: Dictionary mapping each JQL to the list of CopyPair tuples with it, empty when no scope is needed.
+    """
+    if len({pair.jql for pair in pairs}) == 1:
+        return {}
+    scoped_pairs = {}
+    for pair in pairs:
+        if pair.jql:
+            scoped_pairs.setdefault(pair.jql, []).append(pair)
+    return scoped_pairs
 
-            source_values = fields.get(custom_source_json, [])
-            destination_values = fields.get(f"{CUSTOM_FIELD_JSON}{MULTI_SELECT_DESTINATION}", [])
 
-            # create a save file with the current values
-            create_save_file(issue_key, source_values, destination_values)
+class JqlScope:
+    """
+    The issue IDs a JQL of the copy plan applies to, streamed in ID order alongside the main scan (which is in ID
+    order too) and merge-joined with it, so membership checks need neither a query per issue nor every ID in memory.
+    Jira's search doesn't tell which part of an OR matched an issue, and arbitrary JQL can't be evaluated from the
+    issue fields, so each scope is one extra scan; it projects no fields, and pairs sharing a JQL share it.
+    """
+
+    def __init__(self, pairs, after_id=0):
+        """
+        Start streaming the IDs of the issues the pairs apply to.
+        :param pairs: List of the CopyPair tuples sharing the JQL.
+        :param after_id: (Optional) Only stream issues with a higher ID, matching the main scan.
+        """
+        pages = scan_issue_pages([], get_copy_jql(pairs), PAGE_SIZE, after_id)
+        self.issue_ids = (int(issue[JsonFieldNames.ID]) for issues in pages for issue in issues)
+        self.next_id = next(self.issue_ids, None)
 
-        # update the starting index for the next page
-        start_at += PAGE_SIZE
+    def __contains__(self, issue_id):
+        """
+        Check whether the JQL matches an issue; the IDs have to be checked in ascending order.
+        :param issue_id: ID of the issue (as an integer).
+        :return: True if the issue is within the JQL.
+        """
+        while self.next_id is not None and self.next_id < issue_id:
+            self.next_id = next(self.issue_ids, None)
+        return self.next_id == issue_id
 
-    # build the field option mapping after collecting all issues
-    field_option_id_map = build_field_option_mapping(issues_with_field_values)
 
-    # process issues in a second loop to apply field updates
-    for issue in issues_with_field_values:
-        issue_key = issue[JsonFieldNames.KEY]
-        fields = issue[FIELDS]
+def match_issue_pages(issue_pages, pair_field_indexes, after_id=0):
+    """
+    Pipeline stage that works out which pairs of the copy plan apply to each issue: the ones whose source field has
+    values, and whose JQL (if any) matches the issue.
+    :param issue_pages: Iterable of pages from parse_issue_pages, in ID order.
+    :param pair_field_indexes: Dictionary of the copy plan's pairs from get_pair_field_indexes.
+    :param after_id: (Optional) The ID the scan started after, for the scopes to start after as well.
+    :return: Generator yielding pages as lists of (IssueRecord, list of the CopyPair tuples that apply to it) tuples.
+    """
+    scopes = {jql: JqlScope(pairs, after_id) for jql, pairs in get_scoped_pairs(list(pair_field_indexes)).items()}
+    for records in issue_pages:
+        yield [
+            (record, [
+                pair for pair, (source_index, _) in pair_field_indexes.items()
+                if record.option_ids[source_index] and (pair.jql not in scopes or record.issue_id in scopes[pair.jql])
+            ])
+            for record in records
+        ]
 
-        # retrieve the source and destination values from the current issue
-        source_values = fields.get(custom_source_json, [])
-        current_destination_values = fields.get(f"{CUSTOM_FIELD_JSON}{MULTI_SELECT_DESTINATION}", [])
 
-        # normalize current and desired values by extracting only the 'id' keys
-        current_ids = {entry[JsonFieldNames.ID] for entry in current_destination_values or []}
-        desired_ids = {
-            field_option_id_map[entry[JsonFieldNames.ID]]
-            for entry in source_values
-            if entry[JsonFieldNames.ID] in field_option_id_map  # only include valid mappings
-        }
+def create_save_file(backup_format, append_offset=None):
+    """
+    Open the save file for the whole run, with headers unless a resumed run appends to the existing one.
+    :param backup_format: One of BACKUP_FORMATS.
+    :param append_offset: (Optional) Offset of the last checkpointed flush of the existing save file to append at.
+    :return: An open BackupWriter.
+    """
+    return BackupWriter(get_backup_filename(SAVE_FILENAME_STEM, backup_format),
+                        [ISSUE_KEY, SOURCE_VALUES, DESTINATION_VALUES, SOURCE_FIELD, DESTINATION_FIELD, ISSUE_ID],
+                        backup_format, append_offset)
+
+
+def get_backup_row(record, pair, pair_field_indexes, option_values):
+    """
+    Build the save file row of the current state of an issue's source and destination fields for a pair.
+    :param record: The IssueRecord.
+    :param pair: The CopyPair the values belong to.
+    :param pair_field_indexes: Dictionary of the copy plan's pairs from get_pair_field_indexes.
+    :param option_values: List of one dictionary per scanned field mapping option IDs to values, from
+        parse_issue_pages.
+    :return: List of the column values, in the save file's header order.
+    """
+    source_index, destination_index = pair_field_indexes[pair]
+    source_values = [option_values[source_index][option_id] for option_id in sorted(record.option_ids[source_index])]
+    destination_values = [option_values[destination_index][option_id]
+                          for option_id in sorted(record.option_ids[destination_index])]
+    return [record.issue_key, source_values, destination_values or "",
+            f"{CUSTOM_FIELD_JSON}{pair.source}", f"{CUSTOM_FIELD_JSON}{pair.destination}", record.issue_id]
 
-        # if the current IDs already match the desired IDs, skip the update as it's unnecessary
-        if current_ids == desired_ids:
-            print(LOG_SKIP_ISSUE.format(issue_key=issue_key))
+
+class CopyJournal:
+    """
+    A write-ahead journal of the copy (one JSON record per line), so an interrupted run can resume where it stopped.
+    It records the start (which field pairs get copied), the issue ID the backup got written up to, every update
+    outcome, checkpoints of the issue ID up to which every issue got fully handled, and the finish. Results come back
+    in issue order, so an update's result is also a checkpoint of its own issue ID.
+    """
+
+    def __init__(self, filename=JOURNAL_FILENAME, resume=False):
+        """
+        Open the journal, replaying the existing records first when resuming, or starting a new one otherwise.
+        :param filename: Path of the journal file.
+        :param resume: Whether to continue the existing journal instead of truncating it.
+        """
+        self.filename = filename
+        self.pairs = None
+        self.backup_format = None
+        self.backup_cursor = 0
+        self.backup_offset = None
+        self.cursor = 0
+        self.completed_count = 0
+        self.failed_updates = {}
+        self.finished = False
+        self.resumed = resume and os.path.exists(filename)
+        if self.resumed:
+            self.replay()
+
+        # the issue IDs handed to the update pool in order, and the last ID the diff stage finished a page at
+        self.pending_ids = deque()
+        self.diffed_cursor = self.cursor
+        self.journal_file = open(filename, FILE_APPEND_MODE if self.resumed else FILE_WRITE_MODE)
+
+    def replay(self):
+        """
+        Rebuild the state of an earlier run from its journal records, ignoring a record torn by a crash mid-write.
+        :return: None
+        """
+        with open(self.filename, FILE_READ_MODE) as journal_file:
+            for line in journal_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                event = record[EVENT]
+                if event == EVENT_START:
+                    self.pairs = [CopyPair(*pair) for pair in record[PAIRS]]
+                    self.backup_format = record.get(BACKUP_FORMAT, BACKUP_FORMAT_CSV)
+                elif event == EVENT_BACKUP:
+                    self.backup_cursor = max(self.backup_cursor, record[CURSOR])
+                    self.backup_offset = record[OFFSET]
+                elif event == EVENT_CHECKPOINT:
+                    self.cursor = max(self.cursor, record[CURSOR])
+                elif event == EVENT_RESULT:
+                    self.cursor = max(self.cursor, record[JsonFieldNames.ID])
+                    self.replay_result(record)
+                elif event == EVENT_FINISH:
+                    self.finished = True
+
+    def replay_result(self, record):
+        """
+        Apply one update outcome record to the replayed state.
+        :param record: The journal record of the update outcome.
+        :return: None
+        """
+        issue_key = record[JsonFieldNames.KEY]
+        if record[STATUS] == UpdateStatus.FAILED:
+            self.failed_updates[issue_key] = IssueUpdate(record[JsonFieldNames.ID], issue_key, record[VALUES])
+            return
+        if self.failed_updates.pop(issue_key, None) is None:
+            self.completed_count += 1
+
+    def write(self, record, sync=False):
+        """
+        Append a record to the journal and flush it, optionally forcing it to disk as well.
+        :param record: The journal record (as a dictionary).
+        :param sync: Whether to fsync the journal after writing, for checkpoints worth surviving an OS crash.
+        :return: None
+        """
+        self.journal_file.write(json.dumps(record) + "\n")
+        self.journal_file.flush()
+        if sync:
+            os.fsync(self.journal_file.fileno())
+
+    def start(self, pairs, backup_format):
+        """
+        Record which field pairs the run copies and how it backs them up, refusing to resume a journal of a different
+        copy plan. A resumed run keeps the backup format recorded at its start.
+        :param pairs: List of CopyPair tuples of the copy plan.
+        :param backup_format: One of BACKUP_FORMATS, for the save file.
+        :return: None
+        """
+        if self.resumed and self.pairs and self.pairs != pairs:
+            print(ERROR_MSG_JOURNAL_FIELDS.format(filename=self.filename, pairs=[pair._asdict() for pair in self.pairs],
+                                                  argument=RESUME_ARGUMENT))
+            sys.exit(1)
+        if self.resumed and self.pairs:
+            return
+        self.backup_format = backup_format
+        self.write({EVENT: EVENT_START, PAIRS: pairs, BACKUP_FORMAT: backup_format}, sync=True)
+
+    def record_backup(self, cursor, offset):
+        """
+        Record that every issue up to an ID is in the backup file, which has been synced to disk at this point.
+        :param cursor: ID of the last issue backed up.
+        :param offset: Offset of the end of the backup file, where a resumed run appends.
+        :return: None
+        """
+        self.backup_cursor = cursor
+        self.backup_offset = offset
+        self.write({EVENT: EVENT_BACKUP, CURSOR: cursor, OFFSET: offset}, sync=True)
+
+    def record_queued(self, issue_id):
+        """
+        Note an issue whose update is about to go to the update pool.
+        :param issue_id: ID of the issue.
+        :return: None
+        """
+        self.pending_ids.append(issue_id)
+
+    def record_page_diffed(self, cursor):
+        """
+        Note that the diff stage finished a page, checkpointing it right away when none of its updates are in flight.
+        :param cursor: ID of the last issue of the page.
+        :return: None
+        """
+        self.diffed_cursor = cursor
+        if not self.pending_ids:
+            self.record_checkpoint(cursor)
+
+    def record_checkpoint(self, cursor):
+        """
+        Record that every issue up to an ID has been fully handled, so a resumed scan can start after it.
+        :param cursor: ID of the last issue fully handled.
+        :return: None
+        """
+        if cursor > self.cursor:
+            self.cursor = cursor
+            self.write({EVENT: EVENT_CHECKPOINT, CURSOR: cursor}, sync=True)
+
+    def record_result(self, update, result):
+        """
+        Record the outcome of an update, checkpointing the diffed pages once no more of their updates are in flight.
+        :param update: The IssueUpdate that got applied.
+        :param result: The UpdateResult of the update.
+        :return: None
+        """
+        if self.pending_ids and self.pending_ids[0] == update.issue_id:
+            self.pending_ids.popleft()
+            self.cursor = max(self.cursor, update.issue_id)
+        self.write({EVENT: EVENT_RESULT, JsonFieldNames.ID: update.issue_id, JsonFieldNames.KEY: update.issue_key,
+                    VALUES: update.desired_values, STATUS: result.status})
+        if not self.pending_ids:
+            self.record_checkpoint(self.diffed_cursor)
+
+    def close(self, finished=False):
+        """
+        Close the journal, recording the finish when the run completed.
+        :param finished: Whether the run processed every issue.
+        :return: None
+        """
+        if finished:
+            self.write({EVENT: EVENT_FINISH}, sync=True)
+        self.journal_file.close()
+
+
+def backup_issue_pages(issue_pages, pair_field_indexes, option_values, save_file, journal):
+    """
+    Pipeline stage that appends the current source and destination values of every issue (one row per pair that
+    applies to it) to the save file before passing its page on, so each issue is backed up before anything can update
+    it. Each page gets written in one batch and synced to disk before its journal checkpoint. Issues the journal
+    records as backed up already keep their original snapshot, since their fields may have been updated since.
+    :param issue_pages: Iterable of pages from match_issue_pages.
+    :param pair_field_indexes: Dictionary of the copy plan's pairs from get_pair_field_indexes.
+    :param option_values: List of one dictionary per scanned field mapping option IDs to values, from
+        parse_issue_pages.
+    :param save_file: The BackupWriter of the run.
+    :param journal: The CopyJournal of the run.
+    :return: Generator yielding the same pages.
+    """
+    for issues in issue_pages:
+        for record, pairs in issues:
+            if record.issue_id <= journal.backup_cursor:
+                continue
+            for pair in pairs:
+                # save the current values
+                save_file.add(get_backup_row(record, pair, pair_field_indexes, option_values))
+        last_issue_id = issues[-1][0].issue_id
+        if last_issue_id > journal.backup_cursor:
+            journal.record_backup(last_issue_id, save_file.flush(sync=True))
+        yield issues
+
+
+def diff_issue(record, pairs, pair_field_indexes, option_id_tables):
+    """
+    Compute an issue's desired destination option IDs from its source option IDs for every pair that applies to it,
+    merging all of its changed destination fields into one update. The comparison works on the record's shared
+    frozensets and the pairs' OptionIdTable instances, so only an issue that needs an update allocates anything.
+    :param record: The IssueRecord.
+    :param pairs: List of the CopyPair tuples that apply to the issue.
+    :param pair_field_indexes: Dictionary of the copy plan's pairs from get_pair_field_indexes.
+    :param option_id_tables: A dictionary mapping each CopyPair to its OptionIdTable.
+    :return: Tuple of the DiffOutcome and the dictionary mapping the changed destination field IDs to lists of
+    destination option IDs (None unless the outcome is an update).
+    """
+    desired_values = None
+    skipped_pairs = 0
+
+    for pair in pairs:
+        source_index, destination_index = pair_field_indexes[pair]
+        source_ids = record.option_ids[source_index]
+        desired_ids = option_id_tables[pair].map(source_ids)
+
+        # if the current IDs already match the desired IDs, skip the field as its update is unnecessary
+        if record.option_ids[destination_index] == desired_ids:
+            continue
+
+        # skip the field if there are no valid destination IDs
+        if not desired_ids:
+            print(LOG_SKIP_NO_VALID_VALUES.format(field=f"{CUSTOM_FIELD_JSON}{pair.destination}",
+                                                  issue_key=record.issue_key, value_ids=sorted(source_ids)))
+            skipped_pairs += 1
             continue
 
         # compute the desired destination values (used for the actual update payload)
-        desired_values = [{str(JsonFieldNames.ID): id_value} for id_value in desired_ids]
+        if desired_values is None:
+            desired_values = {}
+        desired_values[f"{CUSTOM_FIELD_JSON}{pair.destination}"] = [
+            {str(JsonFieldNames.ID): str(id_value)} for id_value in sorted(desired_ids)
+        ]
 
-        # for debugging
-        print(LOG_UPDATE_INFO.format(
-            issue_key=issue_key,
-            values=desired_values))
-        update_field(issue_key, desired_values)
+    if desired_values:
+        return DiffOutcome.UPDATE, desired_values
+    if skipped_pairs:
+        return DiffOutcome.NO_MAPPING, None
+    print(LOG_SKIP_ISSUE.format(issue_key=record.issue_key))
+    return DiffOutcome.UP_TO_DATE, None
+
+
+def diff_issue_pages(issue_pages, pair_field_indexes, option_id_tables, journal):
+    """
+    Pipeline stage that diffs each issue (see diff_issue) and passes on only the issues with destination values that
+    actually need to change, or without a valid mapping (which get skipped with a result of their own). Notes them
+    and the finished pages in the journal.
+    :param issue_pages: Iterable of pages from match_issue_pages.
+    :param pair_field_indexes: Dictionary of the copy plan's pairs from get_pair_field_indexes.
+    :param option_id_tables: A dictionary mapping each CopyPair to its OptionIdTable.
+    :param journal: The CopyJournal of the run.
+    :return: Generator yielding IssueUpdate tuples.
+    """
+    for issues in issue_pages:
+        for record, pairs in issues:
+            outcome, desired_values = diff_issue(record, pairs, pair_field_indexes, option_id_tables)
+            if outcome == DiffOutcome.UP_TO_DATE:
+                continue
+
+            journal.record_queued(record.issue_id)
+            yield IssueUpdate(record.issue_id, record.issue_key, desired_values or {})
+        journal.record_page_diffed(issues[-1][0].issue_id)
+
+
+def plan_issue_pages(issue_pages, pair_field_indexes, option_id_tables, option_values, dry_run_file):
+    """
+    Pipeline stage of a dry run that diffs each issue (see diff_issue) like a real run, but instead of updating the
+    issues that need it, writes their update (with their save file rows, as a backup of the values seen) to the dry
+    run file, one JSON line per issue and one write per page.
+    :param issue_pages: Iterable of pages from match_issue_pages.
+    :param pair_field_indexes: Dictionary of the copy plan's pairs from get_pair_field_indexes.
+    :param option_id_tables: A dictionary mapping each CopyPair to its OptionIdTable.
+    :param option_values: List of one dictionary per scanned field mapping option IDs to values, from
+        parse_issue_pages.
+    :param dry_run_file: The open dry run file.
+    :return: Counter of the DiffOutcome of every issue.
+    """
+    outcome_counts = Counter({outcome: 0 for outcome in DiffOutcome})
+    for issues in issue_pages:
+        lines = []
+        for record, pairs in issues:
+            outcome, desired_values = diff_issue(record, pairs, pair_field_indexes, option_id_tables)
+            outcome_counts[outcome] += 1
+            if outcome == DiffOutcome.UPDATE:
+                lines.append(json.dumps({
+                    EVENT: EVENT_UPDATE, JsonFieldNames.ID: record.issue_id, JsonFieldNames.KEY: record.issue_key,
+                    VALUES: desired_values,
+                    BACKUP_ROWS: [get_backup_row(record, pair, pair_field_indexes, option_values) for pair in pairs]
+                }) + "\n")
+        dry_run_file.write("".join(lines))
+    return outcome_counts
+
+
+def estimate_copy_cost(update_count, search_requests, max_workers, requests_per_second):
+    """
+    Estimate how many requests the copy makes and how long it takes, from the time the update requests of the last
+    real run took (retries and backoff included), or from this dry run's searches before there was one.
+    :param update_count: Number of issues to update, one PUT request each.
+    :param search_requests: Number of search pages a full run pages through.
+    :param max_workers: Maximum number of updates in flight at once.
+    :param requests_per_second: (Optional) Maximum number of updates started per second.
+    :return: Dictionary of the estimate, with the durations in seconds.
+    """
+    search_seconds = METRICS.get_request_seconds(HTTP_POST) or 0.0
+    request_seconds = load_request_seconds(HTTP_PUT, f"{UPDATE_ENDPOINT}{{key}}")
+    latency_source = LOG_LATENCY_LAST_RUN
+    if request_seconds is None:
+        request_seconds, latency_source = search_seconds, LOG_LATENCY_DRY_RUN
+
+    workers = max(1, max_workers)
+    apply_seconds = update_count * request_seconds / workers
+    if requests_per_second:
+        apply_seconds = max(apply_seconds, update_count / requests_per_second)
+    return {"put_requests": update_count, "search_requests": search_requests, "request_seconds": request_seconds,
+            "latency_source": latency_source, "workers": workers, "rps": requests_per_second,
+            "apply_seconds": apply_seconds, "full_run_seconds": apply_seconds + search_requests * search_seconds}
+
+
+def format_duration(seconds):
+    """
+    :param seconds: A duration in seconds.
+    :return: The duration as "H:MM:SS", or in seconds below a minute.
+    """
+    return str(timedelta(seconds=round(seconds))) if seconds >= 60 else f"{seconds:.1f}s"
+
+
+def dry_run_copy(pairs, max_workers=1, requests_per_second=None, force_refresh=False, filename=DRY_RUN_FILENAME):
+    """
+    Work out what the copy would do without changing anything: count the issues with source values, scan and diff
+    them like a real run (projecting only the pairs' fields), estimate the requests and time of applying the updates,
+    and save the planned updates with a summary for apply_dry_run_pages. Its requests get reported as a run of their
+    own.
+    :param pairs: List of CopyPair tuples of the copy plan.
+    :param max_workers: Maximum number of updates the real run keeps in flight at once.
+    :param requests_per_second: (Optional) Maximum number of updates the real run starts per second.
+    :param force_refresh: When True, bypass the option catalog cache and re-download the options.
+    :param filename: Path of the dry run file.
+    :return: None
+    """
+    # the dry run's requests go into metrics of their own, keeping the update timings of the last real run
+    with METRICS.separate_run(f"{RUN_NAME}{DRY_RUN_METRICS_SUFFIX}"):
+        print(LOG_COUNT_ISSUES.format(fields=[CUSTOM_FIELD_JQL.format(source=pair.source) for pair in pairs]))
+        candidate_count = count_issues(get_copy_jql(pairs))
+        count_requests = METRICS.get_request_count(HTTP_POST, SEARCH_ENDPOINT)
+
+        option_id_tables = {pair: OptionIdTable(build_field_option_mapping(pair, force_refresh)) for pair in pairs}
+        pair_field_indexes = get_pair_field_indexes(pairs)
+        fields = get_scan_fields(pairs)
+        option_values = [{} for _ in fields]
+
+        with open(filename, FILE_WRITE_MODE) as dry_run_file:
+            dry_run_file.write(json.dumps({EVENT: EVENT_START, PAIRS: pairs}) + "\n")
+            print(LOG_FETCH_ISSUES.format(fields=[CUSTOM_FIELD_JQL.format(source=pair.source) for pair in pairs]))
+            issue_pages = get_issues_with_source_field_values(pairs, PAGE_SIZE)
+            issue_pages = parse_issue_pages(issue_pages, fields, option_values)
+            issue_pages = match_issue_pages(issue_pages, pair_field_indexes)
+            outcome_counts = plan_issue_pages(issue_pages, pair_field_indexes, option_id_tables, option_values,
+                                              dry_run_file)
+
+            # the search pages the main scan and the scans of the pairs with JQL of their own took, as many as a real
+            # run takes, at whatever page size Jira capped maxResults to
+            search_requests = METRICS.get_request_count(HTTP_POST, SEARCH_ENDPOINT) - count_requests
+            estimate = estimate_copy_cost(outcome_counts[DiffOutcome.UPDATE], search_requests, max_workers,
+                                          requests_per_second)
+            # the summary comes last, so a dry run file without one is known to be incomplete
+            dry_run_file.write(json.dumps({EVENT: EVENT_SUMMARY, CREATED: datetime.now(timezone.utc).isoformat(),
+                                           COUNTS: outcome_counts, ESTIMATE: estimate}) + "\n")
+
+        print(LOG_DRY_RUN_COUNTS.format(candidates=candidate_count, updates=outcome_counts[DiffOutcome.UPDATE],
+                                        up_to_date=outcome_counts[DiffOutcome.UP_TO_DATE],
+                                        no_mapping=outcome_counts[DiffOutcome.NO_MAPPING]))
+        print(LOG_DRY_RUN_ESTIMATE.format(
+            **estimate, rate=LOG_DRY_RUN_RATE.format(rps=requests_per_second) if requests_per_second else "",
+            apply_duration=format_duration(estimate["apply_seconds"]),
+            full_run_duration=format_duration(estimate["full_run_seconds"])))
+        print(LOG_DRY_RUN_SAVED.format(filename=filename))
+
+
+def load_dry_run_summary(filename, pairs):
+    """
+    Check that a dry run file is complete and plans the same copy, exiting with an error otherwise.
+    :param filename: Path of the dry run file.
+    :param pairs: List of CopyPair tuples of the copy plan.
+    :return: The dry run's summary record (as a dictionary).
+    """
+    start, summary = None, None
+    try:
+        with open(filename, FILE_READ_MODE) as dry_run_file:
+            for line in dry_run_file:
+                record = json.loads(line)
+                start = start or record
+                summary = record if record[EVENT] == EVENT_SUMMARY else None
+    except (OSError, ValueError, KeyError, TypeError) as error:
+        print(ERROR_MSG_DRY_RUN.format(filename=filename, error=error))
+        sys.exit(1)
+
+    if not summary or start.get(EVENT) != EVENT_START:
+        print(ERROR_MSG_DRY_RUN.format(filename=filename, error=ERROR_MSG_DRY_RUN_INCOMPLETE))
+        sys.exit(1)
+    if [CopyPair(*pair) for pair in start[PAIRS]] != pairs:
+        print(ERROR_MSG_DRY_RUN.format(filename=filename, error=ERROR_MSG_DRY_RUN_PAIRS.format(pairs=start[PAIRS])))
+        sys.exit(1)
+    return summary
+
+
+def read_dry_run_pages(filename, page_size=PAGE_SIZE):
+    """
+    Stream the planned updates back from a dry run file, a page at a time.
+    :param filename: Path of the dry run file.
+    :param page_size: Number of planned updates per page.
+    :return: Generator yielding the pages (as lists of update records, in issue ID order).
+    """
+    page = []
+    with open(filename, FILE_READ_MODE) as dry_run_file:
+        for line in dry_run_file:
+            record = json.loads(line)
+            if record[EVENT] != EVENT_UPDATE:
+                continue
+            page.append(record)
+            if len(page) >= page_size:
+                yield page
+                page = []
+    if page:
+        yield page
+
+
+def apply_dry_run_pages(dry_run_pages, save_file, journal):
+    """
+    Pipeline stage that stands in for the scan and diff stages when applying a dry run: it appends each page's saved
+    rows to the save file (synced to disk before its journal checkpoint, like backup_issue_pages), and then passes on
+    the planned updates, noting them and the finished pages in the journal. Issues the journal records as backed up
+    or handled already get skipped, so a resumed run continues where it stopped.
+    :param dry_run_pages: Iterable of pages from read_dry_run_pages.
+    :param save_file: The BackupWriter of the run.
+    :param journal: The CopyJournal of the run.
+    :return: Generator yielding IssueUpdate tuples.
+    """
+    for records in dry_run_pages:
+        for record in records:
+            if record[JsonFieldNames.ID] > journal.backup_cursor:
+                for row in record[BACKUP_ROWS]:
+                    save_file.add(row)
+        last_issue_id = records[-1][JsonFieldNames.ID]
+        if last_issue_id > journal.backup_cursor:
+            journal.record_backup(last_issue_id, save_file.flush(sync=True))
+
+        for record in records:
+            if record[JsonFieldNames.ID] > journal.cursor:
+                journal.record_queued(record[JsonFieldNames.ID])
+                yield IssueUpdate(record[JsonFieldNames.ID], record[JsonFieldNames.KEY], record[VALUES])
+        journal.record_page_diffed(last_issue_id)
+
+
+def parse_arguments():
+    """
+    Parse the command line arguments for the script.
+    :return: The parsed arguments namespace.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(BACKUP_FORMAT_ARGUMENT, choices=BACKUP_FORMATS, default=BACKUP_FORMAT_CSV,
+                        help=BACKUP_FORMAT_HELP)
+    modes = parser.add_mutually_exclusive_group()
+    modes.add_argument(DRY_RUN_ARGUMENT, action="store_true", help=DRY_RUN_HELP)
+    modes.add_argument(APPLY_DRY_RUN_ARGUMENT, nargs="?", const=DRY_RUN_FILENAME, default=None,
+                       help=APPLY_DRY_RUN_HELP)
+    parser.add_argument(EVENT_LOOP_ARGUMENT, action="store_true", help=EVENT_LOOP_HELP)
+    parser.add_argument(PLAN_ARGUMENT, default=None, help=PLAN_HELP)
+    parser.add_argument(REFRESH_METADATA_ARGUMENT, action="store_true", help=REFRESH_METADATA_HELP)
+    parser.add_argument(RESUME_ARGUMENT, action="store_true", help=RESUME_HELP)
+    parser.add_argument(RPS_ARGUMENT, type=float, default=None, help=RPS_HELP)
+    parser.add_argument(WORKERS_ARGUMENT, type=int, default=1, help=WORKERS_HELP)
+    return parser.parse_args()
+
+
+def main():
+    """
+    The script processes and updates issues with specific custom field values in a paginated manner using the JIRA API.
+    It copies one source to destination field pair, or every pair of a --plan file in the same pass. It first builds
+    a mapping of field option IDs from each pair's cataloged options. Then it streams the issues containing relevant
+    field values page by page, in one scan projecting the fields of all pairs, turning each issue into a compact
+    record of its option IDs as its page arrives; pairs with different JQL add one ID-only scan per distinct JQL to
+    tell which of them an issue falls under, as Jira doesn't report which part of the scan's JQL matched. A pipeline
+    writes each issue's current state into a save file as a backup, works out the required field values, and applies
+    updates only where they are necessary (one request per issue for all its fields, optionally several at once), so
+    memory stays bounded by the page size rather than the number of issues.
+    Progress goes to a journal, so after a crash a run with --resume skips the completed pages and updates and keeps
+    the backup. A --dry-run only counts, diffs and estimates, saving the planned updates, which --apply-dry-run then
+    applies (backing up the values the dry run saw) without re-diffing.
+    :return: None
+    """
+    arguments = parse_arguments()
+    JIRA_CLIENT.set_pool_size(max(arguments.workers, POOL_SIZE))
+    pairs = load_copy_plan(arguments.plan) if arguments.plan else DEFAULT_COPY_PLAN
+
+    if arguments.dry_run:
+        dry_run_copy(pairs, arguments.workers, arguments.rps, arguments.refresh_metadata)
+        return
+    if arguments.apply_dry_run:
+        summary = load_dry_run_summary(arguments.apply_dry_run, pairs)
+        created = datetime.fromisoformat(summary[CREATED])
+        print(LOG_APPLY_DRY_RUN.format(created=summary[CREATED],
+                                       age=format_duration((datetime.now(timezone.utc) - created).total_seconds()),
+                                       updates=summary[COUNTS][DiffOutcome.UPDATE],
+                                       up_to_date=summary[COUNTS][DiffOutcome.UP_TO_DATE],
+                                       no_mapping=summary[COUNTS][DiffOutcome.NO_MAPPING]))
+
+    journal = CopyJournal(resume=arguments.resume)
+    journal.start(pairs, arguments.backup_format)
+    if journal.resumed:
+        print(LOG_RESUME_FINISHED if journal.finished else LOG_RESUME.format(
+            cursor=journal.cursor, completed=journal.completed_count, failed=len(journal.failed_updates)))
+
+    # open the save file for the whole run; a resumed run appends to it after the last checkpoint instead
+    save_file = create_save_file(journal.backup_format, journal.backup_offset)
+    finished = False
+    try:
+        if arguments.apply_dry_run:
+            updates = apply_dry_run_pages(read_dry_run_pages(arguments.apply_dry_run), save_file, journal)
+            apply_updates(updates, journal, arguments.workers, arguments.rps, arguments.event_loop)
+            finished = True
+            return
+
+        # resolve the option mappings before streaming, since they no longer depend on the issues seen
+        option_id_tables = {pair: OptionIdTable(build_field_option_mapping(pair, arguments.refresh_metadata))
+                            for pair in pairs}
+        pair_field_indexes = get_pair_field_indexes(pairs)
+        fields = get_scan_fields(pairs)
+        option_values = [{} for _ in fields]
+
+        print(LOG_FETCH_ISSUES.format(fields=[CUSTOM_FIELD_JQL.format(source=pair.source) for pair in pairs]))
+        issue_pages = get_issues_with_source_field_values(pairs, PAGE_SIZE, journal.cursor)
+        issue_pages = parse_issue_pages(issue_pages, fields, option_values)
+        issue_pages = match_issue_pages(issue_pages, pair_field_indexes, journal.cursor)
+        issue_pages = backup_issue_pages(issue_pages, pair_field_indexes, option_values, save_file, journal)
+        updates = diff_issue_pages(issue_pages, pair_field_indexes, option_id_tables, journal)
+        apply_updates(updates, journal, arguments.workers, arguments.rps, arguments.event_loop)
+        finished = True
+    finally:
+        save_file.close()
+        journal.close(finished)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,102 @@
+#!../.venv/bin/python
+import argparse
+from utils.issue_index import (build_issue_index, open_issue_index, read_indexed_field_usage, update_issue_index,
+                               GROUP_BY_COLUMNS)
+from utils.jira_utils import fetch_custom_fields, JsonFieldNames, LOG_FETCH_FIELDS
+from utils.report_sink import REPORT_FORMAT_CSV, REPORT_FORMATS, open_report_sink
+
+# key global variables
+OUTPUT_FILENAME_STEM = "4_issue_field_index_report"
+HEADER_FIELD_NAMES = ["custom_field_id", "custom_field_name", "issues_using_field"]
+
+# command line arguments
+COMMAND_BUILD = "build"
+COMMAND_BUILD_HELP = "sync every issue from Jira into a fresh local index"
+COMMAND_REFRESH = "refresh"
+COMMAND_REFRESH_HELP = ("apply the issues updated in Jira since the last sync to the local index, dropping deleted "
+                        "issues")
+COMMAND_REPORT = "report"
+COMMAND_REPORT_HELP = "write a custom field usage report from the local index without calling Jira"
+FORMAT_ARGUMENT = "--format"
+FORMAT_HELP = ("format of the report file, named after the format; 'parquet' needs the optional pyarrow package "
+               "(default: %(default)s)")
+FULL_ARGUMENT = "--full"
+FULL_HELP = "re-sync every issue instead of only the ones updated since the last sync"
+GROUP_BY_ARGUMENT = "--group-by"
+GROUP_BY_HELP = "issue attribute to break the usage down by (default: total usage only)"
+REFRESH_METADATA_ARGUMENT = "--refresh-metadata"
+REFRESH_METADATA_HELP = "ignore the local metadata cache and re-download the custom fields"
+
+# console log messages
+LOG_WRITE_SUCCESS = "Custom field usage data from the local index has been written to {filename} successfully."
+
+
+def write_field_usage(custom_fields, field_usage, group_by, report_format=REPORT_FORMAT_CSV):
+    """
+    Write the custom field usage from the index to a report file, with one row per field or per (field, group value).
+    :param custom_fields: List of custom fields (as dictionaries) from fetch_custom_fields.
+    :param field_usage: Dictionary of usage from query_indexed_field_usage.
+    :param group_by: The issue attribute the usage got grouped by, or None for total usage.
+    :param report_format: One of REPORT_FORMATS.
+    :return: None
+    """
+    header = HEADER_FIELD_NAMES[:2] + [group_by] + HEADER_FIELD_NAMES[2:] if group_by else HEADER_FIELD_NAMES
+    with open_report_sink(OUTPUT_FILENAME_STEM, header, report_format) as report:
+        for field in custom_fields:
+            usage = field_usage.get(field[JsonFieldNames.ID], {} if group_by else 0)
+            if not group_by:
+                report.add([field[JsonFieldNames.ID], field[JsonFieldNames.NAME], usage])
+                continue
+            for group_value, group_usage in sorted(usage.items(), key=lambda item: str(item[0])):
+                report.add([field[JsonFieldNames.ID], field[JsonFieldNames.NAME], group_value, group_usage])
+
+    print(LOG_WRITE_SUCCESS.format(filename=report.filename))
+
+
+def parse_arguments():
+    """
+    Parse the command line arguments for the script.
+    :return: The parsed arguments namespace.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(REFRESH_METADATA_ARGUMENT, action="store_true", help=REFRESH_METADATA_HELP)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser(COMMAND_BUILD, help=COMMAND_BUILD_HELP)
+    refresh_parser = commands.add_parser(COMMAND_REFRESH, help=COMMAND_REFRESH_HELP)
+    refresh_parser.add_argument(FULL_ARGUMENT, action="store_true", help=FULL_HELP)
+    report_parser = commands.add_parser(COMMAND_REPORT, help=COMMAND_REPORT_HELP)
+    report_parser.add_argument(GROUP_BY_ARGUMENT, choices=list(GROUP_BY_COLUMNS), default=None, help=GROUP_BY_HELP)
+    report_parser.add_argument(FORMAT_ARGUMENT, choices=REPORT_FORMATS, default=REPORT_FORMAT_CSV, help=FORMAT_HELP)
+    return parser.parse_args()
+
+
+def main():
+    """
+    The script maintains a local SQLite index of which custom fields every issue populates, so usage questions (in
+    total, or per project, issue type, or status) get answered locally instead of by fresh JQL count queries. The
+    'build' command streams every issue from Jira into the index in batches, the 'refresh' command applies only the
+    issues changed since the last sync's watermark, and the 'report' command writes a usage report from the index
+    without calling the Jira search API.
+    :return: None
+    """
+    arguments = parse_arguments()
+
+    print(LOG_FETCH_FIELDS)
+    custom_fields = fetch_custom_fields(arguments.refresh_metadata)
+
+    if arguments.command == COMMAND_REPORT:
+        field_usage = read_indexed_field_usage(arguments.group_by)
+        write_field_usage(custom_fields, field_usage, arguments.group_by, arguments.format)
+        return
+
+    if arguments.command == COMMAND_REFRESH:
+        update_issue_index(custom_fields, arguments.full)
+        return
+
+    connection = open_issue_index()
+    build_issue_index(connection, custom_fields)
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
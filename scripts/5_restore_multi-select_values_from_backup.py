@@ -0,0 +1,287 @@
+#!../.venv/bin/python
+import argparse
+import time
+from collections import namedtuple
+from enum import StrEnum
+from http import HTTPStatus
+from itertools import islice
+from utils.issue_backup import BACKUP_FORMAT_CSV, get_backup_filename, read_backup
+from utils.jira_utils import FIELDS, HTTP_PUT, ISSUE_ENDPOINT, JIRA_CLIENT, OPTION_CATALOG, POOL_SIZE, JsonFieldNames
+from utils.jira_utils import TRANSPORT_ERRORS, VALIDATE_QUERY_WARN, JiraRequest, run_exchanges, scan_issues
+
+# key global variables
+MULTI_SELECT_DESTINATION = "10113"
+SAVE_FILENAME_STEM = "3-after_current_multi_select_fields"
+LOOKUP_BATCH_SIZE = 100  # issues per 'id in (...)' search, keeping the JQL well under URL and parser limits
+PROGRESS_INTERVAL = 100
+
+# additional global variables
+CUSTOM_FIELD_JSON = "customfield_"
+DESTINATION_FIELD = "destination_field"
+DESTINATION_VALUES = "destination_values"
+ID_IN_JQL = "id in ({issue_ids})"
+ISSUE_ID = "issue_id"
+ISSUE_KEY = "issue_key"
+KEY_IN_JQL = "key in ({issue_keys})"
+
+# command line arguments
+BACKUP_FILE_ARGUMENT = "--backup-file"
+BACKUP_FILE_HELP = "backup file written by the copy script, in either backup format (default: %(default)s)"
+EVENT_LOOP_ARGUMENT = "--event-loop"
+EVENT_LOOP_HELP = ("restore the issues as coroutines on one asyncio event loop (needs aiohttp) instead of on worker "
+                   "threads, with --workers of them in flight")
+REFRESH_METADATA_ARGUMENT = "--refresh-metadata"
+REFRESH_METADATA_HELP = "ignore the local option catalog cache and re-download the fields' options"
+RPS_ARGUMENT = "--rps"
+RPS_HELP = "maximum number of issue restores started per second (default: unlimited)"
+WORKERS_ARGUMENT = "--workers"
+WORKERS_HELP = "number of issue restores kept in flight at once (default: 1, serial)"
+
+# console error and log messages
+LOG_FETCH_ALLOWED_VALUES = "Fetching the allowed values of field '{field}'..."
+LOG_READ_BACKUP = "Restoring the destination fields from the backup file '{filename}'..."
+LOG_RESTORE_FAILURE = ("Failed to restore issue '{issue_key}' for fields {fields}. Status Code: {status_code}. "
+                       "Response: {response}")
+LOG_RESTORE_PROGRESS = "Restored {restored} field values ({failed} failed) at {rate:.1f} per second..."
+LOG_RESTORE_SUMMARY = ("Restore results: {restored} field values restored, {skipped} already matching, {unresolved} "
+                       "with unresolvable values, {missing} no longer in Jira, {failed} failed, in {elapsed:.1f} "
+                       "seconds ({rate:.1f} per second).")
+LOG_RESTORES_FAILED = "Issues that failed to restore: {issue_keys}"
+WARNING_ISSUE_MISSING = "Warning: Issue '{issue_key}' from the backup no longer exists. Skipping..."
+WARNING_NO_OPTIONS = "Warning: No options found for field '{field}', so its backed up values cannot be resolved."
+WARNING_UNRESOLVED_VALUES = ("Warning: Values {values} of field '{field}' of issue '{issue_key}' are no longer "
+                             "options. Skipping...")
+
+
+class RestoreStatus(StrEnum):
+    """
+    A class representing enumeration of the outcomes of restoring a single backed up field value.
+    """
+    FAILED = "failed"
+    MISSING = "missing"
+    RESTORED = "restored"
+    SKIPPED = "skipped"
+    UNRESOLVED = "unresolved"
+
+
+# the current state of a backed up issue: its ID, and each destination field's current option IDs (as sets)
+CurrentIssue = namedtuple("CurrentIssue", ["issue_id", "option_ids"])
+
+# a pending restore of one issue's destination fields, mapping each field ID to the option IDs of its backed up values
+IssueRestore = namedtuple("IssueRestore", ["issue_key", "issue_id", "desired_ids"])
+
+
+def get_field_options(fetched_fields, field_id, issue_key, force_refresh=False):
+    """
+    Get a field's options from the option catalog, logging (and with force_refresh, re-downloading) them only the
+    first time the field comes up.
+    :param fetched_fields: Set of the field IDs already looked up, updated in place.
+    :param field_id: The ID of the custom field (for example, "customfield_10113").
+    :param issue_key: The key of an issue with the field, for the catalog to fall back to its edit metadata.
+    :param force_refresh: When True, bypass the option catalog cache on the first lookup of the field.
+    :return: FieldOptions of the field.
+    """
+    if field_id in fetched_fields:
+        return OPTION_CATALOG.get(field_id, issue_key)
+
+    fetched_fields.add(field_id)
+    print(LOG_FETCH_ALLOWED_VALUES.format(field=field_id))
+    field_options = OPTION_CATALOG.get(field_id, issue_key, force_refresh=force_refresh)
+    if not field_options:
+        print(WARNING_NO_OPTIONS.format(field=field_id))
+    return field_options
+
+
+def get_destination_field(row):
+    """
+    Get the destination field of a backup row; backups from before copy plans only cover MULTI_SELECT_DESTINATION.
+    :param row: Backup row (as a dictionary) from read_backup.
+    :return: The ID of the destination field (for example, "customfield_10113").
+    """
+    return row.get(DESTINATION_FIELD) or f"{CUSTOM_FIELD_JSON}{MULTI_SELECT_DESTINATION}"
+
+
+def get_issue_id(row):
+    """
+    Get the issue ID of a backup row; backups from before the issue ID column only identify issues by key.
+    :param row: Backup row (as a dictionary) from read_backup.
+    :return: The issue ID (as a string), or None if the backup has no issue IDs.
+    """
+    return str(row[ISSUE_ID]) if row.get(ISSUE_ID) else None
+
+
+def get_issue_reference(row, by_id):
+    """
+    Get what identifies a backup row's issue in the results of fetch_current_issues.
+    :param row: Backup row (as a dictionary) from read_backup.
+    :param by_id: Whether the issues got looked up by ID rather than by key.
+    :return: The issue ID or key.
+    """
+    return get_issue_id(row) if by_id else row[ISSUE_KEY]
+
+
+def resolve_option_ids(values, field_options):
+    """
+    Resolve backed up option values to their option IDs.
+    :param values: List of option values from the backup.
+    :param field_options: FieldOptions of the field, fetched once for the whole restore.
+    :return: Tuple of the set of resolved option IDs and the list of values that are no longer options.
+    """
+    option_ids = [field_options.get_id(value) for value in values]
+    resolved_ids = {option_id for option_id in option_ids if option_id}
+    unresolved_values = [value for value, option_id in zip(values, option_ids) if not option_id]
+    return resolved_ids, unresolved_values
+
+
+def fetch_current_issues(issue_references, field_ids, by_id):
+    """
+    Fetch the current option IDs of the destination fields of a batch of issues with a single search. The search
+    only warns about issues that no longer exist, where Jira would otherwise reject the whole batch with a 400
+    BAD_REQUEST, so deleted issues simply come back missing. Issue IDs survive moves between projects while keys
+    change, so a moved issue only comes back under its backed up reference when looked up by ID.
+    :param issue_references: List of issue IDs, or of issue keys for backups without issue IDs.
+    :param field_ids: List of the destination field IDs.
+    :param by_id: Whether the references are issue IDs rather than keys.
+    :return: A dictionary mapping the references of the issues that still exist to their CurrentIssue.
+    """
+    unique_references = ", ".join(dict.fromkeys(issue_references))
+    if by_id:
+        jql, reference_name = ID_IN_JQL.format(issue_ids=unique_references), JsonFieldNames.ID
+    else:
+        jql, reference_name = KEY_IN_JQL.format(issue_keys=unique_references), JsonFieldNames.KEY
+    return {
+        str(issue[reference_name]): CurrentIssue(issue[JsonFieldNames.ID], {
+            field_id: {option[JsonFieldNames.ID] for option in issue[FIELDS].get(field_id) or []}
+            for field_id in field_ids
+        })
+        for issue in scan_issues(field_ids, jql, len(issue_references), validate_query=VALIDATE_QUERY_WARN)
+    }
+
+
+def plan_restores(rows, status_counts, force_refresh=False):
+    """
+    Pipeline stage that compares the backed up destination values of batches of issues with their current ones, and
+    passes on only the values that need restoring, merged into one restore per issue, counting the rest by why they
+    got skipped.
+    :param rows: Iterable of backup rows (as dictionaries) from read_backup, one per issue and destination field.
+    :param status_counts: Dictionary counting the RestoreStatus of every backed up field value, updated in place.
+    :param force_refresh: When True, bypass the option catalog cache and re-download the options.
+    :return: Generator yielding IssueRestore tuples.
+    """
+    fetched_fields = set()
+    rows = iter(rows)
+    while batch := list(islice(rows, LOOKUP_BATCH_SIZE)):
+        field_ids = sorted({get_destination_field(row) for row in batch})
+        by_id = all(get_issue_id(row) for row in batch)
+        current_issues = fetch_current_issues([get_issue_reference(row, by_id) for row in batch], field_ids, by_id)
+        restores = {}
+        for row in batch:
+            issue_key = row[ISSUE_KEY]
+            field_id = get_destination_field(row)
+            current_issue = current_issues.get(get_issue_reference(row, by_id))
+            if not current_issue:
+                print(WARNING_ISSUE_MISSING.format(issue_key=issue_key))
+                status_counts[RestoreStatus.MISSING] += 1
+                continue
+
+            field_options = get_field_options(fetched_fields, field_id, issue_key, force_refresh)
+            desired_ids, unresolved_values = resolve_option_ids(row[DESTINATION_VALUES], field_options)
+            if unresolved_values:
+                print(WARNING_UNRESOLVED_VALUES.format(values=unresolved_values, field=field_id, issue_key=issue_key))
+                status_counts[RestoreStatus.UNRESOLVED] += 1
+                continue
+
+            # skip the values the issues already hold, for example after a partial restore
+            if current_issue.option_ids[field_id] == desired_ids:
+                status_counts[RestoreStatus.SKIPPED] += 1
+                continue
+            restores.setdefault((issue_key, current_issue.issue_id), {})[field_id] = desired_ids
+
+        for (issue_key, issue_id), desired_ids in restores.items():
+            yield IssueRestore(issue_key, issue_id, desired_ids)
+
+
+def restore_issue_exchange(restore):
+    """
+    Exchange setting an issue's destination fields back to their backed up options in one request, for running on
+    the restore worker pool or event loop.
+    :param restore: The IssueRestore to apply.
+    :return: Exchange generator returning a tuple of the IssueRestore and its RestoreStatus.
+    """
+    payload = {FIELDS: {
+        field_id: [{str(JsonFieldNames.ID): option_id} for option_id in option_ids]
+        for field_id, option_ids in restore.desired_ids.items()
+    }}
+    try:
+        # by ID, which still addresses the issue after a move to another project changed its key
+        response = yield JiraRequest(HTTP_PUT, f"{ISSUE_ENDPOINT}{restore.issue_id}", {"json": payload})
+    except TRANSPORT_ERRORS as error:
+        print(LOG_RESTORE_FAILURE.format(issue_key=restore.issue_key, fields=list(restore.desired_ids),
+                                         status_code=None, response=str(error)))
+        return restore, RestoreStatus.FAILED
+
+    if response.status_code != HTTPStatus.NO_CONTENT:
+        print(LOG_RESTORE_FAILURE.format(issue_key=restore.issue_key, fields=list(restore.desired_ids),
+                                         status_code=response.status_code, response=response.text))
+        return restore, RestoreStatus.FAILED
+    return restore, RestoreStatus.RESTORED
+
+
+def parse_arguments():
+    """
+    Parse the command line arguments for the script.
+    :return: The parsed arguments namespace.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(BACKUP_FILE_ARGUMENT, default=get_backup_filename(SAVE_FILENAME_STEM, BACKUP_FORMAT_CSV),
+                        help=BACKUP_FILE_HELP)
+    parser.add_argument(EVENT_LOOP_ARGUMENT, action="store_true", help=EVENT_LOOP_HELP)
+    parser.add_argument(REFRESH_METADATA_ARGUMENT, action="store_true", help=REFRESH_METADATA_HELP)
+    parser.add_argument(RPS_ARGUMENT, type=float, default=None, help=RPS_HELP)
+    parser.add_argument(WORKERS_ARGUMENT, type=int, default=1, help=WORKERS_HELP)
+    return parser.parse_args()
+
+
+def main():
+    """
+    The script rolls the destination multi-select fields back to the values in the backup file the copy script wrote
+    before changing anything. It resolves the backed up values to option IDs through the option catalog (at most one
+    fetch per field), streams the backup in batches, looks up each batch's current values with one search, and
+    restores only the values that differ (one request per issue), several issues at once, reporting progress and
+    throughput as it goes.
+    :return: None
+    """
+    arguments = parse_arguments()
+    JIRA_CLIENT.set_pool_size(max(arguments.workers, POOL_SIZE))
+
+    print(LOG_READ_BACKUP.format(filename=arguments.backup_file))
+    status_counts = {status: 0 for status in RestoreStatus}
+    failed_keys = []
+    start_time = time.monotonic()
+    processed = 0
+    restores = plan_restores(read_backup(arguments.backup_file), status_counts, arguments.refresh_metadata)
+    for restore, status in run_exchanges(map(restore_issue_exchange, restores), arguments.workers, arguments.rps,
+                                         arguments.event_loop):
+        status_counts[status] += len(restore.desired_ids)
+        if status == RestoreStatus.FAILED:
+            failed_keys.append(restore.issue_key)
+
+        processed += 1
+        if processed % PROGRESS_INTERVAL == 0:
+            print(LOG_RESTORE_PROGRESS.format(restored=status_counts[RestoreStatus.RESTORED],
+                                              failed=status_counts[RestoreStatus.FAILED],
+                                              rate=processed / max(time.monotonic() - start_time, 1e-9)))
+
+    elapsed = time.monotonic() - start_time
+    if failed_keys:
+        print(LOG_RESTORES_FAILED.format(issue_keys=failed_keys))
+    print(LOG_RESTORE_SUMMARY.format(restored=status_counts[RestoreStatus.RESTORED],
+                                     skipped=status_counts[RestoreStatus.SKIPPED],
+                                     unresolved=status_counts[RestoreStatus.UNRESOLVED],
+                                     missing=status_counts[RestoreStatus.MISSING],
+                                     failed=status_counts[RestoreStatus.FAILED],
+                                     elapsed=elapsed, rate=sum(status_counts.values()) / max(elapsed, 1e-9)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+#!../.venv/bin/python
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import product
+from urllib.parse import urlparse
+from utils.issue_index import read_indexed_field_usage, update_issue_index
+from utils.jira_utils import (fetch_custom_fields, fetch_projects, probe_jql_strategies,
+                              query_issues_using_field_exchange, run_exchanges, scan_field_usage_by_project,
+                              ACCEPT_ENCODING_HEADER, CONTENT_TYPE_HEADER,
+                              CONTENT_TYPE_JSON, ETAG_HEADER, IF_NONE_MATCH_HEADER, JIRA_CLIENT, JsonFieldNames,
+                              METADATA_CACHE_TTL_SECONDS, POOL_SIZE, PROJECT, RETRY_AFTER_HEADER)
+from utils.run_metrics import METRICS, PHASE_FETCH, PHASE_QUERY
+
+# key global variables
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_INTERVAL_SECONDS = 900
+FIELD_USAGE_PATH = "/usage"
+FIELD_USAGE_BY_PROJECT_PATH = "/usage/by-project"
+HEALTH_PATH = "/health"
+REFRESH_PATH = "/refresh"
+HEADER_FIELD_NAMES = ["custom_field_id", "custom_field_name", "issues_using_field"]
+HEADER_FIELD_NAMES_BY_PROJECT = ["custom_field_id", "custom_field_name", "project_key", "project_name",
+                                 "issues_using_field"]
+
+# additional global variables
+CACHE_CONTROL_HEADER = "Cache-Control"
+CACHE_CONTROL_NO_CACHE = "no-cache"  # clients may keep a copy, but revalidate it with If-None-Match
+CONTENT_ENCODING_HEADER = "Content-Encoding"
+CONTENT_LENGTH_HEADER = "Content-Length"
+GZIP_ENCODING = "gzip"
+STARTING_RETRY_AFTER_SECONDS = 5
+
+# a served JSON document, serialized (and compressed) once per refresh rather than once per request
+ReportDocument = namedtuple("ReportDocument", ["body", "gzip_body", "etag"])
+
+# command line arguments
+HOST_ARGUMENT = "--host"
+HOST_HELP = "interface to serve the usage reports on (default: %(default)s, local only)"
+INTERVAL_ARGUMENT = "--interval"
+INTERVAL_HELP = "seconds between the end of one refresh and the start of the next (default: %(default)s)"
+MODE_ARGUMENT = "--mode"
+MODE_INCREMENTAL = "incremental"
+MODE_QUERY = "query"
+MODE_SCAN = "scan"
+MODE_HELP = (f"how every refresh computes the usage: '{MODE_SCAN}' builds both tables from one pass over all issues; "
+             f"'{MODE_QUERY}' runs one JQL count query per custom field and per (custom field, project) pair; "
+             f"'{MODE_INCREMENTAL}' applies the issues changed since the last sync to the local issue index built by "
+             f"4_issue_field_index.py, then reads from it (default: %(default)s)")
+PORT_ARGUMENT = "--port"
+PORT_HELP = "port to serve the usage reports on (default: %(default)s)"
+RPS_ARGUMENT = "--rps"
+RPS_HELP = f"maximum number of '{MODE_QUERY}' mode count queries started per second (default: unlimited)"
+WORKERS_ARGUMENT = "--workers"
+WORKERS_HELP = f"number of '{MODE_QUERY}' mode count queries kept in flight at once (default: 1, serial)"
+
+# console error and log messages
+ERROR_MSG_NOT_FOUND = "No report at '{path}'; try " + ", ".join([FIELD_USAGE_PATH, FIELD_USAGE_BY_PROJECT_PATH,
+                                                                  HEALTH_PATH])
+ERROR_MSG_NOT_READY = "The first refresh has not finished yet."
+ERROR_MSG_REFRESH_FAILED = "Error: Refreshing the usage reports failed ({error}); still serving the previous ones."
+LOG_REFRESH_DONE = ("Refreshed the usage of {field_count} custom fields across {project_count} projects in "
+                    "{seconds:.1f}s; next refresh in {interval:g}s.")
+LOG_REFRESH_REQUESTED = "Refresh requested over HTTP..."
+LOG_REFRESH_START = "Refreshing the usage reports ({mode} mode)..."
+LOG_SERVING = "Serving the usage reports at http://{host}:{port}{path} (Ctrl+C to stop)"
+
+
+def build_document(content):
+    """
+    Serialize a JSON document for serving, with its gzip compressed form and a strong ETag of its content.
+    :param content: The JSON-serializable content.
+    :return: The ReportDocument.
+    """
+    body = json.dumps(content).encode()
+    return ReportDocument(body, gzip.compress(body), f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+
+def query_field_usage_exchange(field_and_project):
+    """
+    Exchange querying the number of issues using a custom field, in one project or across all of them.
+    :param field_and_project: Tuple of a custom field and a project (as dictionaries), the project None for all
+        projects.
+    :return: Exchange generator returning the number of issues using the field.
+    """
+    field, project = field_and_project
+    clause_name = field[JsonFieldNames.CLAUSE_NAMES][0]
+    schema_type = field.get(JsonFieldNames.SCHEMA, {}).get(JsonFieldNames.TYPE, JsonFieldNames.UNKNOWN)
+    project_key = project[JsonFieldNames.KEY] if project else None
+    return (yield from query_issues_using_field_exchange(clause_name, schema_type, project_key))
+
+
+class UsageReportDaemon:
+    """
+    Keeps the custom field usage reports warm in memory for a long-running process: the pooled JIRA_CLIENT, the
+    custom field and project metadata (revalidated with Jira once METADATA_CACHE_TTL_SECONDS pass), and the usage
+    tables (in total and per project) all survive between refreshes, which run on a background thread on a schedule
+    or on request. Readers get the current documents, already serialized, without waiting on Jira; a failed refresh
+    keeps the previous ones.
+    """
+
+    def __init__(self, mode=MODE_SCAN, interval_seconds=DEFAULT_INTERVAL_SECONDS, workers=1,
+                 requests_per_second=None):
+        """
+        :param mode: How every refresh computes the usage, one of MODE_SCAN, MODE_QUERY or MODE_INCREMENTAL.
+        :param interval_seconds: Seconds between the end of one refresh and the start of the next.
+        :param workers: Number of query mode count queries kept in flight at once.
+        :param requests_per_second: (Optional) Maximum number of query mode count queries started per second.
+        """
+        self.mode = mode
+        self.interval_seconds = interval_seconds
+        self.workers = workers
+        self.requests_per_second = requests_per_second
+        self.custom_fields = None
+        self.projects = None
+        self.metadata_fetched_at = None
+        self.lock = threading.Lock()
+        self.documents = {}
+        self.refresh_requested = threading.Event()
+        self.thread = None
+        self.status = {"mode": mode, "interval_seconds": interval_seconds, "refreshing": False, "refreshes": 0,
+                       "failures": 0, "last_refresh": None, "last_refresh_seconds": None, "last_error": None}
+
+    def compute_usage(self, custom_fields, projects):
+        """
+        Compute the usage tables with the daemon's mode.
+        :param custom_fields: List of custom fields (as dictionaries) from fetch_custom_fields.
+        :param projects: List of projects (as dictionaries) from fetch_projects.
+        :return: Tuple of the usage per custom field ID, and of a dictionary of usage per project key per custom
+        field ID.
+        """
+        if self.mode == MODE_SCAN:
+            usage_by_project = scan_field_usage_by_project(custom_fields)
+            # every issue is in exactly one project, so the per-project counts add up to the total
+            return {field_id: sum(usage.values()) for field_id, usage in usage_by_project.items()}, usage_by_project
+
+        if self.mode == MODE_INCREMENTAL:
+            update_issue_index(custom_fields)
+            return read_indexed_field_usage(), read_indexed_field_usage(PROJECT)
+
+        if self.workers > 1:
+            probe_jql_strategies(custom_fields, self.workers)
+        # the totals come first, then the (field 'id', project) pairs, in the order of the queries
+        pairs = [(field, None) for field in custom_fields] + list(product(custom_fields, projects))
+        usages = list(run_exchanges(map(query_field_usage_exchange, pairs), self.workers, self.requests_per_second))
+        usage, usage_by_project = {}, {}
+        for (field, project), count in zip(pairs, usages):
+            if project:
+                usage_by_project.setdefault(field[JsonFieldNames.ID], {})[project[JsonFieldNames.KEY]] = count
+            else:
+                usage[field[JsonFieldNames.ID]] = count
+        return usage, usage_by_project
+
+    def get_metadata(self):
+        """
+        Get the custom fields and projects, kept on the daemon between refreshes; once METADATA_CACHE_TTL_SECONDS
+        pass they get fetched again, which revalidates them with Jira (ETag/Last-Modified) through the metadata cache.
+        :return: Tuple of the list of custom fields and the list of projects.
+        """
+        metadata_age = time.monotonic() - self.metadata_fetched_at if self.metadata_fetched_at is not None else None
+        if metadata_age is None or metadata_age >= METADATA_CACHE_TTL_SECONDS:
+            with METRICS.phase(PHASE_FETCH):
+                self.projects = fetch_projects()
+                self.custom_fields = fetch_custom_fields()
+            self.metadata_fetched_at = time.monotonic()
+        return self.custom_fields, self.projects
+
+    def refresh(self):
+        """
+        Get the metadata (see get_metadata), recompute the usage, and swap in the new documents.
+        :return: None
+        """
+        print(LOG_REFRESH_START.format(mode=self.mode))
+        start_time = time.monotonic()
+        custom_fields, projects = self.get_metadata()
+        with METRICS.phase(PHASE_QUERY):
+            usage, usage_by_project = self.compute_usage(custom_fields, projects)
+
+        generated = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        field_rows = [dict(zip(HEADER_FIELD_NAMES, [field[JsonFieldNames.ID], field[JsonFieldNames.NAME],
+                                                    usage.get(field[JsonFieldNames.ID], 0)]))
+                      for field in custom_fields]
+        project_rows = [dict(zip(HEADER_FIELD_NAMES_BY_PROJECT, [
+            field[JsonFieldNames.ID],
+            field[JsonFieldNames.NAME],
+            project[JsonFieldNames.KEY],
+            project[JsonFieldNames.NAME],
+            usage_by_project.get(field[JsonFieldNames.ID], {}).get(project[JsonFieldNames.KEY], 0)
+        ])) for field, project in product(custom_fields, projects)]
+        documents = {
+            FIELD_USAGE_PATH: build_document({"generated": generated, "mode": self.mode, "rows": field_rows}),
+            FIELD_USAGE_BY_PROJECT_PATH: build_document({"generated": generated, "mode": self.mode,
+                                                         "rows": project_rows}),
+        }
+
+        seconds = time.monotonic() - start_time
+        with self.lock:
+            self.documents = documents
+            self.status.update(refreshes=self.status["refreshes"] + 1, last_refresh=generated,
+                               last_refresh_seconds=round(seconds, 3), last_error=None)
+        print(LOG_REFRESH_DONE.format(field_count=len(custom_fields), project_count=len(projects), seconds=seconds,
+                                      interval=self.interval_seconds))
+
+    def run_refresh_loop(self):
+        """
+        Refresh the documents forever, every interval or as soon as a refresh gets requested.
+        :return: None
+        """
+        while True:
+            self.refresh_requested.clear()
+            with self.lock:
+                self.status["refreshing"] = True
+            try:
+                self.refresh()
+            except (Exception, SystemExit) as error:
+                # the shared helpers exit on errors a one-off run cannot recover from; a daemon retries on schedule
+                print(ERROR_MSG_REFRESH_FAILED.format(error=repr(error)))
+                with self.lock:
+                    self.status.update(failures=self.status["failures"] + 1, last_error=repr(error))
+            finally:
+                with self.lock:
+                    self.status["refreshing"] = False
+            METRICS.write_reports()
+            self.refresh_requested.wait(self.interval_seconds)
+
+    def start(self):
+        """
+        Start refreshing on a background thread; the first refresh starts right away.
+        :return: None
+        """
+        self.thread = threading.Thread(target=self.run_refresh_loop, daemon=True)
+        self.thread.start()
+
+    def request_refresh(self):
+        """
+        Start the next refresh now instead of at the end of the interval (or right after the one under way).
+        :return: None
+        """
+        print(LOG_REFRESH_REQUESTED)
+        self.refresh_requested.set()
+
+    def get_document(self, path):
+        """
+        :param path: The request path, for example FIELD_USAGE_PATH.
+        :return: The current ReportDocument at the path, or None before the first refresh finished.
+        """
+        if path == HEALTH_PATH:
+            with self.lock:
+                return build_document({**self.status, "ready": bool(self.documents)})
+        with self.lock:
+            return self.documents.get(path)
+
+
+class UsageReportHandler(BaseHTTPRequestHandler):
+    """
+    A request handler serving the daemon's documents as JSON over keep-alive connections, gzip compressed when the
+    client accepts it, and answering a matching If-None-Match with 304 NOT_MODIFIED so pollers only download a
+    report when it changed.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        """
+        Skip the per-request access log, keeping the refresh log readable under frequent polling.
+        """
+
+    def do_GET(self):
+        path = urlparse(self.path).path.rstrip("/")
+        if path not in [FIELD_USAGE_PATH, FIELD_USAGE_BY_PROJECT_PATH, HEALTH_PATH]:
+            self.send_document(HTTPStatus.NOT_FOUND, build_document({"error": ERROR_MSG_NOT_FOUND.format(path=path)}))
+            return
+
+        document = self.server.report_daemon.get_document(path)
+        if document is None:
+            self.send_document(HTTPStatus.SERVICE_UNAVAILABLE, build_document({"error": ERROR_MSG_NOT_READY}))
+        elif self.headers.get(IF_NONE_MATCH_HEADER) == document.etag:
+            self.send_document(HTTPStatus.NOT_MODIFIED, document)
+        else:
+            self.send_document(HTTPStatus.OK, document)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get(CONTENT_LENGTH_HEADER, 0)))
+        path = urlparse(self.path).path.rstrip("/")
+        if path != REFRESH_PATH:
+            self.send_document(HTTPStatus.NOT_FOUND, build_document({"error": ERROR_MSG_NOT_FOUND.format(path=path)}))
+            return
+        self.server.report_daemon.request_refresh()
+        self.send_document(HTTPStatus.ACCEPTED, self.server.report_daemon.get_document(HEALTH_PATH))
+
+    def send_document(self, status, document):
+        """
+        Send a document, or only its headers for 304 NOT_MODIFIED.
+        :param status: The HTTP status code.
+        :param document: The ReportDocument.
+        :return: None
+        """
+        body = b"" if status == HTTPStatus.NOT_MODIFIED else document.body
+        self.send_response(status)
+        if status in (HTTPStatus.OK, HTTPStatus.NOT_MODIFIED):
+            self.send_header(ETAG_HEADER, document.etag)
+            self.send_header(CACHE_CONTROL_HEADER, CACHE_CONTROL_NO_CACHE)
+        if status == HTTPStatus.SERVICE_UNAVAILABLE:
+            self.send_header(RETRY_AFTER_HEADER, str(STARTING_RETRY_AFTER_SECONDS))
+        if body and GZIP_ENCODING in self.headers.get(ACCEPT_ENCODING_HEADER, ""):
+            body = document.gzip_body
+            self.send_header(CONTENT_ENCODING_HEADER, GZIP_ENCODING)
+        self.send_header(CONTENT_TYPE_HEADER, CONTENT_TYPE_JSON)
+        self.send_header(CONTENT_LENGTH_HEADER, str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class UsageReportServer(ThreadingHTTPServer):
+    """
+    The local HTTP server in front of a UsageReportDaemon.
+    """
+    daemon_threads = True
+
+    def __init__(self, report_daemon, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """
+        :param report_daemon: The UsageReportDaemon whose documents to serve.
+        :param host: Interface to listen on.
+        :param port: Port to listen on.
+        """
+        super().__init__((host, port), UsageReportHandler)
+        self.report_daemon = report_daemon
+
+
+def parse_arguments():
+    """
+    Parse the command line arguments for the script.
+    :return: The parsed arguments namespace.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(MODE_ARGUMENT, choices=[MODE_SCAN, MODE_QUERY, MODE_INCREMENTAL], default=MODE_SCAN,
+                        help=MODE_HELP)
+    parser.add_argument(INTERVAL_ARGUMENT, type=float, default=DEFAULT_INTERVAL_SECONDS, help=INTERVAL_HELP)
+    parser.add_argument(HOST_ARGUMENT, default=DEFAULT_HOST, help=HOST_HELP)
+    parser.add_argument(PORT_ARGUMENT, type=int, default=DEFAULT_PORT, help=PORT_HELP)
+    parser.add_argument(RPS_ARGUMENT, type=float, default=None, help=RPS_HELP)
+    parser.add_argument(WORKERS_ARGUMENT, type=int, default=1, help=WORKERS_HELP)
+    return parser.parse_args()
+
+
+def main():
+    """
+    The script runs the custom field usage reports of scripts #1 & #2 as a long-running daemon instead of a cron job
+    that starts from cold every time. It refreshes the usage (in total and per project) on a schedule in the
+    background, keeping the connection pool, the metadata and the latest results in memory, and serves them as
+    JSON over local HTTP with ETags, so dashboards read the current numbers in milliseconds: GET /usage,
+    GET /usage/by-project and GET /health, and POST /refresh to refresh right away.
+    :return: None
+    """
+    arguments = parse_arguments()
+
+    JIRA_CLIENT.set_pool_size(max(arguments.workers, POOL_SIZE))
+    report_daemon = UsageReportDaemon(arguments.mode, arguments.interval, arguments.workers, arguments.rps)
+    server = UsageReportServer(report_daemon, arguments.host, arguments.port)
+    report_daemon.start()
+
+    host, port = server.server_address[:2]
+    print(LOG_SERVING.format(host=host, port=port, path=FIELD_USAGE_PATH))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
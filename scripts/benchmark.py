@@ -0,0 +1,289 @@
+#!../.venv/bin/python
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from utils.fake_jira import MULTI_SELECT_FIELD_IDS, FakeJiraServer, FakeJiraSettings
+
+# key global variables
+SCRIPTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_TOKEN = "benchmark"
+LOG_TAIL_LINES = 20
+COPY_SCRIPT = "3_copy_multi-select_values_between_fields.py"
+INDEX_SCRIPT = "4_issue_field_index.py"
+CHANGED_ISSUE_INTERVAL = 10  # every how many backed up issues a restore setup deletes one, and moves another
+EDITED_ISSUE_INTERVAL = 50  # every how many issues an incremental setup edits one after building the index
+
+# additional global variables; not imported from utils.jira_utils, which needs a token set at import
+CACHE_DIRECTORY_NAME = ".jira_cache"
+CACHE_DIRECTORY_VARIABLE = "JIRA_CACHE_DIR"
+BASE_URL_VARIABLE = "JIRA_BASE_URL"
+FILE_READ_MODE = "r"
+FILE_WRITE_MODE = "w"
+OUTPUT_LOG_FILENAME = "output.log"
+SETUP_LOG_FILENAME = "setup.log"
+TOKEN_VARIABLE = "PERSONAL_ACCESS_TOKEN"
+
+# a benchmarked script invocation, with an optional unmeasured setup function taking the server, the working
+# directory and the environment of the script
+BenchmarkCase = namedtuple("BenchmarkCase", ["name", "script", "arguments", "setup"], defaults=[None])
+
+
+def run_setup_script(script, arguments, working_directory, environment):
+    """
+    Run a script as part of a case's setup, outside of the measurements, exiting when it fails.
+    :param script: File name of the script.
+    :param arguments: List of the script's command line arguments.
+    :param working_directory: The case's working directory.
+    :param environment: The environment of the case's scripts.
+    :return: None
+    """
+    log_filename = os.path.join(working_directory, SETUP_LOG_FILENAME)
+    with open(log_filename, FILE_WRITE_MODE) as log_file:
+        exit_code = subprocess.call([sys.executable, os.path.join(SCRIPTS_DIRECTORY, script), *arguments],
+                                    cwd=working_directory, env=environment, stdout=log_file,
+                                    stderr=subprocess.STDOUT)
+    if exit_code:
+        print(LOG_SETUP_FAILED.format(script=script, exit_code=exit_code))
+        with open(log_filename, FILE_READ_MODE) as log_file:
+            print("".join(log_file.readlines()[-LOG_TAIL_LINES:]))
+        sys.exit(1)
+
+
+def copy_then_change_issues(server, working_directory, environment):
+    """
+    Setup of the restore cases: run the copy script for a backup to restore, then delete some of the backed up issues
+    and move others to another project, so the restore meets issues that no longer exist and issues whose key changed.
+    :param server: The running FakeJiraServer.
+    :param working_directory: The case's working directory.
+    :param environment: The environment of the case's scripts.
+    :return: None
+    """
+    run_setup_script(COPY_SCRIPT, [], working_directory, environment)
+    with server.data_lock:
+        data = server.data
+        issue_keys = [issue["key"] for issue in data.issues.values() if issue["fields"].get(MULTI_SELECT_FIELD_IDS[0])]
+        for issue_key in issue_keys[::CHANGED_ISSUE_INTERVAL]:
+            data.delete_issue(issue_key)
+        for issue_key in issue_keys[CHANGED_ISSUE_INTERVAL // 2::CHANGED_ISSUE_INTERVAL]:
+            data.move_issue(issue_key, data.projects[-1]["key"])
+
+
+def build_index_then_edit_issues(server, working_directory, environment):
+    """
+    Setup of the incremental cases: build the local issue index, then edit some issues, so the measured run syncs a
+    delta of recently updated issues rather than every issue.
+    :param server: The running FakeJiraServer.
+    :param working_directory: The case's working directory.
+    :param environment: The environment of the case's scripts.
+    :return: None
+    """
+    run_setup_script(INDEX_SCRIPT, ["build"], working_directory, environment)
+    with server.data_lock:
+        data = server.data
+        for issue_id in data.issue_ids[::EDITED_ISSUE_INTERVAL]:
+            data.update(data.issues[issue_id]["key"], {"fields": {MULTI_SELECT_FIELD_IDS[0]: None}})
+
+
+BENCHMARK_CASES = [
+    BenchmarkCase("usage-query", "1_custom_field_usage.py", []),
+    BenchmarkCase("usage-scan", "1_custom_field_usage.py", ["--mode", "scan"]),
+    BenchmarkCase("usage-incremental", "1_custom_field_usage.py", ["--mode", "incremental"],
+                  build_index_then_edit_issues),
+    BenchmarkCase("usage-by-project-query", "2_custom_field_usage_by_project.py", []),
+    BenchmarkCase("usage-by-project-scan", "2_custom_field_usage_by_project.py", ["--mode", "scan"]),
+    BenchmarkCase("usage-by-project-event-loop", "2_custom_field_usage_by_project.py",
+                  ["--workers", "8", "--event-loop"]),
+    BenchmarkCase("copy-serial", "3_copy_multi-select_values_between_fields.py", []),
+    BenchmarkCase("copy-parallel", "3_copy_multi-select_values_between_fields.py", ["--workers", "8"]),
+    BenchmarkCase("copy-event-loop", "3_copy_multi-select_values_between_fields.py",
+                  ["--workers", "8", "--event-loop"]),
+    BenchmarkCase("restore-parallel", "5_restore_multi-select_values_from_backup.py", ["--workers", "8"],
+                  copy_then_change_issues),
+]
+
+# command line arguments
+BAD_REQUEST_RATE_ARGUMENT = "--bad-request-rate"
+BAD_REQUEST_RATE_HELP = "share of requests answered with an injected 400 (default: %(default)s)"
+CASE_ARGUMENT = "--case"
+CASE_HELP = "benchmark case to run, repeatable (default: all cases)"
+FIELDS_ARGUMENT = "--fields"
+FIELDS_HELP = "number of custom fields (default: %(default)s)"
+FILL_RATE_ARGUMENT = "--fill-rate"
+FILL_RATE_HELP = "share of issues populating each custom field (default: %(default)s)"
+ISSUES_ARGUMENT = "--issues"
+ISSUES_HELP = "number of issues (default: %(default)s)"
+LATENCY_ARGUMENT = "--latency-ms"
+LATENCY_HELP = "latency added to every response, in milliseconds (default: %(default)s)"
+LOAD_LATENCY_ARGUMENT = "--load-latency-ms"
+LOAD_LATENCY_HELP = ("latency added to a response for every request served at the same time (itself included), in "
+                     "milliseconds, like a node slowing down under load (default: %(default)s)")
+OUTPUT_ARGUMENT = "--output"
+OUTPUT_HELP = "also write the results to this JSON file, for comparing runs"
+PAGE_CAP_ARGUMENT = "--page-cap"
+PAGE_CAP_HELP = "maximum number of issues per search page, like Jira's maxResults cap (default: %(default)s)"
+PORT_ARGUMENT = "--port"
+PORT_HELP = "port of the fake Jira server (default: any free port)"
+PROJECTS_ARGUMENT = "--projects"
+PROJECTS_HELP = "number of projects (default: %(default)s)"
+RUNS_ARGUMENT = "--runs"
+RUNS_HELP = "runs per case, each against a freshly generated dataset (default: %(default)s)"
+SERVE_ARGUMENT = "--serve"
+SERVE_HELP = "only start the fake Jira server, for running the scripts against it by hand"
+THROTTLE_RATE_ARGUMENT = "--throttle-rate"
+THROTTLE_RATE_HELP = "share of requests answered with an injected 429 (default: %(default)s)"
+UNAVAILABLE_RATE_ARGUMENT = "--unavailable-rate"
+UNAVAILABLE_RATE_HELP = "share of requests answered with an injected 503 (default: %(default)s)"
+
+# console log messages
+LOG_CASE_FAILED = "Case '{case}' exited with {exit_code}; last lines of its output:"
+LOG_RESULT_HEADER = (f"{'case':<28} {'exit':>4} {'wall s':>8} {'requests':>9} {'sent KB':>9} {'received KB':>11} "
+                     f"{'peak RSS MB':>11}  statuses")
+LOG_RESULT_ROW = ("{case:<28} {exit_code:>4} {wall_seconds:>8.2f} {requests:>9} {sent_kb:>9.1f} {received_kb:>11.1f} "
+                  "{peak_rss_mb:>11.1f}  {statuses}")
+LOG_RUN_CASE = "Running '{case}' (run {run} of {runs})..."
+LOG_SETUP_FAILED = "Setup script '{script}' exited with {exit_code}; last lines of its output:"
+LOG_SERVE = "Run the scripts with: export JIRA_BASE_URL={base_url} PERSONAL_ACCESS_TOKEN={token}  (Ctrl+C to stop)"
+LOG_WRITE_SUCCESS = "Benchmark results have been written to {filename} successfully."
+
+
+def run_case(case, server, working_directory):
+    """
+    Run one script against the fake Jira server in a subprocess, measuring its wall time and peak RSS, and the
+    requests it made.
+    :param case: The BenchmarkCase to run.
+    :param server: The running FakeJiraServer, reset for this run.
+    :param working_directory: Empty directory for the script's output files and caches.
+    :return: Dictionary of the case's measurements.
+    """
+    environment = {**os.environ, BASE_URL_VARIABLE: server.base_url, TOKEN_VARIABLE: BENCHMARK_TOKEN,
+                   CACHE_DIRECTORY_VARIABLE: os.path.join(working_directory, CACHE_DIRECTORY_NAME)}
+    if case.setup:
+        case.setup(server, working_directory, environment)
+        server.reset_stats()
+    log_filename = os.path.join(working_directory, OUTPUT_LOG_FILENAME)
+    with open(log_filename, FILE_WRITE_MODE) as log_file:
+        start_time = time.monotonic()
+        process = subprocess.Popen([sys.executable, os.path.join(SCRIPTS_DIRECTORY, case.script), *case.arguments],
+                                   cwd=working_directory, env=environment, stdout=log_file,
+                                   stderr=subprocess.STDOUT)
+        _, wait_status, resource_usage = os.wait4(process.pid, 0)
+        wall_seconds = time.monotonic() - start_time
+    process.returncode = os.waitstatus_to_exitcode(wait_status)
+
+    if process.returncode:
+        print(LOG_CASE_FAILED.format(case=case.name, exit_code=process.returncode))
+        with open(log_filename, FILE_READ_MODE) as log_file:
+            print("".join(log_file.readlines()[-LOG_TAIL_LINES:]))
+
+    stats = server.get_stats()
+    return {
+        "case": case.name,
+        "exit_code": process.returncode,
+        "wall_seconds": wall_seconds,
+        "requests": stats["requests"],
+        "bytes_sent": stats["bytes_sent"],
+        "bytes_received": stats["bytes_received"],
+        "peak_rss_bytes": resource_usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024),
+        "endpoints": stats["endpoints"],
+        "statuses": stats["statuses"],
+    }
+
+
+def print_result(result):
+    """
+    Print one case's measurements as a row of the results table.
+    :param result: Dictionary of the case's measurements from run_case.
+    :return: None
+    """
+    print(LOG_RESULT_ROW.format(case=result["case"], exit_code=result["exit_code"],
+                                wall_seconds=result["wall_seconds"], requests=result["requests"],
+                                sent_kb=result["bytes_sent"] / 1024, received_kb=result["bytes_received"] / 1024,
+                                peak_rss_mb=result["peak_rss_bytes"] / 1024 / 1024,
+                                statuses=" ".join(f"{status}:{count}"
+                                                  for status, count in result["statuses"].items())))
+
+
+def parse_arguments():
+    """
+    Parse the command line arguments for the script.
+    :return: The parsed arguments namespace.
+    """
+    defaults = FakeJiraSettings()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(CASE_ARGUMENT, action="append", choices=[case.name for case in BENCHMARK_CASES],
+                        help=CASE_HELP)
+    parser.add_argument(FIELDS_ARGUMENT, type=int, default=defaults.field_count, help=FIELDS_HELP)
+    parser.add_argument(PROJECTS_ARGUMENT, type=int, default=defaults.project_count, help=PROJECTS_HELP)
+    parser.add_argument(ISSUES_ARGUMENT, type=int, default=defaults.issue_count, help=ISSUES_HELP)
+    parser.add_argument(FILL_RATE_ARGUMENT, type=float, default=defaults.fill_rate, help=FILL_RATE_HELP)
+    parser.add_argument(LATENCY_ARGUMENT, type=float, default=defaults.latency_ms, help=LATENCY_HELP)
+    parser.add_argument(LOAD_LATENCY_ARGUMENT, type=float, default=defaults.load_latency_ms, help=LOAD_LATENCY_HELP)
+    parser.add_argument(BAD_REQUEST_RATE_ARGUMENT, type=float, default=defaults.bad_request_rate,
+                        help=BAD_REQUEST_RATE_HELP)
+    parser.add_argument(THROTTLE_RATE_ARGUMENT, type=float, default=defaults.throttle_rate, help=THROTTLE_RATE_HELP)
+    parser.add_argument(UNAVAILABLE_RATE_ARGUMENT, type=float, default=defaults.unavailable_rate,
+                        help=UNAVAILABLE_RATE_HELP)
+    parser.add_argument(PAGE_CAP_ARGUMENT, type=int, default=defaults.page_cap, help=PAGE_CAP_HELP)
+    parser.add_argument(RUNS_ARGUMENT, type=int, default=1, help=RUNS_HELP)
+    parser.add_argument(OUTPUT_ARGUMENT, default=None, help=OUTPUT_HELP)
+    parser.add_argument(PORT_ARGUMENT, type=int, default=0, help=PORT_HELP)
+    parser.add_argument(SERVE_ARGUMENT, action="store_true", help=SERVE_HELP)
+    return parser.parse_args()
+
+
+def main():
+    """
+    The script benchmarks the other scripts offline: it starts a local fake Jira server with a generated dataset of
+    the configured size (and optional latency, injected 400/429/503 responses, and a search page cap), runs the
+    usage reports and the copy script against it, each from a freshly generated dataset, and reports every run's
+    wall time, request count, bytes transferred and peak RSS, so performance regressions show up before they reach
+    a production Jira.
+    :return: None
+    """
+    arguments = parse_arguments()
+    settings = FakeJiraSettings(
+        field_count=arguments.fields, project_count=arguments.projects, issue_count=arguments.issues,
+        fill_rate=arguments.fill_rate, latency_ms=arguments.latency_ms, bad_request_rate=arguments.bad_request_rate,
+        throttle_rate=arguments.throttle_rate, unavailable_rate=arguments.unavailable_rate,
+        page_cap=arguments.page_cap, load_latency_ms=arguments.load_latency_ms,
+    )
+    server = FakeJiraServer(settings, port=arguments.port)
+    server.start()
+
+    if arguments.serve:
+        print(LOG_SERVE.format(base_url=server.base_url, token=BENCHMARK_TOKEN))
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            server.stop()
+        return
+
+    cases = [case for case in BENCHMARK_CASES if not arguments.case or case.name in arguments.case]
+    results = []
+    try:
+        for case in cases:
+            for run in range(1, arguments.runs + 1):
+                print(LOG_RUN_CASE.format(case=case.name, run=run, runs=arguments.runs))
+                server.reset()
+                with tempfile.TemporaryDirectory() as working_directory:
+                    results.append(run_case(case, server, working_directory))
+    finally:
+        server.stop()
+
+    print(LOG_RESULT_HEADER)
+    for result in results:
+        print_result(result)
+
+    if arguments.output:
+        with open(arguments.output, FILE_WRITE_MODE) as output_file:
+            json.dump({"settings": settings._asdict(), "results": results}, output_file, indent=2)
+        print(LOG_WRITE_SUCCESS.format(filename=arguments.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,713 @@
+import gzip
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timezone
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# key global variables
+FIRST_CUSTOM_FIELD_NUMBER = 10100
+FIRST_ISSUE_ID = 10000
+FIRST_PROJECT_ID = 10000
+DEVELOPMENT_FIELD_ID = "customfield_10000"
+MULTI_SELECT_FIELD_IDS = ["customfield_10112", "customfield_10113"]  # the copy script's default source & destination
+OPTION_VALUES = ["Value1", "Value2", "Value3"]
+FIELD_TYPES = ["number", "string", "array", "option", "date", "any"]
+
+# request paths
+CUSTOM_FIELDS_PATH = "/rest/api/2/field"
+PROJECTS_PATH = "/rest/api/2/project"
+SEARCH_PATH = "/rest/api/2/search"
+ISSUE_PATH_PATTERN = re.compile(r"^/rest/api/2/issue/([^/]+)$")
+OPTIONS_PATH_PATTERN = re.compile(r"^/rest/api/2/customFields/(?:customfield_)?(\d+)/options$")
+
+# endpoint names for the request statistics
+ENDPOINT_FIELD = "field"
+ENDPOINT_ISSUE = "issue"
+ENDPOINT_OPTIONS = "options"
+ENDPOINT_OTHER = "other"
+ENDPOINT_PROJECT = "project"
+ENDPOINT_SEARCH = "search"
+
+# HTTP headers
+ACCEPT_ENCODING_HEADER = "Accept-Encoding"
+CONTENT_ENCODING_HEADER = "Content-Encoding"
+CONTENT_LENGTH_HEADER = "Content-Length"
+CONTENT_TYPE_HEADER = "Content-Type"
+CONTENT_TYPE_JSON = "application/json;charset=UTF-8"
+ETAG_HEADER = "ETag"
+GZIP_ENCODING = "gzip"
+IF_NONE_MATCH_HEADER = "If-None-Match"
+RETRY_AFTER_HEADER = "Retry-After"
+
+# JQL grammar; atoms get swapped for placeholders before the boolean structure gets parsed
+JQL_ORDER_BY_PATTERN = re.compile(r"\s+ORDER\s+BY\s+.*$", re.IGNORECASE | re.DOTALL)
+JQL_ATOM_PATTERN = re.compile(
+    r"cf\[(?P<field>\d+)\](?P<commits>\[commits\]\.all)?\s+(?P<condition>IS\s+NOT\s+EMPTY|>\s*0)"
+    r'|project\s*=\s*"(?P<project>[^"]*)"'
+    r"|id\s*>\s*(?P<after_id>\d+)"
+    r"|key\s+in\s*\((?P<keys>[^)]*)\)"
+    r"|id\s+in\s*\((?P<ids>[^)]*)\)"
+    r'|updated\s*>=\s*"?-(?P<minutes>\d+)m"?',
+    re.IGNORECASE)
+JQL_TOKEN_PATTERN = re.compile(r"\s*(\(|\)|AND\b|OR\b|#\d+)", re.IGNORECASE)
+JQL_PLACEHOLDER = " #{index} "
+JIRA_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
+STRICT_VALIDATION = [True, "strict", "true"]  # the validateQuery values that reject unknown issues, Jira's default
+
+# console error and log messages
+ERROR_MSG_ANY_IS_NOT_EMPTY = "The operator 'is not empty' is not supported by the 'cf[{field}]' field."
+ERROR_MSG_INJECTED = "Injected {status_code} response."
+ERROR_MSG_ISSUE_MISSING = "Issue does not exist or you do not have permission to see it."
+ERROR_MSG_ISSUE_NOT_IN_JQL = "An issue with key '{issue}' does not exist for field '{field}'."
+ERROR_MSG_JQL = "Error in the JQL Query: unsupported JQL '{jql}'."
+ERROR_MSG_NOT_FOUND = "Null reference: {path}"
+LOG_FAKE_JIRA_STARTED = ("Fake Jira serving {fields} custom fields, {projects} projects and {issues} issues at "
+                         "{base_url}")
+
+# the shape of the fake instance and the faults it injects
+FakeJiraSettings = namedtuple("FakeJiraSettings", [
+    "field_count", "project_count", "issue_count", "fill_rate", "latency_ms", "bad_request_rate", "throttle_rate",
+    "unavailable_rate", "page_cap", "retry_after_seconds", "seed", "load_latency_ms",
+], defaults=[40, 5, 2000, 0.3, 0.0, 0.0, 0.0, 0.0, 1000, 0, 1, 0.0])
+
+
+def format_jira_timestamp(timestamp):
+    """
+    Format a time the way Jira returns an issue's 'updated' field, for example "2024-12-20T10:15:30.000+0000".
+    :param timestamp: The time, in seconds since the epoch.
+    :return: The Jira timestamp string, in UTC with millisecond precision.
+    """
+    moment = datetime.fromtimestamp(timestamp, timezone.utc)
+    return moment.strftime(JIRA_TIMESTAMP_FORMAT).replace(f".{moment.microsecond:06d}",
+                                                             f".{moment.microsecond // 1000:03d}")
+
+
+def parse_jira_timestamp(timestamp):
+    """
+    Parse a Jira timestamp from format_jira_timestamp back into a time.
+    :param timestamp: The Jira timestamp string.
+    :return: The time, in seconds since the epoch.
+    """
+    return datetime.strptime(timestamp, JIRA_TIMESTAMP_FORMAT).timestamp()
+
+
+class JqlError(ValueError):
+    """
+    A class representing a JQL query the fake cannot evaluate, answered with 400 BAD_REQUEST like Jira does.
+    """
+
+
+class FakeJiraData:
+    """
+    A generated, deterministic Jira dataset: custom fields of every schema type the scripts handle (plus the
+    Development field and the copy script's multi-select fields), projects, and issues populating a share of the
+    fields.
+    """
+
+    def __init__(self, settings):
+        """
+        Generate the dataset from the settings' counts and seed.
+        :param settings: FakeJiraSettings of the instance.
+        """
+        generator = random.Random(settings.seed)
+        self.fields = [{"id": DEVELOPMENT_FIELD_ID, "name": "Development", "custom": True,
+                        "clauseNames": ["cf[10000]", "Development"], "schema": {"type": "any"}}]
+        for number in range(FIRST_CUSTOM_FIELD_NUMBER, FIRST_CUSTOM_FIELD_NUMBER + settings.field_count):
+            field_id = f"customfield_{number}"
+            if field_id in MULTI_SELECT_FIELD_IDS:
+                continue
+            field_type = FIELD_TYPES[number % len(FIELD_TYPES)]
+            self.fields.append({"id": field_id, "name": f"Field {number}", "custom": True,
+                                "clauseNames": [f"cf[{number}]", f"Field {number}"], "schema": {"type": field_type}})
+        for field_id in MULTI_SELECT_FIELD_IDS:
+            number = field_id.removeprefix("customfield_")
+            self.fields.append({"id": field_id, "name": f"Multi-Select {number}", "custom": True,
+                                "clauseNames": [f"cf[{number}]", f"Multi-Select {number}"],
+                                "schema": {"type": "array", "items": "option"}})
+        self.fields.append({"id": "summary", "name": "Summary", "custom": False, "clauseNames": ["summary"],
+                            "schema": {"type": "string"}})
+        self.fields_by_id = {field["id"]: field for field in self.fields}
+
+        self.options = {
+            field_id: [{"id": str(20000 + index * 1000 + offset), "value": value, "disabled": False}
+                       for offset, value in enumerate(OPTION_VALUES, 1)]
+            for index, field_id in enumerate(MULTI_SELECT_FIELD_IDS)
+        }
+        self.projects = [{"id": str(FIRST_PROJECT_ID + index), "key": f"P{index}", "name": f"Project {index}"}
+                         for index in range(settings.project_count)]
+
+        self.issues = {}
+        self.issues_by_key = {}  # also keeps the old keys of moved issues, which Jira still resolves
+        self.next_issue_number = settings.issue_count + 1
+        now = time.time()
+        for index in range(settings.issue_count):
+            project = self.projects[index % len(self.projects)]
+            issue_id = FIRST_ISSUE_ID + index
+            fields = {
+                "project": {"id": project["id"], "key": project["key"], "name": project["name"]},
+                "issuetype": {"name": generator.choice(["Bug", "Story", "Task"])},
+                "status": {"name": generator.choice(["To Do", "In Progress", "Done"])},
+                "summary": f"Issue {index}",
+                "updated": format_jira_timestamp(now - generator.uniform(0, 30 * 24 * 3600)),
+                DEVELOPMENT_FIELD_ID: "{}",
+            }
+            for field in self.fields:
+                if field["custom"] and field["id"] != DEVELOPMENT_FIELD_ID:
+                    fields[field["id"]] = self.generate_value(generator, field, settings.fill_rate)
+            issue = {"id": str(issue_id), "key": f"{project['key']}-{index + 1}", "fields": fields}
+            self.issues[issue_id] = issue
+            self.issues_by_key[issue["key"]] = issue
+        self.issue_ids = sorted(self.issues)
+
+    def generate_value(self, generator, field, fill_rate):
+        """
+        Generate an issue's value of a custom field, empty for the share of issues outside the fill rate.
+        :param generator: The seeded random.Random of the dataset.
+        :param field: The custom field (as a dictionary).
+        :param fill_rate: Share of the issues populating the field.
+        :return: The raw field value, as Jira returns it.
+        """
+        if generator.random() >= fill_rate:
+            return None
+        if field["id"] in self.options:
+            return generator.sample(self.options[field["id"]], generator.randint(1, len(OPTION_VALUES)))
+        field_type = field["schema"]["type"]
+        if field_type in ("number", "any"):
+            return generator.choice([0, 1, 2, 5, 8])
+        if field_type == "array":
+            return [f"label{generator.randint(1, 9)}"]
+        if field_type == "option":
+            return {"value": generator.choice(OPTION_VALUES), "id": str(generator.randint(1, 3))}
+        if field_type == "date":
+            return "2024-12-20"
+        return f"text {generator.randint(1, 999)}"
+
+    def get_issue(self, reference):
+        """
+        Look up an issue the way the issue endpoints do, by ID, by key, or by a key it had before a move.
+        :param reference: The issue ID or key.
+        :return: The issue (as a dictionary), or None if there is no such issue.
+        """
+        issue = self.issues_by_key.get(reference)
+        if not issue and reference.isdigit():
+            issue = self.issues.get(int(reference))
+        return issue
+
+    def delete_issue(self, issue_key):
+        """
+        Delete an issue, dropping its key (and any old ones) from every lookup.
+        :param issue_key: Key of the issue.
+        :return: None
+        """
+        issue = self.issues_by_key[issue_key]
+        del self.issues[int(issue["id"])]
+        self.issue_ids.remove(int(issue["id"]))
+        for key in [key for key, keyed_issue in self.issues_by_key.items() if keyed_issue is issue]:
+            del self.issues_by_key[key]
+
+    def move_issue(self, issue_key, project_key):
+        """
+        Move an issue to another project, giving it a new key there; like in Jira, its ID and old key still resolve.
+        :param issue_key: Key of the issue.
+        :param project_key: Key of the project to move it to.
+        :return: The new key of the issue.
+        """
+        issue = self.issues_by_key[issue_key]
+        project = next(project for project in self.projects if project["key"] == project_key)
+        issue["key"] = f"{project_key}-{self.next_issue_number}"
+        issue["fields"]["project"] = {"id": project["id"], "key": project["key"], "name": project["name"]}
+        self.next_issue_number += 1
+        self.issues_by_key[issue["key"]] = issue
+        return issue["key"]
+
+    def compile_jql(self, jql, warnings=None):
+        """
+        Compile the subset of JQL the scripts send (field conditions, project, keyset 'id >', 'key in', 'id in',
+        relative 'updated >=', combined with AND, OR and parentheses) into a predicate over issues.
+        :param jql: The JQL string; any ORDER BY clause gets ignored since issues always come back in ID order.
+        :param warnings: (Optional) List collecting the warnings about issues that do not exist, for searches with
+            lenient validation; without it, such issues fail the query with a JqlError like Jira's strict validation.
+        :return: Function taking an issue and returning whether it matches.
+        """
+        atoms = []
+
+        def replace_atom(match):
+            atoms.append(self.compile_atom(match, warnings))
+            return JQL_PLACEHOLDER.format(index=len(atoms) - 1)
+
+        expression = JQL_ATOM_PATTERN.sub(replace_atom, JQL_ORDER_BY_PATTERN.sub("", jql)).strip()
+        if not expression:
+            return lambda issue: True
+
+        tokens = []
+        position = 0
+        while position < len(expression):
+            match = JQL_TOKEN_PATTERN.match(expression, position)
+            if not match:
+                if expression[position:].strip():
+                    raise JqlError(ERROR_MSG_JQL.format(jql=jql))
+                break
+            tokens.append(match.group(1).upper())
+            position = match.end()
+
+        predicate, position = self.parse_or(tokens, 0, atoms, jql)
+        if position != len(tokens):
+            raise JqlError(ERROR_MSG_JQL.format(jql=jql))
+        return predicate
+
+    def parse_or(self, tokens, position, atoms, jql):
+        """
+        Parse a sequence of AND groups joined by OR.
+        :param tokens: List of the JQL tokens, with atoms as '#index' placeholders.
+        :param position: Index of the first token to parse.
+        :param atoms: List of the compiled atom predicates.
+        :param jql: The original JQL, for error messages.
+        :return: Tuple of the predicate and the position after it.
+        """
+        predicates = []
+        while True:
+            predicate, position = self.parse_and(tokens, position, atoms, jql)
+            predicates.append(predicate)
+            if position >= len(tokens) or tokens[position] != "OR":
+                break
+            position += 1
+        if len(predicates) == 1:
+            return predicates[0], position
+        return (lambda issue: any(predicate(issue) for predicate in predicates)), position
+
+    def parse_and(self, tokens, position, atoms, jql):
+        """
+        Parse a sequence of atoms or parenthesized expressions joined by AND.
+        :param tokens: List of the JQL tokens, with atoms as '#index' placeholders.
+        :param position: Index of the first token to parse.
+        :param atoms: List of the compiled atom predicates.
+        :param jql: The original JQL, for error messages.
+        :return: Tuple of the predicate and the position after it.
+        """
+        predicates = []
+        while True:
+            if position >= len(tokens):
+                raise JqlError(ERROR_MSG_JQL.format(jql=jql))
+            token = tokens[position]
+            if token == "(":
+                predicate, position = self.parse_or(tokens, position + 1, atoms, jql)
+                if position >= len(tokens) or tokens[position] != ")":
+                    raise JqlError(ERROR_MSG_JQL.format(jql=jql))
+                position += 1
+            elif token.startswith("#"):
+                predicate = atoms[int(token[1:])]
+                position += 1
+            else:
+                raise JqlError(ERROR_MSG_JQL.format(jql=jql))
+            predicates.append(predicate)
+            if position >= len(tokens) or tokens[position] != "AND":
+                break
+            position += 1
+        if len(predicates) == 1:
+            return predicates[0], position
+        return (lambda issue: all(predicate(issue) for predicate in predicates)), position
+
+    def compile_atom(self, match, warnings=None):
+        """
+        Compile a single JQL condition, rejecting 'IS NOT EMPTY' on 'any' type fields the way Jira does.
+        :param match: The JQL_ATOM_PATTERN match of the condition.
+        :param warnings: (Optional) List collecting the warnings about issues that do not exist, instead of failing.
+        :return: Function taking an issue and returning whether it matches.
+        """
+        if match.group("field"):
+            field_id = f"customfield_{match.group('field')}"
+            if match.group("commits"):
+                return lambda issue: issue["fields"].get(field_id) is not None
+            if match.group("condition").startswith(">"):
+                return lambda issue: (isinstance(issue["fields"].get(field_id), (int, float))
+                                      and issue["fields"][field_id] > 0)
+            field = self.fields_by_id.get(field_id)
+            if field and field["schema"]["type"] == "any":
+                raise JqlError(ERROR_MSG_ANY_IS_NOT_EMPTY.format(field=match.group("field")))
+            return lambda issue: issue["fields"].get(field_id) not in (None, "", [], {})
+        if match.group("project") is not None:
+            project_key = match.group("project")
+            return lambda issue: issue["fields"]["project"]["key"] == project_key
+        if match.group("after_id"):
+            after_id = int(match.group("after_id"))
+            return lambda issue: int(issue["id"]) > after_id
+        if match.group("keys") is not None or match.group("ids") is not None:
+            field = "key" if match.group("keys") is not None else "id"
+            issue_ids = set()
+            for reference in (match.group("keys") or match.group("ids")).split(","):
+                reference = reference.strip().strip('"')
+                issue = self.get_issue(reference) if field == "key" else self.issues.get(int(reference))
+                if issue:
+                    issue_ids.add(issue["id"])
+                    continue
+                error_message = ERROR_MSG_ISSUE_NOT_IN_JQL.format(issue=reference, field=field)
+                if warnings is None:
+                    raise JqlError(error_message)
+                warnings.append(error_message)
+            return lambda issue: issue["id"] in issue_ids
+        since = time.time() - int(match.group("minutes")) * 60
+        return lambda issue: parse_jira_timestamp(issue["fields"]["updated"]) >= since
+
+    def search(self, body, page_cap):
+        """
+        Answer a search request with one page of the matching issues, in ID order.
+        :param body: The parsed JSON request body (jql, startAt, maxResults, fields).
+        :param page_cap: Maximum number of issues per page, like Jira's jira.search.views.default.max.
+        :return: The search response (as a dictionary).
+        """
+        warnings = None if body.get("validateQuery", "strict") in STRICT_VALIDATION else []
+        predicate = self.compile_jql(body.get("jql") or "", warnings)
+        start_at = body.get("startAt", 0)
+        max_results = min(body.get("maxResults", 50), page_cap)
+        field_ids = body.get("fields") or []
+        matches = [issue for issue in map(self.issues.get, self.issue_ids) if predicate(issue)]
+        return {
+            "expand": "schema,names",
+            "startAt": start_at,
+            "maxResults": max_results,
+            "total": len(matches),
+            **({"warningMessages": warnings} if warnings else {}),
+            "issues": [
+                {"expand": "operations,editmeta,changelog", "id": issue["id"],
+                 "self": f"{SEARCH_PATH}/{issue['id']}", "key": issue["key"],
+                 "fields": {field_id: issue["fields"][field_id] for field_id in field_ids
+                            if field_id in issue["fields"]}}
+                for issue in matches[start_at:start_at + max_results]
+            ],
+        }
+
+    def edit_metadata(self, issue_key):
+        """
+        Answer an issue request with the edit metadata of its multi-select fields.
+        :param issue_key: Key (or ID) of the issue.
+        :return: The issue response (as a dictionary), or None if there is no such issue.
+        """
+        issue = self.get_issue(issue_key)
+        if not issue:
+            return None
+        return {"id": issue["id"], "key": issue["key"], "fields": {}, "editmeta": {"fields": {
+            field_id: {"allowedValues": options} for field_id, options in self.options.items()
+        }}}
+
+    def update(self, issue_key, body):
+        """
+        Apply an issue edit, setting multi-select fields from their option IDs and other fields as given.
+        :param issue_key: Key (or ID) of the issue.
+        :param body: The parsed JSON request body, with the new field values under 'fields'.
+        :return: True if the issue exists.
+        """
+        issue = self.get_issue(issue_key)
+        if not issue:
+            return False
+        for field_id, value in body.get("fields", {}).items():
+            if field_id in self.options:
+                option_ids = {option["id"] for option in value or []}
+                value = [option for option in self.options[field_id] if option["id"] in option_ids] or None
+            issue["fields"][field_id] = value
+        issue["fields"]["updated"] = format_jira_timestamp(time.time())
+        return True
+
+    def field_options(self, field_number, query):
+        """
+        Answer a field option request with one page of the field's options.
+        :param field_number: Numeric part of the custom field ID.
+        :param query: The parsed query string (startAt, maxResults).
+        :return: The option page (as a dictionary), or None if the field has no options.
+        """
+        options = self.options.get(f"customfield_{field_number}")
+        if options is None:
+            return None
+        start_at = int(query.get("startAt", ["0"])[0])
+        max_results = int(query.get("maxResults", ["100"])[0])
+        page = options[start_at:start_at + max_results]
+        return {"startAt": start_at, "maxResults": max_results, "total": len(options),
+                "isLast": start_at + len(page) >= len(options),
+                "values": [{"id": int(option["id"]), "value": option["value"], "disabled": False} for option in page]}
+
+
+class FakeJiraHandler(BaseHTTPRequestHandler):
+    """
+    A request handler serving the fake dataset over the Jira REST API v2 endpoints the scripts use, with keep-alive
+    connections, gzip responses, ETags, and the configured latency and injected faults.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        """
+        Skip the per-request access log, keeping the benchmark output clean.
+        """
+
+    def do_GET(self):
+        self.handle_request(self.route_get)
+
+    def do_POST(self):
+        self.handle_request(self.route_post)
+
+    def do_PUT(self):
+        self.handle_request(self.route_put)
+
+    def handle_request(self, route):
+        """
+        Read the request body, apply the latency and fault injection, and answer through the route.
+        :param route: Method taking the parsed URL and the request body, returning (endpoint, status, response).
+        :return: None
+        """
+        server = self.server
+        request_body = self.rfile.read(int(self.headers.get(CONTENT_LENGTH_HEADER, 0)))
+        url = urlparse(self.path)
+        # a loaded node slows down with every request it serves at once
+        active_requests = server.start_request()
+        try:
+            latency_ms = server.settings.latency_ms + server.settings.load_latency_ms * active_requests
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+        finally:
+            server.finish_request_load()
+
+        injected_status = server.draw_fault()
+        if injected_status:
+            endpoint = server.get_endpoint(url.path)
+            self.send_json(endpoint, request_body, injected_status,
+                           {"errorMessages": [ERROR_MSG_INJECTED.format(status_code=injected_status)]})
+            return
+
+        try:
+            endpoint, status, response = route(url, json.loads(request_body) if request_body else {})
+        except JqlError as error:
+            endpoint, status, response = ENDPOINT_SEARCH, HTTPStatus.BAD_REQUEST, {"errorMessages": [str(error)]}
+        self.send_json(endpoint, request_body, status, response)
+
+    def route_get(self, url, body):
+        """
+        Answer the field, project, issue edit metadata and field option requests.
+        :param url: The parsed request URL.
+        :param body: The parsed request body (unused).
+        :return: Tuple of the endpoint name, HTTP status code and response content.
+        """
+        data = self.server.data
+        if url.path == CUSTOM_FIELDS_PATH:
+            return ENDPOINT_FIELD, HTTPStatus.OK, data.fields
+        if url.path == PROJECTS_PATH:
+            return ENDPOINT_PROJECT, HTTPStatus.OK, data.projects
+        if match := ISSUE_PATH_PATTERN.match(url.path):
+            response = data.edit_metadata(match.group(1))
+            if response is None:
+                return ENDPOINT_ISSUE, HTTPStatus.NOT_FOUND, {"errorMessages": [ERROR_MSG_ISSUE_MISSING]}
+            return ENDPOINT_ISSUE, HTTPStatus.OK, response
+        if match := OPTIONS_PATH_PATTERN.match(url.path):
+            response = data.field_options(match.group(1), parse_qs(url.query))
+            if response is None:
+                return ENDPOINT_OPTIONS, HTTPStatus.NOT_FOUND, {"errorMessages": [ERROR_MSG_NOT_FOUND.format(
+                    path=url.path)]}
+            return ENDPOINT_OPTIONS, HTTPStatus.OK, response
+        return ENDPOINT_OTHER, HTTPStatus.NOT_FOUND, {"errorMessages": [ERROR_MSG_NOT_FOUND.format(path=url.path)]}
+
+    def route_post(self, url, body):
+        """
+        Answer the search requests.
+        :param url: The parsed request URL.
+        :param body: The parsed request body.
+        :return: Tuple of the endpoint name, HTTP status code and response content.
+        """
+        if url.path == SEARCH_PATH:
+            return ENDPOINT_SEARCH, HTTPStatus.OK, self.server.data.search(body, self.server.settings.page_cap)
+        return ENDPOINT_OTHER, HTTPStatus.NOT_FOUND, {"errorMessages": [ERROR_MSG_NOT_FOUND.format(path=url.path)]}
+
+    def route_put(self, url, body):
+        """
+        Answer the issue edit requests.
+        :param url: The parsed request URL.
+        :param body: The parsed request body.
+        :return: Tuple of the endpoint name, HTTP status code and response content.
+        """
+        if match := ISSUE_PATH_PATTERN.match(url.path):
+            with self.server.data_lock:
+                updated = self.server.data.update(match.group(1), body)
+            if not updated:
+                return ENDPOINT_ISSUE, HTTPStatus.NOT_FOUND, {"errorMessages": [ERROR_MSG_ISSUE_MISSING]}
+            return ENDPOINT_ISSUE, HTTPStatus.NO_CONTENT, None
+        return ENDPOINT_OTHER, HTTPStatus.NOT_FOUND, {"errorMessages": [ERROR_MSG_NOT_FOUND.format(path=url.path)]}
+
+    def send_json(self, endpoint, request_body, status, response):
+        """
+        Send a JSON response, gzip compressed when the client accepts it, answering a matching If-None-Match with
+        304 NOT_MODIFIED, and record it in the server's statistics.
+        :param endpoint: Endpoint name for the statistics.
+        :param request_body: The raw request body, for the statistics.
+        :param status: The HTTP status code.
+        :param response: The response content, or None for an empty body.
+        :return: None
+        """
+        body = json.dumps(response).encode() if response is not None else b""
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if status == HTTPStatus.OK and self.headers.get(IF_NONE_MATCH_HEADER) == etag:
+            status, body = HTTPStatus.NOT_MODIFIED, b""
+
+        self.send_response(status)
+        if status in (HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE):
+            self.send_header(RETRY_AFTER_HEADER, str(self.server.settings.retry_after_seconds))
+        if status == HTTPStatus.OK:
+            self.send_header(ETAG_HEADER, etag)
+        if body and GZIP_ENCODING in self.headers.get(ACCEPT_ENCODING_HEADER, ""):
+            body = gzip.compress(body, compresslevel=1)
+            self.send_header(CONTENT_ENCODING_HEADER, GZIP_ENCODING)
+        self.send_header(CONTENT_TYPE_HEADER, CONTENT_TYPE_JSON)
+        self.send_header(CONTENT_LENGTH_HEADER, str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.record(endpoint, status, len(request_body), len(body))
+
+
+class FakeJiraServer(ThreadingHTTPServer):
+    """
+    A local stand-in for a Jira Data Center instance, for benchmarking the scripts offline. It serves a generated
+    dataset on a background thread, and counts the requests, status codes and bytes transferred per endpoint.
+    """
+    daemon_threads = True
+
+    def __init__(self, settings=FakeJiraSettings(), host="127.0.0.1", port=0):
+        """
+        Generate the dataset and bind the server (to a free port by default).
+        :param settings: FakeJiraSettings of the instance.
+        :param host: Interface to listen on.
+        :param port: Port to listen on, or 0 for any free port.
+        """
+        super().__init__((host, port), FakeJiraHandler)
+        self.settings = settings
+        self.data = FakeJiraData(settings)
+        self.data_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.fault_generator = random.Random(settings.seed)
+        self.stats = None
+        self.active_requests = 0
+        self.thread = None
+        self.reset_stats()
+
+    @property
+    def base_url(self):
+        """
+        The URL to point the scripts' JIRA_BASE_URL at.
+        """
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """
+        Start serving on a background thread.
+        :return: None
+        """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        print(LOG_FAKE_JIRA_STARTED.format(fields=self.settings.field_count, projects=self.settings.project_count,
+                                           issues=self.settings.issue_count, base_url=self.base_url))
+
+    def stop(self):
+        """
+        Stop serving and close the socket.
+        :return: None
+        """
+        self.shutdown()
+        self.server_close()
+
+    def reset(self):
+        """
+        Regenerate the dataset (undoing any edits) and the fault sequence, and zero the statistics, so every
+        benchmark run starts from the same state.
+        :return: None
+        """
+        with self.data_lock:
+            self.data = FakeJiraData(self.settings)
+        self.fault_generator = random.Random(self.settings.seed)
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        Zero the request statistics.
+        :return: None
+        """
+        with self.stats_lock:
+            self.stats = {"requests": 0, "bytes_received": 0, "bytes_sent": 0, "endpoints": Counter(),
+                          "statuses": Counter()}
+
+    def get_stats(self):
+        """
+        Take a snapshot of the request statistics.
+        :return: Dictionary of the request count, bytes received and sent, and counts per endpoint and status code.
+        """
+        with self.stats_lock:
+            return {**self.stats, "endpoints": dict(self.stats["endpoints"]),
+                    "statuses": {str(status): count for status, count in sorted(self.stats["statuses"].items())}}
+
+    def record(self, endpoint, status, bytes_received, bytes_sent):
+        """
+        Count a request in the statistics.
+        :param endpoint: Endpoint name of the request.
+        :param status: The HTTP status code answered.
+        :param bytes_received: Size of the request body.
+        :param bytes_sent: Size of the response body, as sent (compressed or not).
+        :return: None
+        """
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_received"] += bytes_received
+            self.stats["bytes_sent"] += bytes_sent
+            self.stats["endpoints"][endpoint] += 1
+            self.stats["statuses"][int(status)] += 1
+
+    def start_request(self):
+        """
+        Count a request as being served, for the load dependent latency.
+        :return: Number of requests being served, including this one.
+        """
+        with self.stats_lock:
+            self.active_requests += 1
+            return self.active_requests
+
+    def finish_request_load(self):
+        """
+        Stop counting a request as being served.
+        :return: None
+        """
+        with self.stats_lock:
+            self.active_requests -= 1
+
+    def draw_fault(self):
+        """
+        Decide whether to fail a request with an injected 400, 429 or 503, at the configured rates.
+        :return: The injected HTTP status code, or None to answer normally.
+        """
+        with self.stats_lock:
+            draw = self.fault_generator.random()
+        for status, rate in ((HTTPStatus.BAD_REQUEST, self.settings.bad_request_rate),
+                             (HTTPStatus.TOO_MANY_REQUESTS, self.settings.throttle_rate),
+                             (HTTPStatus.SERVICE_UNAVAILABLE, self.settings.unavailable_rate)):
+            if draw < rate:
+                return status
+            draw -= rate
+        return None
+
+    @staticmethod
+    def get_endpoint(path):
+        """
+        Name the endpoint of a request path for the statistics.
+        :param path: The request path.
+        :return: One of the ENDPOINT_* names.
+        """
+        if path == CUSTOM_FIELDS_PATH:
+            return ENDPOINT_FIELD
+        if path == PROJECTS_PATH:
+            return ENDPOINT_PROJECT
+        if path == SEARCH_PATH:
+            return ENDPOINT_SEARCH
+        if ISSUE_PATH_PATTERN.match(path):
+            return ENDPOINT_ISSUE
+        if OPTIONS_PATH_PATTERN.match(path):
+            return ENDPOINT_OPTIONS
+        return ENDPOINT_OTHER
@@ -0,0 +1,127 @@
+import ast
+import csv
+import gzip
+import json
+import os
+from utils.jira_utils import FILE_READ_MODE, FILE_WRITE_MODE
+
+# key global variables
+BACKUP_FORMAT_CSV = "csv"
+BACKUP_FORMAT_JSONL_GZIP = "jsonl.gz"
+BACKUP_FORMATS = [BACKUP_FORMAT_CSV, BACKUP_FORMAT_JSONL_GZIP]
+
+# additional global variables
+BINARY_UPDATE_MODE = "r+b"
+BINARY_WRITE_MODE = "wb"
+FILE_UPDATE_MODE = "r+"
+TEXT_READ_MODE = "rt"
+TEXT_ENCODING = "utf-8"
+
+# console log messages
+LOG_BACKUP_FLUSHED = "Saved {count} issues to the backup file '{filename}'."
+
+
+def get_backup_filename(filename_stem, backup_format):
+    """
+    Build the backup file name for a format.
+    :param filename_stem: File name without the extension (for example, "3-after_current_multi_select_fields").
+    :param backup_format: One of BACKUP_FORMATS.
+    :return: The backup file name.
+    """
+    return f"{filename_stem}.{backup_format}"
+
+
+class BackupWriter:
+    """
+    A backup sink that stays open for a whole run, collecting rows in memory and writing them in one batch per flush
+    (typically once per page), rather than reopening the file for every issue. Rows go to a CSV file, or to gzip
+    compressed JSON lines (one object per row) that load back without parsing Python list reprs. Every flush of the
+    compressed format is a complete gzip member, and gzip readers decompress the members as one stream.
+    """
+
+    def __init__(self, filename, header, backup_format=BACKUP_FORMAT_CSV, append_offset=None):
+        """
+        Open the backup file, either starting it over with the CSV header or appending to an existing backup.
+        :param filename: Path of the backup file.
+        :param header: List of the column names, also used as the JSON keys.
+        :param backup_format: One of BACKUP_FORMATS.
+        :param append_offset: (Optional) Offset of a flush of an existing backup to append at (for example, on a
+            resumed run), dropping anything written after it; the backup starts over when None.
+        """
+        self.filename = filename
+        self.header = header
+        self.backup_format = backup_format
+        self.rows = []
+        append = append_offset is not None and os.path.exists(filename)
+
+        if backup_format == BACKUP_FORMAT_JSONL_GZIP:
+            self.backup_file = open(filename, BINARY_UPDATE_MODE if append else BINARY_WRITE_MODE)
+        else:
+            self.backup_file = open(filename, FILE_UPDATE_MODE if append else FILE_WRITE_MODE)
+            self.csv_writer = csv.writer(self.backup_file)
+
+        if append:
+            # rows (or a torn gzip member) written after the last recorded flush would duplicate or corrupt the backup;
+            # seeking there, rather than opening in append mode, keeps tell() right before the first write as well
+            self.backup_file.seek(append_offset)
+            self.backup_file.truncate()
+        elif backup_format == BACKUP_FORMAT_CSV:
+            self.csv_writer.writerow(header)
+
+    def add(self, row):
+        """
+        Queue a row for the next flush.
+        :param row: List of the column values, in header order.
+        :return: None
+        """
+        self.rows.append(row)
+
+    def flush(self, sync=False):
+        """
+        Write the queued rows in one batch and flush them to the operating system, optionally forcing them to disk.
+        :param sync: Whether to fsync the file as well, for checkpoints worth surviving an OS crash.
+        :return: The offset of the end of the backup, to append at after a restart.
+        """
+        if self.backup_format == BACKUP_FORMAT_JSONL_GZIP:
+            if self.rows:
+                lines = "".join(json.dumps(dict(zip(self.header, row))) + "\n" for row in self.rows)
+                self.backup_file.write(gzip.compress(lines.encode(TEXT_ENCODING)))
+        else:
+            self.csv_writer.writerows(self.rows)
+        if self.rows:
+            print(LOG_BACKUP_FLUSHED.format(count=len(self.rows), filename=self.filename))
+        self.rows = []
+
+        self.backup_file.flush()
+        if sync:
+            os.fsync(self.backup_file.fileno())
+        return self.backup_file.tell()
+
+    def close(self):
+        """
+        Flush any queued rows to disk and close the backup file.
+        :return: None
+        """
+        self.flush(sync=True)
+        self.backup_file.close()
+
+
+def read_backup(filename):
+    """
+    Stream the rows back from a backup file written by BackupWriter, in either format.
+    :param filename: Path of the backup file; the format follows from its extension.
+    :return: Generator yielding the rows as dictionaries keyed by the header, with list columns parsed back to lists.
+    """
+    if filename.endswith(BACKUP_FORMAT_JSONL_GZIP):
+        with gzip.open(filename, TEXT_READ_MODE, encoding=TEXT_ENCODING) as backup_file:
+            for line in backup_file:
+                # empty lists got written as empty strings, like in the CSV format
+                yield {column: value or [] for column, value in json.loads(line).items()}
+        return
+
+    with open(filename, FILE_READ_MODE) as backup_file:
+        for row in csv.DictReader(backup_file):
+            # list columns got written as Python list reprs, and empty lists as empty strings; columns missing from
+            # rows written before they got added come back as None
+            yield {column: ast.literal_eval(value) if value and value.startswith("[") else value or []
+                   for column, value in row.items()}
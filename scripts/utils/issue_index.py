@@ -0,0 +1,364 @@
+import math
+import os
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from itertools import islice
+from utils.jira_utils import (count_issues, get_scannable_fields, is_field_populated, scan_issues, CACHE_DIRECTORY,
+                              FIELDS, JIRA_INSTANCE_ID, JsonFieldNames, PROJECT)
+
+# key global variables
+ISSUE_INDEX_FILENAME = os.path.join(CACHE_DIRECTORY, f"issue_index_{JIRA_INSTANCE_ID}.sqlite")
+SYNC_BATCH_SIZE = 1000
+WATERMARK_OVERLAP_MINUTES = 5  # re-reads a few minutes to cover JQL's minute precision and Jira's indexing lag
+# how often a refresh compares every issue ID with Jira, catching deletions the issue count misses
+RECONCILE_INTERVAL_SECONDS = int(os.getenv("JIRA_INDEX_RECONCILE_SECONDS", str(24 * 3600)))
+
+# additional global variables
+CUSTOM_FIELD_PREFIX = "customfield_"
+ISSUE_TYPE = "issuetype"
+STATUS = "status"
+UPDATED = "updated"
+UPDATED_SINCE_JQL = 'updated >= "-{minutes}m"'
+JIRA_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
+RECONCILED_AT = "reconciled_at"
+SYNC_STARTED_AT = "sync_started_at"
+WATERMARK = "watermark"
+GROUP_BY_COLUMNS = {PROJECT: "issues.project", ISSUE_TYPE: "issues.issue_type", STATUS: "issues.status"}
+SCHEMA_STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS issues (
+        id INTEGER PRIMARY KEY,
+        key TEXT NOT NULL,
+        project TEXT NOT NULL,
+        issue_type TEXT,
+        status TEXT,
+        updated TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS issues_by_project ON issues (project)",
+    # populated custom fields per issue, stored as the numeric part of 'customfield_NNNNN' to keep the index compact
+    """CREATE TABLE IF NOT EXISTS issue_fields (
+        field_id INTEGER NOT NULL,
+        issue_id INTEGER NOT NULL,
+        PRIMARY KEY (field_id, issue_id)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS issue_fields_by_issue ON issue_fields (issue_id)",
+    "CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TEMPORARY TABLE IF NOT EXISTS synced_issues (id INTEGER PRIMARY KEY)",
+]
+
+# console error and log messages
+ERROR_MSG_EMPTY_INDEX = "Error: The local issue index is empty. Run './4_issue_field_index.py build' first."
+LOG_INDEX_DELETED = "Removed {count} issues that no longer exist in Jira from the index."
+LOG_INDEX_DELTA = "Syncing issues updated in the last {minutes} minutes (since the sync of {since})..."
+LOG_INDEX_RECONCILE = "Jira has {jira_count} issues but the index has {index_count}, reconciling deleted issues..."
+LOG_INDEX_RECONCILE_SCHEDULED = "Comparing every issue ID with Jira, last done {reconciled_at}..."
+LOG_INDEX_SYNCED = ("Indexed {count} issues into {filename} ({added} field usages added, {removed} removed, "
+                    "watermark {watermark}).")
+
+
+def open_issue_index(filename=ISSUE_INDEX_FILENAME):
+    """
+    Open (and create if needed) the local SQLite issue-field index.
+    :param filename: Path of the SQLite database file.
+    :return: An open sqlite3.Connection.
+    """
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    connection = sqlite3.connect(filename)
+    for statement in SCHEMA_STATEMENTS:
+        connection.execute(statement)
+    return connection
+
+
+def to_index_field_id(field_id):
+    """
+    Convert a custom field ID to the compact integer form stored in the index.
+    :param field_id: The custom field ID, for example "customfield_10000".
+    :return: The numeric part of the ID, for example 10000.
+    """
+    return int(field_id.removeprefix(CUSTOM_FIELD_PREFIX))
+
+
+def from_index_field_id(index_field_id):
+    """
+    Convert a compact integer field ID from the index back to the custom field ID.
+    :param index_field_id: The numeric part of the ID, for example 10000.
+    :return: The custom field ID, for example "customfield_10000".
+    """
+    return f"{CUSTOM_FIELD_PREFIX}{index_field_id}"
+
+
+def to_index_row(issue, field_specs):
+    """
+    Reduce a search result issue to the row and the set of populated custom fields the index stores.
+    :param issue: Issue (as a dictionary) from a search response.
+    :param field_specs: List of (field ID, schema type, clause name) tuples from get_scannable_fields.
+    :return: Tuple of the issue row and the set of populated compact field IDs.
+    """
+    issue_fields = issue.get(FIELDS, {})
+    row = (
+        int(issue[JsonFieldNames.ID]),
+        issue[JsonFieldNames.KEY],
+        (issue_fields.get(PROJECT) or {}).get(JsonFieldNames.KEY),
+        (issue_fields.get(ISSUE_TYPE) or {}).get(JsonFieldNames.NAME),
+        (issue_fields.get(STATUS) or {}).get(JsonFieldNames.NAME),
+        issue_fields.get(UPDATED),
+    )
+    populated_fields = {
+        to_index_field_id(field_id)
+        for field_id, schema_type, clause_name in field_specs
+        if is_field_populated(issue_fields.get(field_id), schema_type, clause_name)
+    }
+    return row, populated_fields
+
+
+def read_sync_state(connection, name):
+    """
+    Read a value remembered between syncs, for example the watermark.
+    :param connection: Open connection to the issue index.
+    :param name: Name of the value.
+    :return: The stored value, or None if there is none.
+    """
+    row = connection.execute("SELECT value FROM sync_state WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def write_sync_state(connection, name, value):
+    """
+    Remember a value between syncs, for example the watermark.
+    :param connection: Open connection to the issue index.
+    :param name: Name of the value.
+    :param value: Value to store.
+    :return: None
+    """
+    with connection:
+        connection.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (name, value))
+
+
+def parse_jira_timestamp(timestamp):
+    """
+    Parse a Jira timestamp such as "2024-12-20T10:15:30.000-0500" into a timezone-aware datetime in UTC.
+    :param timestamp: The timestamp string from an issue's 'updated' field.
+    :return: The timestamp as a UTC datetime.
+    """
+    return datetime.strptime(timestamp, JIRA_TIMESTAMP_FORMAT).astimezone(timezone.utc)
+
+
+def write_index_batch(connection, batch):
+    """
+    Upsert one batch of issues and apply each issue's populated field set as a diff against the one stored, so a
+    field cleared on an issue removes that issue from the field's usage count.
+    :param connection: Open connection to the issue index.
+    :param batch: List of (issue row, populated field IDs) tuples from to_index_row.
+    :return: Tuple of the number of field usages added and removed.
+    """
+    issue_ids = [row[0] for row, _ in batch]
+    stored_fields = {issue_id: set() for issue_id in issue_ids}
+    placeholders = ",".join("?" * len(issue_ids))
+    for issue_id, field_id in connection.execute(
+            f"SELECT issue_id, field_id FROM issue_fields WHERE issue_id IN ({placeholders})", issue_ids):
+        stored_fields[issue_id].add(field_id)
+
+    added_fields = []
+    removed_fields = []
+    for row, populated_fields in batch:
+        issue_id = row[0]
+        added_fields.extend((field_id, issue_id) for field_id in populated_fields - stored_fields[issue_id])
+        removed_fields.extend((field_id, issue_id) for field_id in stored_fields[issue_id] - populated_fields)
+
+    with connection:
+        connection.executemany("INSERT OR REPLACE INTO issues VALUES (?, ?, ?, ?, ?, ?)", [row for row, _ in batch])
+        connection.executemany("DELETE FROM issue_fields WHERE field_id = ? AND issue_id = ?", removed_fields)
+        connection.executemany("INSERT INTO issue_fields VALUES (?, ?)", added_fields)
+        connection.executemany("INSERT OR IGNORE INTO synced_issues VALUES (?)",
+                               [(issue_id,) for issue_id in issue_ids])
+    return len(added_fields), len(removed_fields)
+
+
+def sync_issue_index(connection, custom_fields, jql=""):
+    """
+    Stream the issues matching the JQL from Jira into the index in batches, requesting only the columns it stores,
+    and advance the watermark to the latest 'updated' timestamp seen. The issues come in keyset order (by ID), which
+    covers every match once however their 'updated' timestamps change mid-scan, so a delta needs no other order.
+    :param connection: Open connection to the issue index.
+    :param custom_fields: List of custom fields (as dictionaries) from fetch_custom_fields.
+    :param jql: (Optional) JQL to restrict which issues get synced, all issues by default.
+    :return: Number of issues synced.
+    """
+    # by the local clock, so the next delta window never mixes it with Jira's clock
+    sync_started_at = datetime.now(timezone.utc)
+    field_specs = get_scannable_fields(custom_fields)
+    field_ids = [PROJECT, ISSUE_TYPE, STATUS, UPDATED] + [field_id for field_id, _, _ in field_specs]
+    index_rows = (to_index_row(issue, field_specs) for issue in scan_issues(field_ids, jql))
+
+    stored_watermark = read_sync_state(connection, WATERMARK)
+    watermark = datetime.fromisoformat(stored_watermark) if stored_watermark else None
+    synced_count = added_count = removed_count = 0
+    while batch := list(islice(index_rows, SYNC_BATCH_SIZE)):
+        added, removed = write_index_batch(connection, batch)
+        synced_count += len(batch)
+        added_count += added
+        removed_count += removed
+        for row, _ in batch:
+            updated = parse_jira_timestamp(row[5]) if row[5] else None
+            if updated and (not watermark or updated > watermark):
+                watermark = updated
+
+    if watermark:
+        write_sync_state(connection, WATERMARK, watermark.isoformat())
+    write_sync_state(connection, SYNC_STARTED_AT, sync_started_at.isoformat())
+    print(LOG_INDEX_SYNCED.format(count=synced_count, filename=ISSUE_INDEX_FILENAME, added=added_count,
+                                  removed=removed_count, watermark=watermark.isoformat() if watermark else None))
+    return synced_count
+
+
+def delete_unsynced_issues(connection):
+    """
+    Drop the issues (and their field usages) that the last sync into 'synced_issues' did not see.
+    :param connection: Open connection to the issue index.
+    :return: None
+    """
+    with connection:
+        deleted_count = connection.execute(
+            "DELETE FROM issues WHERE id NOT IN (SELECT id FROM synced_issues)").rowcount
+        connection.execute("DELETE FROM issue_fields WHERE issue_id NOT IN (SELECT id FROM issues)")
+    write_sync_state(connection, RECONCILED_AT, datetime.now(timezone.utc).isoformat())
+    print(LOG_INDEX_DELETED.format(count=deleted_count))
+
+
+def reconcile_deleted_issues(connection):
+    """
+    Drop the indexed issues that got deleted in Jira. A single count query detects whether any did, and only then
+    an ID-only scan over all issues finds which ones. The count misses deletions offset by other drift (for example,
+    an issue deleted while another one the deltas missed got created), so the ID scan also runs once every
+    RECONCILE_INTERVAL_SECONDS regardless of the count.
+    :param connection: Open connection to the issue index.
+    :return: None
+    """
+    reconciled_at = read_sync_state(connection, RECONCILED_AT)
+    reconciled_seconds_ago = ((datetime.now(timezone.utc) - datetime.fromisoformat(reconciled_at)).total_seconds()
+                              if reconciled_at else math.inf)
+    if reconciled_seconds_ago < RECONCILE_INTERVAL_SECONDS:
+        jira_count = count_issues()
+        index_count = count_indexed_issues(connection)
+        if jira_count == index_count:
+            return
+        print(LOG_INDEX_RECONCILE.format(jira_count=jira_count, index_count=index_count))
+    else:
+        print(LOG_INDEX_RECONCILE_SCHEDULED.format(reconciled_at=reconciled_at))
+
+    with connection:
+        connection.execute("DELETE FROM synced_issues")
+    issue_ids = ((int(issue[JsonFieldNames.ID]),) for issue in scan_issues([JsonFieldNames.ID]))
+    while batch := list(islice(issue_ids, SYNC_BATCH_SIZE)):
+        with connection:
+            connection.executemany("INSERT OR IGNORE INTO synced_issues VALUES (?)", batch)
+    delete_unsynced_issues(connection)
+
+
+def build_issue_index(connection, custom_fields):
+    """
+    Rebuild the index from scratch with every issue in Jira.
+    :param connection: Open connection to the issue index.
+    :param custom_fields: List of custom fields (as dictionaries) from fetch_custom_fields.
+    :return: Number of issues indexed.
+    """
+    with connection:
+        connection.execute("DELETE FROM issue_fields")
+        connection.execute("DELETE FROM issues")
+        connection.execute("DELETE FROM sync_state")
+    synced_count = sync_issue_index(connection, custom_fields)
+    # a fresh index holds exactly the issues in Jira, so the next ID comparison is a whole interval away
+    write_sync_state(connection, RECONCILED_AT, datetime.now(timezone.utc).isoformat())
+    return synced_count
+
+
+def refresh_issue_index(connection, custom_fields, full=False):
+    """
+    Bring the index up to date with Jira. Normally only the issues updated since the watermark get fetched and
+    applied as diffs, followed by a reconciliation of deleted issues; without a watermark (or when forced) every issue
+    gets re-synced instead.
+    :param connection: Open connection to the issue index.
+    :param custom_fields: List of custom fields (as dictionaries) from fetch_custom_fields.
+    :param full: When True, re-sync every issue instead of only the changed ones.
+    :return: Number of issues synced.
+    """
+    with connection:
+        connection.execute("DELETE FROM synced_issues")
+
+    watermark = read_sync_state(connection, WATERMARK)
+    if full or not watermark:
+        synced_count = sync_issue_index(connection, custom_fields)
+        delete_unsynced_issues(connection)
+        return synced_count
+
+    # relative JQL dates avoid depending on the Jira user's timezone; Jira resolves them with its own clock, so the
+    # window gets measured from the last sync's start on the local clock (indexes synced before that got recorded
+    # fall back to the watermark, Jira's timestamp, which the overlap only covers for small clock skews)
+    window_start = read_sync_state(connection, SYNC_STARTED_AT) or watermark
+    elapsed_seconds = (datetime.now(timezone.utc) - datetime.fromisoformat(window_start)).total_seconds()
+    minutes = max(0, math.ceil(elapsed_seconds / 60)) + WATERMARK_OVERLAP_MINUTES
+    print(LOG_INDEX_DELTA.format(minutes=minutes, since=window_start))
+    synced_count = sync_issue_index(connection, custom_fields, UPDATED_SINCE_JQL.format(minutes=minutes))
+    reconcile_deleted_issues(connection)
+    return synced_count
+
+
+def update_issue_index(custom_fields, full=False):
+    """
+    Open the index, bring it up to date with Jira (see refresh_issue_index), and close it again.
+    :param custom_fields: List of custom fields (as dictionaries) from fetch_custom_fields.
+    :param full: When True, re-sync every issue instead of only the changed ones.
+    :return: Number of issues synced.
+    """
+    connection = open_issue_index()
+    try:
+        return refresh_issue_index(connection, custom_fields, full)
+    finally:
+        connection.close()
+
+
+def count_indexed_issues(connection):
+    """
+    Count the issues currently in the index.
+    :param connection: Open connection to the issue index.
+    :return: Number of indexed issues.
+    """
+    return connection.execute("SELECT COUNT(*) FROM issues").fetchone()[0]
+
+
+def query_indexed_field_usage(connection, group_by=None):
+    """
+    Count the issues using each custom field straight from the index, optionally grouped by an issue attribute.
+    :param connection: Open connection to the issue index.
+    :param group_by: (Optional) One of GROUP_BY_COLUMNS' keys, for example "project".
+    :return: Dictionary mapping each custom field ID to its usage count, or to a dictionary of usage counts per group
+    value when group_by gets provided.
+    """
+    if not group_by:
+        rows = connection.execute("SELECT field_id, COUNT(*) FROM issue_fields GROUP BY field_id")
+        return {from_index_field_id(field_id): usage for field_id, usage in rows}
+
+    group_column = GROUP_BY_COLUMNS[group_by]
+    rows = connection.execute(
+        f"SELECT issue_fields.field_id, {group_column}, COUNT(*) FROM issue_fields "
+        f"JOIN issues ON issues.id = issue_fields.issue_id GROUP BY issue_fields.field_id, {group_column}")
+    usage = {}
+    for field_id, group_value, count in rows:
+        usage.setdefault(from_index_field_id(field_id), {})[group_value] = count
+    return usage
+
+
+def read_indexed_field_usage(group_by=None):
+    """
+    Open the index and read the custom field usage from it, exiting when the index has not been built yet.
+    :param group_by: (Optional) One of GROUP_BY_COLUMNS' keys, for example "project".
+    :return: Dictionary of usage as returned by query_indexed_field_usage.
+    """
+    connection = open_issue_index()
+    try:
+        if not count_indexed_issues(connection):
+            print(ERROR_MSG_EMPTY_INDEX)
+            sys.exit(1)
+        return query_indexed_field_usage(connection, group_by)
+    finally:
+        connection.close()
@@ -1,34 +1,105 @@
+import asyncio
+import hashlib
+import json
 import os
+import random
+import re
 import sys
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
 from enum import StrEnum
 from http import HTTPStatus
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utils.run_metrics import METRICS, PHASE_PARSE, get_response_size
+from utils.throttling import REQUEST_KIND_OTHER, REQUEST_KIND_SEARCH, THROTTLE
+
+try:
+    import aiohttp
+except ImportError:  # only the event loop client needs aiohttp; the blocking helpers run on requests alone
+    aiohttp = None
 
 # key API global variables
 PERSONAL_ACCESS_TOKEN = os.getenv("PERSONAL_ACCESS_TOKEN")
-JIRA_BASE_URL = "http://localhost:8080"
+JIRA_BASE_URL = os.getenv("JIRA_BASE_URL", "http://localhost:8080")
 CUSTOM_FIELDS_ENDPOINT = f"{JIRA_BASE_URL}/rest/api/2/field"
+CUSTOM_FIELD_OPTIONS_ENDPOINT = f"{JIRA_BASE_URL}/rest/api/2/customFields/{{field_number}}/options"
 PROJECTS_ENDPOINT = f"{JIRA_BASE_URL}/rest/api/2/project"
+ISSUE_ENDPOINT = f"{JIRA_BASE_URL}/rest/api/2/issue/"
 SEARCH_ENDPOINT = f"{JIRA_BASE_URL}/rest/api/2/search"
 
 # HTTP headers
+ACCEPT_ENCODING_HEADER = "Accept-Encoding"
+ACCEPT_ENCODING_GZIP = "gzip, deflate"
 AUTHORIZATION_HEADER = "Authorization"
 BEARER_TOKEN_PREFIX = "Bearer"
+CONNECTION_HEADER = "Connection"
+CONNECTION_KEEP_ALIVE = "keep-alive"
 CONTENT_TYPE_HEADER = "Content-Type"
 CONTENT_TYPE_JSON = "application/json"
+ETAG_HEADER = "ETag"
+IF_MODIFIED_SINCE_HEADER = "If-Modified-Since"
+IF_NONE_MATCH_HEADER = "If-None-Match"
+LAST_MODIFIED_HEADER = "Last-Modified"
 HEADERS = {
     AUTHORIZATION_HEADER: f"{BEARER_TOKEN_PREFIX} {PERSONAL_ACCESS_TOKEN}",
     CONTENT_TYPE_HEADER: CONTENT_TYPE_JSON,
 }
 
+# HTTP connection pool and retry settings
+HTTP_GET = "GET"
+HTTP_POST = "POST"
+HTTP_PUT = "PUT"
+HTTP_SCHEMES = ["http://", "https://"]
+POOL_SIZE = int(os.getenv("JIRA_POOL_SIZE", "10"))
+REQUEST_TIMEOUT_SECONDS = 60
+RETRY_AFTER_HEADER = "Retry-After"
+RETRY_ALLOWED_METHODS = [HTTP_GET, HTTP_POST, HTTP_PUT]  # searches are read-only POSTs and edits are idempotent PUTs
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_BACKOFF_JITTER = 0.5
+RETRY_BACKOFF_MAX_SECONDS = 120  # same cap as urllib3's Retry
+RETRY_MAX_ATTEMPTS = int(os.getenv("JIRA_MAX_RETRIES", "5"))
+DEFAULT_MAX_WORKERS = 8
+RETRY_STATUS_CODES = [HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.BAD_GATEWAY, HTTPStatus.SERVICE_UNAVAILABLE,
+                      HTTPStatus.GATEWAY_TIMEOUT]
+
+# local cache settings
+CACHE_DIRECTORY = os.getenv("JIRA_CACHE_DIR", ".jira_cache")
+JQL_STRATEGY_CACHE_FILENAME = os.path.join(CACHE_DIRECTORY, "jql_strategies.json")
+JIRA_INSTANCE_ID = hashlib.sha256(JIRA_BASE_URL.encode()).hexdigest()[:16]  # keys per-instance cache files
+METADATA_CACHE_FILENAME = os.path.join(CACHE_DIRECTORY, f"metadata_{JIRA_INSTANCE_ID}.json")
+METADATA_CACHE_TTL_SECONDS = int(os.getenv("JIRA_METADATA_TTL_SECONDS", "3600"))
+
+# search response streaming settings
+STREAM_SEARCH_RESPONSES = os.getenv("JIRA_STREAM_SEARCH", "1") != "0"  # parse search pages incrementally
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_ENCODING = "utf-8"
+JSON_WHITESPACE_PATTERN = re.compile(r"[ \t\n\r]*")
+OPTION_CATALOG_FILENAME = os.path.join(CACHE_DIRECTORY, f"options_{JIRA_INSTANCE_ID}.json")
+
 # console error messages
+ERROR_MSG_AIOHTTP_MISSING = "Error: Running on an event loop requires aiohttp; install it with 'pip install aiohttp'."
 ERROR_MSG_ENV_VARIABLE = "Error: PERSONAL_ACCESS_TOKEN environment variable is not set."
+ERROR_MSG_EXPECTED_JSON = "Expected one of '{expected}' in the JSON stream at character {position}, got '{found}'"
 ERROR_MSG_FETCH_FIELDS = "Failed to retrieve fields. Status Code: {status_code}"
+ERROR_MSG_FETCH_OPTIONS = "Error fetching options for field '{field_id}', status: {status_code}, response: {response}"
+ERROR_MSG_FETCH_OPTIONS_SHORT = "Error fetching options for field '{field_id}': {error}"
 ERROR_MSG_FETCH_PROJECTS = "Failed to retrieve projects. Status Code: {status_code}"
 ERROR_MSG_QUERY_ISSUES = "Error querying issues for {clause_name} in {project_info}. Status Code: {status_code}"
 ERROR_MSG_UNSUPPORTED_FIELD_TYPE = "Unsupported field type '{field_type}'. Skipping..."
 ERROR_MSG_RESPONSE_TEXT = "Response: {response_text}"
+ERROR_MSG_RETRIES_EXHAUSTED = "Error: Jira still returned {status_code} after {retries} retries. Exiting."
 LOG_FETCH_FIELDS = "Fetching custom fields..."
+LOG_METADATA_CACHE_HIT = "Using cached {metadata} from {age:.0f} seconds ago."
+LOG_OPTIONS_FALLBACK = "Field option endpoint unavailable for '{field_id}', using the edit metadata of '{issue_key}'..."
+LOG_METADATA_NOT_MODIFIED = "Cached {metadata} are still current on the server."
+LOG_JQL_STRATEGY_INVALIDATED = "Cached JQL condition '{condition}' for {clause_name} no longer works, relearning it..."
+LOG_PROBE_JQL_STRATEGIES = "Probing JQL conditions for {count} 'any' type custom fields..."
+LOG_SCAN_PROGRESS = "Scanned {count} issues, {remaining} left..."
 WARNING_BAD_REQUEST = (f"Got error {HTTPStatus.BAD_REQUEST} BAD_REQUEST for 'any' field type with 'IS NOT EMPTY', "
                        f"retrying with > 0'")
 
@@ -37,11 +108,18 @@ class JsonFieldNames(StrEnum):
     A class representing enumeration of JSON field names.
     """
     ANY = "any"
+    BASE_URL = "base_url"
+    DATA = "data"
+    ETAG = "etag"
+    FETCHED_AT = "fetched_at"
+    LAST_MODIFIED = "last_modified"
     ARRAY = "array"
     CLAUSE_NAMES = "clauseNames"
+    CONDITION = "condition"
     CUSTOM = "custom"
     DATE = "date"
     ID = "id"
+    ISSUES = "issues"
     JQL = "jql"
     KEY = "key"
     NAME = "name"
@@ -49,27 +127,43 @@ class JsonFieldNames(StrEnum):
     OPTION = "option"
     PROJECT_KEY = "project_key"
     PROJECT_NAME = "project_name"
+    PROJECTS = "projects"
     SCHEMA = "schema"
     STRING = "string"
     TOTAL = "total"
     TYPE = "type"
     UNKNOWN = "unknown"
     USAGE = "usage"
+    VALUE = "value"
+    VALUES = "values"
 
 # additional global variables
 ALL_PROJECTS = "all projects"
+ALLOWED_VALUES = "allowedValues"
+CUSTOM_FIELD_PREFIX = "customfield_"
+IS_LAST = "isLast"
+ISSUE_TYPE_IDS = "issueTypeIds"
+OPTION_PAGE_SIZE = 1000
+PROJECT_IDS = "projectIds"
+EDIT_META = "editmeta"
 COMMITS_FIELD = "[commits]"
 DEVELOPMENT_FIELD = "cf[10000]"
 FIELDS = "fields"
 FILE_APPEND_MODE = "a"
+FILE_READ_MODE = "r"
 FILE_WRITE_MODE = "w"
 GREATER_THAN_ZERO_CLAUSE = "> 0"
 IS_NOT_EMPTY_CLAUSE = "IS NOT EMPTY"
+KEYSET_CONDITION_TEMPLATE = "id > {after_id}"
 MAX_RESULTS = "maxResults"
+ORDER_BY_ID = "ORDER BY id"
 PROJECT = "project"
 PROJECT_CONDITION_TEMPLATE = 'project = "{project_key}" AND '
+SCAN_PAGE_SIZE = 1000  # Jira's default cap on maxResults
 START_AT = "startAt"
 START_AT_VALUE = 0
+VALIDATE_QUERY = "validateQuery"
+VALIDATE_QUERY_WARN = "warn"  # unknown issue keys and IDs in the JQL become warnings instead of a 400 BAD_REQUEST
 SUPPORTED_FIELD_TYPES = [JsonFieldNames.NUMBER, JsonFieldNames.ANY, JsonFieldNames.STRING, JsonFieldNames.ARRAY,
                          JsonFieldNames.DATE, JsonFieldNames.OPTION]
 
@@ -79,53 +173,985 @@ if not PERSONAL_ACCESS_TOKEN:
     sys.exit(1)
 
 
-def fetch_custom_fields():
+def get_request_kind(url, kwargs):
     """
-    Fetch all custom fields from the Jira API.
-    :return: List of custom fields (as dictionaries), sorted by 'id'.
+    Tell a search page from the other requests, for the adaptive THROTTLE to hold it to its own latency SLO; a count
+    query asks for no issues, so it counts as another request.
+    :param url: Full URL of the Jira REST endpoint.
+    :param kwargs: Additional arguments of the request, with the search payload as 'json'.
+    :return: One of the throttle's request kinds.
     """
-    response = requests.get(CUSTOM_FIELDS_ENDPOINT, headers=HEADERS)
+    payload = kwargs.get("json") or {}
+    return REQUEST_KIND_SEARCH if url == SEARCH_ENDPOINT and payload.get(MAX_RESULTS) else REQUEST_KIND_OTHER
 
-    if response.status_code != HTTPStatus.OK:
-        print(ERROR_MSG_FETCH_FIELDS.format(status_code=response.status_code))
-        print(ERROR_MSG_RESPONSE_TEXT.format(response_text=response.text))
+
+class JiraClient:
+    """
+    A shared HTTP client for the Jira REST API that keeps connections alive in a pool, asks for gzip responses, and
+    retries throttled or unavailable responses with exponential backoff and jitter, honouring 'Retry-After'. Every
+    request waits for a slot of the adaptive THROTTLE and gets recorded in the run's METRICS.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, max_retries=RETRY_MAX_ATTEMPTS):
+        """
+        Create the pooled session with the authorization and content headers every request needs.
+        :param pool_size: Maximum number of connections kept alive to the Jira host.
+        :param max_retries: Maximum number of retries for a request that keeps getting a retryable status code.
+        """
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        self.session.headers.update({ACCEPT_ENCODING_HEADER: ACCEPT_ENCODING_GZIP,
+                                     CONNECTION_HEADER: CONNECTION_KEEP_ALIVE})
+        self.set_pool_size(pool_size)
+
+    def set_pool_size(self, pool_size):
+        """
+        (Re)mount the connection pool so it can keep the given number of connections alive, for example to match the
+        number of worker threads sharing this client.
+        :param pool_size: Maximum number of connections kept alive to the Jira host.
+        :return: None
+        """
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=RETRY_BACKOFF_FACTOR,
+            backoff_jitter=RETRY_BACKOFF_JITTER,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=RETRY_ALLOWED_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False,  # hand the last response back so callers can report it
+        )
+        adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+        for scheme in HTTP_SCHEMES:
+            self.session.mount(scheme, adapter)
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request through the pooled session once the adaptive THROTTLE lets it start, recording its latency,
+        status codes, retries and size.
+        :param method: HTTP method, for example "GET".
+        :param url: Full URL of the Jira REST endpoint.
+        :param kwargs: Additional arguments for requests, for example 'json' or 'params'.
+        :return: The final requests.Response after any retries.
+        """
+        kwargs.setdefault("timeout", REQUEST_TIMEOUT_SECONDS)
+        request_kind = get_request_kind(url, kwargs)
+        THROTTLE.acquire()
+        start_time = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            THROTTLE.release(time.perf_counter() - start_time, [None], request_kind)
+            METRICS.record_error(method, url, time.perf_counter() - start_time)
+            raise
+        retries = getattr(response.raw, "retries", None)
+        THROTTLE.release(response.elapsed.total_seconds(),
+                         [attempt.status for attempt in (retries.history if retries else ())] + [response.status_code],
+                         request_kind)
+        METRICS.record_response(method, url, response, time.perf_counter() - start_time, kwargs.get("stream", False))
+        return response
+
+    def get(self, url, **kwargs):
+        """
+        Send a GET request through the pooled session.
+        :param url: Full URL of the Jira REST endpoint.
+        :param kwargs: Additional arguments for requests.
+        :return: The final requests.Response after any retries.
+        """
+        return self.request(HTTP_GET, url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """
+        Send a POST request through the pooled session.
+        :param url: Full URL of the Jira REST endpoint.
+        :param kwargs: Additional arguments for requests, usually the 'json' payload.
+        :return: The final requests.Response after any retries.
+        """
+        return self.request(HTTP_POST, url, **kwargs)
+
+    def put(self, url, **kwargs):
+        """
+        Send a PUT request through the pooled session.
+        :param url: Full URL of the Jira REST endpoint.
+        :param kwargs: Additional arguments for requests, usually the 'json' payload.
+        :return: The final requests.Response after any retries.
+        """
+        return self.request(HTTP_PUT, url, **kwargs)
+
+
+# the one client every script shares, so connections get reused across helpers
+JIRA_CLIENT = JiraClient()
+
+# the errors a request can fail with instead of returning a response, on either client
+TRANSPORT_ERRORS = (requests.RequestException,) if aiohttp is None else (requests.RequestException,
+                                                                         aiohttp.ClientError, asyncio.TimeoutError)
+
+# marks the end of the items of run_concurrently_async
+ITEMS_EXHAUSTED = object()
+
+# one request an exchange needs sent, with the keyword arguments for JiraClient.request
+JiraRequest = namedtuple("JiraRequest", ["method", "url", "kwargs"])
+
+
+def get_retry_delay(retry_number, retry_after=None):
+    """
+    Work out how long to wait before a retry, the way urllib3's Retry does for JiraClient: the server's
+    'Retry-After' when it sent one, otherwise exponential backoff with jitter (no wait before the first retry).
+    :param retry_number: Number of the retry about to be made, starting at 1.
+    :param retry_after: (Optional) Value of the response's 'Retry-After' header, in seconds or as an HTTP date.
+    :return: The delay in seconds.
+    """
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    if retry_number <= 1:
+        return 0.0
+    backoff = RETRY_BACKOFF_FACTOR * 2 ** (retry_number - 1) + random.uniform(0, RETRY_BACKOFF_JITTER)
+    return min(backoff, RETRY_BACKOFF_MAX_SECONDS)
+
+
+class JiraResponse:
+    """
+    A fully read response of AsyncJiraClient, offering the parts of requests.Response the helpers use.
+    """
+
+    def __init__(self, status_code, headers, content):
+        """
+        :param status_code: HTTP status code of the response.
+        :param headers: Case-insensitive mapping of the response headers.
+        :param content: The (decompressed) response body as bytes.
+        """
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        """
+        :return: The response body decoded as text.
+        """
+        return self.content.decode(STREAM_ENCODING, errors="replace")
+
+    def json(self):
+        """
+        :return: The response body parsed as JSON.
+        """
+        return json.loads(self.content)
+
+
+class AsyncJiraClient:
+    """
+    The asyncio counterpart of JiraClient, on aiohttp: one pooled session per event loop, gzip responses, and the
+    same retries with exponential backoff and jitter for throttled or unavailable responses, honouring 'Retry-After'.
+    Responses get read whole. Every request waits for a slot of the adaptive THROTTLE and gets recorded in the run's
+    METRICS.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, max_retries=RETRY_MAX_ATTEMPTS):
+        """
+        :param pool_size: Maximum number of connections kept open to the Jira host.
+        :param max_retries: Maximum number of retries for a request that keeps getting a retryable status code.
+        """
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.session = None
+        self.session_loop = None
+
+    def set_pool_size(self, pool_size):
+        """
+        Set the number of connections the next session keeps open, for example to match the requests in flight.
+        :param pool_size: Maximum number of connections kept open to the Jira host.
+        :return: None
+        """
+        self.pool_size = pool_size
+
+    def get_session(self):
+        """
+        Get the pooled session of the running event loop, opening it on first use; aiohttp sessions cannot be shared
+        between loops.
+        :return: The aiohttp.ClientSession.
+        """
+        if aiohttp is None:
+            print(ERROR_MSG_AIOHTTP_MISSING)
+            sys.exit(1)
+        loop = asyncio.get_running_loop()
+        if self.session is None or self.session.closed or self.session_loop is not loop:
+            self.session = aiohttp.ClientSession(
+                headers={**HEADERS, ACCEPT_ENCODING_HEADER: ACCEPT_ENCODING_GZIP},
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS),
+            )
+            self.session_loop = loop
+        return self.session
+
+    async def close(self):
+        """
+        Close the session and its connections, if one is open.
+        :return: None
+        """
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        self.session_loop = None
+
+    async def request(self, method, url, **kwargs):
+        """
+        Send a request through the pooled session once the adaptive THROTTLE lets it start, and read its body,
+        retrying retryable status codes and connection errors, and recording its latency, status codes, retries and
+        size.
+        :param method: HTTP method, for example "GET".
+        :param url: Full URL of the Jira REST endpoint.
+        :param kwargs: Additional arguments for aiohttp, for example 'json' or 'params'; 'stream' gets ignored.
+        :return: The final JiraResponse after any retries.
+        """
+        kwargs.pop("stream", None)
+        session = self.get_session()
+        request_kind = get_request_kind(url, kwargs)
+        await THROTTLE.acquire_async()
+        start_time = time.perf_counter()
+        retried_statuses = []
+        while True:
+            attempt_start_time = time.perf_counter()
+            try:
+                async with session.request(method, url, **kwargs) as http_response:
+                    response = JiraResponse(http_response.status, http_response.headers, await http_response.read())
+            except TRANSPORT_ERRORS:
+                if len(retried_statuses) >= self.max_retries:
+                    THROTTLE.release(time.perf_counter() - attempt_start_time, retried_statuses + [None],
+                                     request_kind)
+                    METRICS.record_error(method, url, time.perf_counter() - start_time)
+                    raise
+                retried_statuses.append(None)
+                await asyncio.sleep(get_retry_delay(len(retried_statuses)))
+                continue
+            except BaseException:
+                THROTTLE.release(time.perf_counter() - attempt_start_time, retried_statuses, request_kind)
+                raise  # for example the task getting cancelled
+
+            if response.status_code not in RETRY_STATUS_CODES or len(retried_statuses) >= self.max_retries:
+                break
+            retried_statuses.append(response.status_code)
+            await asyncio.sleep(get_retry_delay(len(retried_statuses), response.headers.get(RETRY_AFTER_HEADER)))
+
+        THROTTLE.release(time.perf_counter() - attempt_start_time, retried_statuses + [response.status_code],
+                         request_kind)
+        METRICS.record_request(method, url, response.status_code, time.perf_counter() - attempt_start_time,
+                               time.perf_counter() - start_time, retried_statuses, len(response.content))
+        return response
+
+    async def get(self, url, **kwargs):
+        """
+        Send a GET request through the pooled session.
+        :param url: Full URL of the Jira REST endpoint.
+        :param kwargs: Additional arguments for aiohttp.
+        :return: The final JiraResponse after any retries.
+        """
+        return await self.request(HTTP_GET, url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        """
+        Send a POST request through the pooled session.
+        :param url: Full URL of the Jira REST endpoint.
+        :param kwargs: Additional arguments for aiohttp, usually the 'json' payload.
+        :return: The final JiraResponse after any retries.
+        """
+        return await self.request(HTTP_POST, url, **kwargs)
+
+    async def put(self, url, **kwargs):
+        """
+        Send a PUT request through the pooled session.
+        :param url: Full URL of the Jira REST endpoint.
+        :param kwargs: Additional arguments for aiohttp, usually the 'json' payload.
+        :return: The final JiraResponse after any retries.
+        """
+        return await self.request(HTTP_PUT, url, **kwargs)
+
+
+# the one client every coroutine shares; it opens a session on each event loop it gets used on
+ASYNC_JIRA_CLIENT = AsyncJiraClient()
+
+
+def run_exchange(exchange):
+    """
+    Run an exchange on the blocking JIRA_CLIENT. An exchange is a generator holding a helper's logic once for both
+    clients: it yields every JiraRequest it needs, gets sent each response (or has the transport error thrown in),
+    and returns the helper's result.
+    :param exchange: The exchange generator.
+    :return: The result of the exchange.
+    """
+    try:
+        request = next(exchange)
+        while True:
+            try:
+                response = JIRA_CLIENT.request(request.method, request.url, **request.kwargs)
+            except TRANSPORT_ERRORS as error:
+                request = exchange.throw(error)
+            else:
+                request = exchange.send(response)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def run_exchange_async(exchange):
+    """
+    Run an exchange on the event loop's ASYNC_JIRA_CLIENT, the asyncio counterpart of run_exchange.
+    :param exchange: The exchange generator.
+    :return: The result of the exchange.
+    """
+    try:
+        request = next(exchange)
+        while True:
+            try:
+                response = await ASYNC_JIRA_CLIENT.request(request.method, request.url, **request.kwargs)
+            except TRANSPORT_ERRORS as error:
+                request = exchange.throw(error)
+            else:
+                request = exchange.send(response)
+    except StopIteration as stop:
+        return stop.value
+
+
+def load_json_file(filename, default):
+    """
+    Load a JSON file, falling back to a default when it is missing or unreadable (for example, a cache file).
+    :param filename: Path of the JSON file.
+    :param default: Value to return when the file cannot be loaded.
+    :return: The parsed JSON content or the default.
+    """
+    try:
+        with open(filename, FILE_READ_MODE) as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json_file(filename, content):
+    """
+    Atomically write JSON content to a file, creating its directory first, so readers never see a partial file.
+    :param filename: Path of the JSON file.
+    :param content: JSON-serializable content to write.
+    :return: None
+    """
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    temporary_filename = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_filename, FILE_WRITE_MODE) as json_file:
+        json.dump(content, json_file)
+    os.replace(temporary_filename, filename)
+
+
+class JqlStrategyCache:
+    """
+    A persistent, per Jira instance record of which JQL condition worked for each 'any' type custom field, so the
+    failing 'IS NOT EMPTY' query only ever gets sent once per field rather than on every count query.
+    """
+
+    def __init__(self, filename=JQL_STRATEGY_CACHE_FILENAME, base_url=JIRA_BASE_URL):
+        """
+        Load the cached conditions for the Jira instance.
+        :param filename: Path of the JSON cache file, shared by all Jira instances.
+        :param base_url: Base URL of the Jira instance the conditions belong to.
+        """
+        self.filename = filename
+        self.base_url = base_url
+        self.lock = threading.Lock()
+        self.cache = load_json_file(filename, {})
+        self.strategies = self.cache.setdefault(base_url, {})
+
+    def get(self, clause_name, field_type):
+        """
+        Look up the JQL condition that worked for a field, ignoring it if the field's schema type changed since.
+        :param clause_name: The JQL-friendly `cf[...]` clause name of the custom field.
+        :param field_type: Current schema type of the custom field.
+        :return: The cached JQL condition (for example, "> 0"), or None if there is none.
+        """
+        strategy = self.strategies.get(clause_name)
+        if not strategy or strategy[JsonFieldNames.TYPE] != field_type:
+            return None
+        return strategy[JsonFieldNames.CONDITION]
+
+    def record(self, clause_name, field_type, condition):
+        """
+        Remember the JQL condition that worked for a field and persist it if it changed.
+        :param clause_name: The JQL-friendly `cf[...]` clause name of the custom field.
+        :param field_type: Schema type of the custom field.
+        :param condition: The JQL condition that worked, for example "IS NOT EMPTY".
+        :return: None
+        """
+        strategy = {JsonFieldNames.TYPE: field_type, JsonFieldNames.CONDITION: condition}
+        with self.lock:
+            if self.strategies.get(clause_name) == strategy:
+                return
+            self.strategies[clause_name] = strategy
+            save_json_file(self.filename, self.cache)
+
+    def forget(self, clause_name):
+        """
+        Drop the cached JQL condition for a field, for example after it stopped working.
+        :param clause_name: The JQL-friendly `cf[...]` clause name of the custom field.
+        :return: None
+        """
+        with self.lock:
+            if self.strategies.pop(clause_name, None):
+                save_json_file(self.filename, self.cache)
+
+
+JQL_STRATEGY_CACHE = JqlStrategyCache()
+
+
+class RateLimiter:
+    """
+    A thread-safe token bucket that caps how many requests per second get started, with bursts up to one second's
+    worth of tokens.
+    """
+
+    def __init__(self, requests_per_second):
+        """
+        Create a full bucket for the given rate.
+        :param requests_per_second: Sustained number of requests allowed per second.
+        """
+        self.rate = requests_per_second
+        self.capacity = max(1.0, requests_per_second)
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token if one is available.
+        :return: 0 when a token got taken, otherwise the number of seconds until the next one is available.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """
+        Block until a token is available, then take it.
+        :return: None
+        """
+        while wait_seconds := self.reserve():
+            time.sleep(wait_seconds)
+
+    async def acquire_async(self):
+        """
+        Wait on the event loop until a token is available, then take it.
+        :return: None
+        """
+        while wait_seconds := self.reserve():
+            await asyncio.sleep(wait_seconds)
+
+
+def run_concurrently(function, items, max_workers=DEFAULT_MAX_WORKERS, requests_per_second=None):
+    """
+    Call a function for every item on a bounded thread pool, with at most max_workers calls in flight and an optional
+    token-bucket cap on how many calls start per second. Items get consumed lazily, so generators stream through.
+    :param function: Function taking one item, typically making one Jira request.
+    :param items: Iterable of items to process.
+    :param max_workers: Maximum number of calls in flight at once.
+    :param requests_per_second: (Optional) Maximum number of calls started per second.
+    :return: Generator yielding the results in the same order as the items.
+    """
+    THROTTLE.fit_workers(max_workers)
+    rate_limiter = RateLimiter(requests_per_second) if requests_per_second else None
+
+    def call(item):
+        if rate_limiter:
+            rate_limiter.acquire()
+        return function(item)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(call, item))
+            if len(pending) >= max_workers * 2:  # keep the pool busy without queueing every item up front
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # on an error or early exit, drop the queued calls instead of sending them
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+async def run_concurrently_async(function, items, max_in_flight=DEFAULT_MAX_WORKERS, requests_per_second=None):
+    """
+    The asyncio counterpart of run_concurrently: await a coroutine function for every item as tasks on the running
+    event loop, with a semaphore keeping at most max_in_flight of them in flight and an optional token-bucket cap on
+    how many start per second. Items get pulled lazily in a worker thread, so a generator that makes blocking
+    requests of its own (such as a search scan) never stalls the loop.
+    :param function: Coroutine function taking one item, typically making one Jira request.
+    :param items: Iterable of items to process.
+    :param max_in_flight: Maximum number of calls in flight at once.
+    :param requests_per_second: (Optional) Maximum number of calls started per second.
+    :return: Async generator yielding the results in the same order as the items.
+    """
+    rate_limiter = RateLimiter(requests_per_second) if requests_per_second else None
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def call(item):
+        async with semaphore:
+            if rate_limiter:
+                await rate_limiter.acquire_async()
+            return await function(item)
+
+    items = iter(items)
+    pending = deque()
+    try:
+        while (item := await asyncio.to_thread(next, items, ITEMS_EXHAUSTED)) is not ITEMS_EXHAUSTED:
+            pending.append(asyncio.ensure_future(call(item)))
+            if len(pending) >= max_in_flight * 2:  # keep the semaphore busy without starting every item up front
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        # on an error or early exit, drop the calls still waiting or in flight
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def run_on_event_loop(function, items, max_in_flight=DEFAULT_MAX_WORKERS, requests_per_second=None):
+    """
+    Run run_concurrently_async on a private event loop in this thread, as a drop-in for run_concurrently that keeps
+    many requests in flight from one thread through ASYNC_JIRA_CLIENT instead of one worker thread per request.
+    :param function: Coroutine function taking one item, typically making one Jira request.
+    :param items: Iterable of items to process.
+    :param max_in_flight: Maximum number of calls in flight at once.
+    :param requests_per_second: (Optional) Maximum number of calls started per second.
+    :return: Generator yielding the results in the same order as the items.
+    """
+    if aiohttp is None:
+        print(ERROR_MSG_AIOHTTP_MISSING)
         sys.exit(1)
 
-    fields = response.json()
-    custom_fields = [field for field in fields if field.get(JsonFieldNames.CUSTOM)]
+    THROTTLE.fit_workers(max_in_flight)
+    ASYNC_JIRA_CLIENT.set_pool_size(max(max_in_flight, POOL_SIZE))
+    loop = asyncio.new_event_loop()
+    results = run_concurrently_async(function, items, max_in_flight, requests_per_second)
+    try:
+        while True:
+            try:
+                result = loop.run_until_complete(anext(results))
+            except StopAsyncIteration:
+                break
+            yield result
+    finally:
+        loop.run_until_complete(results.aclose())
+        loop.run_until_complete(ASYNC_JIRA_CLIENT.close())
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+
+
+def run_exchanges(exchanges, max_in_flight=DEFAULT_MAX_WORKERS, requests_per_second=None, event_loop=False):
+    """
+    Run exchanges concurrently, either on worker threads sharing JIRA_CLIENT or as coroutines on one event loop
+    sharing ASYNC_JIRA_CLIENT.
+    :param exchanges: Iterable of exchange generators, for example from query_issues_using_field_exchange.
+    :param max_in_flight: Maximum number of exchanges in flight at once.
+    :param requests_per_second: (Optional) Maximum number of exchanges started per second.
+    :param event_loop: Whether to run them on an event loop (needs aiohttp) instead of worker threads.
+    :return: Generator yielding the results in the same order as the exchanges.
+    """
+    if event_loop:
+        return run_on_event_loop(run_exchange_async, exchanges, max_in_flight, requests_per_second)
+    return run_concurrently(run_exchange, exchanges, max_in_flight, requests_per_second)
+
+
+def compact_custom_fields(fields):
+    """
+    Reduce the full '/field' response to the custom fields only, sorted by 'id', keeping just the keys the scripts
+    use so the cached form loads quickly.
+    :param fields: List of all fields (as dictionaries) from the Jira API.
+    :return: List of compact custom fields (as dictionaries), sorted by 'id'.
+    """
+    custom_fields = [
+        {
+            JsonFieldNames.ID: field[JsonFieldNames.ID],
+            JsonFieldNames.NAME: field[JsonFieldNames.NAME],
+            JsonFieldNames.CLAUSE_NAMES: field.get(JsonFieldNames.CLAUSE_NAMES, []),
+            JsonFieldNames.SCHEMA: {
+                JsonFieldNames.TYPE: field.get(JsonFieldNames.SCHEMA, {}).get(JsonFieldNames.TYPE,
+                                                                               JsonFieldNames.UNKNOWN)
+            },
+        }
+        for field in fields if field.get(JsonFieldNames.CUSTOM)
+    ]
     return sorted(custom_fields, key=lambda field: field[JsonFieldNames.ID])
 
 
-def fetch_projects():
+def compact_projects(projects):
     """
-    Fetch all projects in the Jira instance.
-    :return: List of projects with their keys and names.
+    Reduce the full '/project' response to the keys the scripts use so the cached form loads quickly.
+    :param projects: List of projects (as dictionaries) from the Jira API.
+    :return: List of compact projects (as dictionaries) with their IDs, keys and names.
+    """
+    return [
+        {
+            JsonFieldNames.ID: project.get(JsonFieldNames.ID),
+            JsonFieldNames.KEY: project[JsonFieldNames.KEY],
+            JsonFieldNames.NAME: project[JsonFieldNames.NAME],
+        }
+        for project in projects
+    ]
+
+
+def fetch_cached_metadata_exchange(metadata, endpoint, compact_function, error_message, force_refresh=False):
+    """
+    Exchange fetching instance metadata through the local on-disk cache (keyed by JIRA_BASE_URL): fresh entries get
+    used as-is, stale ones get revalidated with ETag/Last-Modified where the server supports it, and anything else
+    gets re-downloaded and stored in its compact form.
+    :param metadata: Name of the metadata in the cache, for example "fields".
+    :param endpoint: Jira REST endpoint returning the metadata.
+    :param compact_function: Function turning the response JSON into the compact form the scripts use.
+    :param error_message: Error message template (with a {status_code} placeholder) for a failed fetch.
+    :param force_refresh: When True, skip the cache and revalidation and always re-download.
+    :return: Exchange generator returning the compact metadata.
     """
-    response = requests.get(PROJECTS_ENDPOINT, headers=HEADERS)
+    cache = load_json_file(METADATA_CACHE_FILENAME, {})
+    if cache.get(JsonFieldNames.BASE_URL) != JIRA_BASE_URL:
+        cache = {JsonFieldNames.BASE_URL: JIRA_BASE_URL}
+    entry = cache.get(metadata)
+
+    headers = {}
+    if entry and not force_refresh:
+        age = time.time() - entry[JsonFieldNames.FETCHED_AT]
+        if age < METADATA_CACHE_TTL_SECONDS:
+            print(LOG_METADATA_CACHE_HIT.format(metadata=metadata, age=age))
+            return entry[JsonFieldNames.DATA]
+        if entry.get(JsonFieldNames.ETAG):
+            headers[IF_NONE_MATCH_HEADER] = entry[JsonFieldNames.ETAG]
+        if entry.get(JsonFieldNames.LAST_MODIFIED):
+            headers[IF_MODIFIED_SINCE_HEADER] = entry[JsonFieldNames.LAST_MODIFIED]
+
+    response = yield JiraRequest(HTTP_GET, endpoint, {"headers": headers})
+
+    if response.status_code == HTTPStatus.NOT_MODIFIED and entry:
+        print(LOG_METADATA_NOT_MODIFIED.format(metadata=metadata))
+        entry[JsonFieldNames.FETCHED_AT] = time.time()
+        save_json_file(METADATA_CACHE_FILENAME, cache)
+        return entry[JsonFieldNames.DATA]
 
     if response.status_code != HTTPStatus.OK:
-        print(ERROR_MSG_FETCH_PROJECTS.format(status_code=response.status_code))
+        print(error_message.format(status_code=response.status_code))
         print(ERROR_MSG_RESPONSE_TEXT.format(response_text=response.text))
         sys.exit(1)
 
-    return response.json()
+    cache[metadata] = {
+        JsonFieldNames.FETCHED_AT: time.time(),
+        JsonFieldNames.ETAG: response.headers.get(ETAG_HEADER),
+        JsonFieldNames.LAST_MODIFIED: response.headers.get(LAST_MODIFIED_HEADER),
+        JsonFieldNames.DATA: compact_function(response.json()),
+    }
+    save_json_file(METADATA_CACHE_FILENAME, cache)
+    return cache[metadata][JsonFieldNames.DATA]
 
 
-def query_issues_using_field(clause_name, field_type, project_key=None):
+def fetch_custom_fields_exchange(force_refresh=False):
     """
-    Query the number of issues using a specific custom field in a specific project (if project_key gets provided).
-    If no project_key gets provided, query usage across all projects.
+    Exchange fetching all custom fields from the Jira API, through the local metadata cache.
+    :param force_refresh: When True, bypass the cache and re-download the fields.
+    :return: Exchange generator returning the list of custom fields (as dictionaries with 'id', 'name',
+    'clauseNames' and 'schema.type'), sorted by 'id'.
+    """
+    return fetch_cached_metadata_exchange(FIELDS, CUSTOM_FIELDS_ENDPOINT, compact_custom_fields,
+                                          ERROR_MSG_FETCH_FIELDS, force_refresh)
+
+
+def fetch_custom_fields(force_refresh=False):
+    """
+    Fetch all custom fields from the Jira API, through the local metadata cache.
+    :param force_refresh: When True, bypass the cache and re-download the fields.
+    :return: List of custom fields (as dictionaries with 'id', 'name', 'clauseNames' and 'schema.type'), sorted by
+    'id'.
+    """
+    return run_exchange(fetch_custom_fields_exchange(force_refresh))
+
+
+async def fetch_custom_fields_async(force_refresh=False):
+    """
+    Fetch all custom fields from the Jira API on the event loop, through the local metadata cache.
+    :param force_refresh: When True, bypass the cache and re-download the fields.
+    :return: List of custom fields, like fetch_custom_fields.
+    """
+    return await run_exchange_async(fetch_custom_fields_exchange(force_refresh))
+
+
+def fetch_projects_exchange(force_refresh=False):
+    """
+    Exchange fetching all projects in the Jira instance, through the local metadata cache.
+    :param force_refresh: When True, bypass the cache and re-download the projects.
+    :return: Exchange generator returning the list of projects with their keys and names.
+    """
+    return fetch_cached_metadata_exchange(JsonFieldNames.PROJECTS, PROJECTS_ENDPOINT, compact_projects,
+                                          ERROR_MSG_FETCH_PROJECTS, force_refresh)
+
+
+def fetch_projects(force_refresh=False):
+    """
+    Fetch all projects in the Jira instance, through the local metadata cache.
+    :param force_refresh: When True, bypass the cache and re-download the projects.
+    :return: List of projects with their keys and names.
+    """
+    return run_exchange(fetch_projects_exchange(force_refresh))
+
+
+async def fetch_projects_async(force_refresh=False):
+    """
+    Fetch all projects in the Jira instance on the event loop, through the local metadata cache.
+    :param force_refresh: When True, bypass the cache and re-download the projects.
+    :return: List of projects, like fetch_projects.
+    """
+    return await run_exchange_async(fetch_projects_exchange(force_refresh))
+
+
+def fetch_allowed_values_exchange(issue_key, field_id):
+    """
+    Exchange fetching the allowed values of a select or multi-select custom field from an issue's edit metadata.
+    Approach is from: https://confluence.atlassian.com/jirakb/how-to-retrieve-available-options-for-a-multi-select-customfield-via-jira-rest-api-815566715.html
+    :param issue_key: The key of an issue with the field on its edit screen (for example, "SCRUM-1").
+    :param field_id: The ID of the custom field (for example, "customfield_10113").
+    :return: Exchange generator returning a dictionary mapping option values to option IDs, empty on an error.
+    """
+    endpoint = f"{ISSUE_ENDPOINT}{issue_key}?expand={EDIT_META}&{FIELDS}={field_id}"
+    response = yield JiraRequest(HTTP_GET, endpoint, {})
+
+    if response.status_code != HTTPStatus.OK:
+        print(ERROR_MSG_FETCH_OPTIONS.format(field_id=field_id, status_code=response.status_code,
+                                             response=response.text))
+        return {}
+
+    # extract allowed values from the API response
+    try:
+        allowed_values = response.json().get(EDIT_META, {}).get(FIELDS, {}).get(field_id, {}).get(ALLOWED_VALUES, [])
+        return {option[JsonFieldNames.VALUE]: option[JsonFieldNames.ID] for option in allowed_values}
+    except Exception as error:
+        print(ERROR_MSG_FETCH_OPTIONS_SHORT.format(field_id=field_id, error=str(error)))
+        return {}
+
+
+def fetch_allowed_values(issue_key, field_id):
+    """
+    Fetch the allowed values of a select or multi-select custom field from an issue's edit metadata.
+    :param issue_key: The key of an issue with the field on its edit screen (for example, "SCRUM-1").
+    :param field_id: The ID of the custom field (for example, "customfield_10113").
+    :return: A dictionary mapping option values to option IDs, empty on an error.
+    """
+    return run_exchange(fetch_allowed_values_exchange(issue_key, field_id))
+
+
+async def fetch_allowed_values_async(issue_key, field_id):
+    """
+    Fetch the allowed values of a select or multi-select custom field on the event loop, like fetch_allowed_values.
+    :param issue_key: The key of an issue with the field on its edit screen (for example, "SCRUM-1").
+    :param field_id: The ID of the custom field (for example, "customfield_10113").
+    :return: A dictionary mapping option values to option IDs, empty on an error.
+    """
+    return await run_exchange_async(fetch_allowed_values_exchange(issue_key, field_id))
+
+
+class FieldOptions:
+    """
+    The options of a select or multi-select custom field, indexed both ways for O(1) value to ID and ID to value
+    lookups. Option IDs are kept as strings, as they appear in issue JSON.
+    """
+
+    def __init__(self, options):
+        """
+        Index the options.
+        :param options: List of [option ID, option value] pairs.
+        """
+        self.ids_by_value = {value: str(option_id) for option_id, value in options}
+        self.values_by_id = {str(option_id): value for option_id, value in options}
+
+    def __bool__(self):
+        return bool(self.ids_by_value)
+
+    def __len__(self):
+        return len(self.ids_by_value)
+
+    def get_id(self, value):
+        """
+        Look up an option ID by value.
+        :param value: The option value (for example, "Value1").
+        :return: The option ID, or None if the field has no such option.
+        """
+        return self.ids_by_value.get(value)
+
+    def get_value(self, option_id):
+        """
+        Look up an option value by ID.
+        :param option_id: The option ID (as a string or an integer).
+        :return: The option value, or None if the field has no such option.
+        """
+        return self.values_by_id.get(str(option_id))
+
+
+class OptionCatalog:
+    """
+    A persistent, per Jira instance catalog of select and multi-select field options. Each field's option list (per
+    project and issue type context, when one is given) gets fetched once from the field option endpoint and kept on
+    disk for METADATA_CACHE_TTL_SECONDS, with an issue's edit metadata as the fallback where that endpoint is not
+    available (for example, without admin permissions).
+    """
+
+    def __init__(self, filename=OPTION_CATALOG_FILENAME, ttl_seconds=METADATA_CACHE_TTL_SECONDS):
+        """
+        Load the cached option lists.
+        :param filename: Path of the JSON cache file for the Jira instance.
+        :param ttl_seconds: How long a cached option list stays fresh.
+        """
+        self.filename = filename
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.cache = load_json_file(filename, {})
+        if self.cache.get(JsonFieldNames.BASE_URL) != JIRA_BASE_URL:
+            self.cache = {JsonFieldNames.BASE_URL: JIRA_BASE_URL}
+        self.field_options = {}
+
+    def get_exchange(self, field_id, issue_key=None, project_id=None, issue_type_id=None, force_refresh=False):
+        """
+        Exchange getting a field's options, from memory, the disk cache while fresh, or Jira. The lock only guards
+        the caches, never a request, so coroutines sharing an event loop don't block each other.
+        :param field_id: The ID of the custom field (for example, "customfield_10113").
+        :param issue_key: (Optional) Key of an issue with the field on its edit screen, to fall back to its edit
+            metadata when the field option endpoint fails.
+        :param project_id: (Optional) Project ID of the context to get the options of.
+        :param issue_type_id: (Optional) Issue type ID of the context to get the options of.
+        :param force_refresh: When True, bypass the caches and re-download the options.
+        :return: Exchange generator returning FieldOptions, empty if the options could not be fetched.
+        """
+        context_key = "|".join([field_id, project_id or "", issue_type_id or ""])
+        with self.lock:
+            if not force_refresh and context_key in self.field_options:
+                return self.field_options[context_key]
+
+            entry = self.cache.get(context_key)
+            if entry and not force_refresh and time.time() - entry[JsonFieldNames.FETCHED_AT] < self.ttl_seconds:
+                self.field_options[context_key] = FieldOptions(entry[JsonFieldNames.DATA])
+                return self.field_options[context_key]
+
+        options = yield from fetch_field_options_exchange(field_id, project_id, issue_type_id)
+        if options is None and issue_key:
+            print(LOG_OPTIONS_FALLBACK.format(field_id=field_id, issue_key=issue_key))
+            allowed_values = yield from fetch_allowed_values_exchange(issue_key, field_id)
+            options = [[option_id, value] for value, option_id in allowed_values.items()]
+        if not options:
+            # keep failures out of the caches, so a later call (for example, with an issue key) can still succeed
+            return FieldOptions([])
+
+        with self.lock:
+            self.cache[context_key] = {JsonFieldNames.FETCHED_AT: time.time(), JsonFieldNames.DATA: options}
+            save_json_file(self.filename, self.cache)
+            self.field_options[context_key] = FieldOptions(options)
+            return self.field_options[context_key]
+
+    def get(self, field_id, issue_key=None, project_id=None, issue_type_id=None, force_refresh=False):
+        """
+        Get a field's options, from memory, the disk cache while fresh, or Jira through JIRA_CLIENT.
+        :param field_id: The ID of the custom field (for example, "customfield_10113").
+        :param issue_key: (Optional) Key of an issue to fall back to its edit metadata, see get_exchange.
+        :param project_id: (Optional) Project ID of the context to get the options of.
+        :param issue_type_id: (Optional) Issue type ID of the context to get the options of.
+        :param force_refresh: When True, bypass the caches and re-download the options.
+        :return: FieldOptions, empty if the options could not be fetched.
+        """
+        return run_exchange(self.get_exchange(field_id, issue_key, project_id, issue_type_id, force_refresh))
+
+    async def get_async(self, field_id, issue_key=None, project_id=None, issue_type_id=None, force_refresh=False):
+        """
+        Get a field's options on the event loop through ASYNC_JIRA_CLIENT, like get.
+        :param field_id: The ID of the custom field (for example, "customfield_10113").
+        :param issue_key: (Optional) Key of an issue to fall back to its edit metadata, see get_exchange.
+        :param project_id: (Optional) Project ID of the context to get the options of.
+        :param issue_type_id: (Optional) Issue type ID of the context to get the options of.
+        :param force_refresh: When True, bypass the caches and re-download the options.
+        :return: FieldOptions, empty if the options could not be fetched.
+        """
+        return await run_exchange_async(self.get_exchange(field_id, issue_key, project_id, issue_type_id,
+                                                          force_refresh))
+
+
+OPTION_CATALOG = OptionCatalog()
+
+
+def fetch_field_options_exchange(field_id, project_id=None, issue_type_id=None):
+    """
+    Exchange fetching every option of a custom field from the paged field option endpoint.
+    :param field_id: The ID of the custom field (for example, "customfield_10113").
+    :param project_id: (Optional) Project ID to restrict the options to that context.
+    :param issue_type_id: (Optional) Issue type ID to restrict the options to that context.
+    :return: Exchange generator returning a list of [option ID, option value] pairs, or None if the endpoint failed.
+    """
+    endpoint = CUSTOM_FIELD_OPTIONS_ENDPOINT.format(field_number=field_id.removeprefix(CUSTOM_FIELD_PREFIX))
+    params = {START_AT: START_AT_VALUE, MAX_RESULTS: OPTION_PAGE_SIZE}
+    if project_id:
+        params[PROJECT_IDS] = project_id
+    if issue_type_id:
+        params[ISSUE_TYPE_IDS] = issue_type_id
+
+    options = []
+    while True:
+        response = yield JiraRequest(HTTP_GET, endpoint, {"params": dict(params)})
+        if response.status_code != HTTPStatus.OK:
+            return None
+        page = response.json()
+        values = page.get(JsonFieldNames.VALUES, [])
+        options.extend([str(option[JsonFieldNames.ID]), option[JsonFieldNames.VALUE]] for option in values)
+        if page.get(IS_LAST, True) or not values:
+            return options
+        params[START_AT] += len(values)
+
+
+def fetch_field_options(field_id, project_id=None, issue_type_id=None):
+    """
+    Fetch every option of a custom field from the paged field option endpoint.
+    :param field_id: The ID of the custom field (for example, "customfield_10113").
+    :param project_id: (Optional) Project ID to restrict the options to that context.
+    :param issue_type_id: (Optional) Issue type ID to restrict the options to that context.
+    :return: List of [option ID, option value] pairs, or None if the endpoint failed.
+    """
+    return run_exchange(fetch_field_options_exchange(field_id, project_id, issue_type_id))
+
+
+async def fetch_field_options_async(field_id, project_id=None, issue_type_id=None):
+    """
+    Fetch every option of a custom field on the event loop, like fetch_field_options.
+    :param field_id: The ID of the custom field (for example, "customfield_10113").
+    :param project_id: (Optional) Project ID to restrict the options to that context.
+    :param issue_type_id: (Optional) Issue type ID to restrict the options to that context.
+    :return: List of [option ID, option value] pairs, or None if the endpoint failed.
+    """
+    return await run_exchange_async(fetch_field_options_exchange(field_id, project_id, issue_type_id))
+
+
+def query_issues_using_field_exchange(clause_name, field_type, project_key=None):
+    """
+    Exchange querying the number of issues using a specific custom field in a specific project (if project_key gets
+    provided). If no project_key gets provided, query usage across all projects.
     :param clause_name: The JQL-friendly `cf[...]` clause name of the custom field.
     :param field_type: Schema type of the custom field to determine the JQL condition.
     :param project_key: (Optional) The project key to scope the query.
-    :return: Number of issues using the field.
+    :return: Exchange generator returning the number of issues using the field.
     """
     # determine the project-specific or global JQL condition
     project_condition = PROJECT_CONDITION_TEMPLATE.format(project_key=project_key) if project_key else ""
 
-    # formulate JQL based on field type
+    # formulate JQL based on field type, or on the condition already learned for an 'any' type field
+    cached_condition = JQL_STRATEGY_CACHE.get(clause_name, field_type) if field_type == JsonFieldNames.ANY else None
     if clause_name == DEVELOPMENT_FIELD:
         jql_condition = f"{project_condition}{clause_name}{COMMITS_FIELD}.all {IS_NOT_EMPTY_CLAUSE}"
+    elif cached_condition:
+        jql_condition = f"{project_condition}{clause_name} {cached_condition}"
     elif field_type in [JsonFieldNames.NUMBER]:
         jql_condition = f"{project_condition}{clause_name} {GREATER_THAN_ZERO_CLAUSE}"
     elif field_type in SUPPORTED_FIELD_TYPES:
@@ -136,13 +1162,29 @@ def query_issues_using_field(clause_name, field_type, project_key=None):
 
     # query issues
     payload = {JsonFieldNames.JQL: jql_condition, START_AT: 0, MAX_RESULTS: 0, FIELDS: []}
-    response = requests.post(SEARCH_ENDPOINT, headers=HEADERS, json=payload)
+    response = yield JiraRequest(HTTP_POST, SEARCH_ENDPOINT, {"json": payload})
+    condition = cached_condition or IS_NOT_EMPTY_CLAUSE
+
+    if response.status_code == HTTPStatus.BAD_REQUEST and cached_condition:
+        print(LOG_JQL_STRATEGY_INVALIDATED.format(condition=cached_condition, clause_name=clause_name))
+        JQL_STRATEGY_CACHE.forget(clause_name)
+        return (yield from query_issues_using_field_exchange(clause_name, field_type, project_key))
 
     if response.status_code == HTTPStatus.BAD_REQUEST and field_type == JsonFieldNames.ANY:
         print(WARNING_BAD_REQUEST)
         jql_condition = f"{project_condition}{clause_name} {GREATER_THAN_ZERO_CLAUSE}"
         payload[JsonFieldNames.JQL] = jql_condition
-        response = requests.post(SEARCH_ENDPOINT, headers=HEADERS, json=payload)
+        response = yield JiraRequest(HTTP_POST, SEARCH_ENDPOINT, {"json": payload})
+        condition = GREATER_THAN_ZERO_CLAUSE
+
+    if (response.status_code == HTTPStatus.OK and field_type == JsonFieldNames.ANY
+            and clause_name != DEVELOPMENT_FIELD):
+        JQL_STRATEGY_CACHE.record(clause_name, field_type, condition)
+
+    # a throttled or unavailable Jira would otherwise show up as a silent 0 in the report
+    if response.status_code in RETRY_STATUS_CODES:
+        print(ERROR_MSG_RETRIES_EXHAUSTED.format(status_code=response.status_code, retries=JIRA_CLIENT.max_retries))
+        sys.exit(1)
 
     if response.status_code != HTTPStatus.OK:
         project_info = f"{PROJECT} {project_key}" if project_key else ALL_PROJECTS
@@ -153,3 +1195,454 @@ def query_issues_using_field(clause_name, field_type, project_key=None):
 
     # return the total count of issues
     return response.json().get(JsonFieldNames.TOTAL, 0)
+
+
+def query_issues_using_field(clause_name, field_type, project_key=None):
+    """
+    Query the number of issues using a specific custom field in a specific project (if project_key gets provided).
+    If no project_key gets provided, query usage across all projects.
+    :param clause_name: The JQL-friendly `cf[...]` clause name of the custom field.
+    :param field_type: Schema type of the custom field to determine the JQL condition.
+    :param project_key: (Optional) The project key to scope the query.
+    :return: Number of issues using the field.
+    """
+    return run_exchange(query_issues_using_field_exchange(clause_name, field_type, project_key))
+
+
+async def query_issues_using_field_async(clause_name, field_type, project_key=None):
+    """
+    Query the number of issues using a specific custom field on the event loop, like query_issues_using_field.
+    :param clause_name: The JQL-friendly `cf[...]` clause name of the custom field.
+    :param field_type: Schema type of the custom field to determine the JQL condition.
+    :param project_key: (Optional) The project key to scope the query.
+    :return: Number of issues using the field.
+    """
+    return await run_exchange_async(query_issues_using_field_exchange(clause_name, field_type, project_key))
+
+
+def probe_jql_strategies(custom_fields, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Learn the working JQL condition up front for every 'any' type custom field that has none cached yet, so later
+    per-project count queries go straight to it. Concurrent count queries need this: they only learn a field's
+    condition once its first query comes back, so every query in flight before then repeats the failing one.
+    :param custom_fields: List of custom fields (as dictionaries) from fetch_custom_fields.
+    :param max_workers: Maximum number of probe queries in flight at once.
+    :return: None
+    """
+    unprobed_fields = []
+    for field in custom_fields:
+        clause_name = field[JsonFieldNames.CLAUSE_NAMES][0]
+        schema_type = field.get(JsonFieldNames.SCHEMA, {}).get(JsonFieldNames.TYPE, JsonFieldNames.UNKNOWN)
+        if (schema_type == JsonFieldNames.ANY and clause_name != DEVELOPMENT_FIELD
+                and not JQL_STRATEGY_CACHE.get(clause_name, schema_type)):
+            unprobed_fields.append((clause_name, schema_type))
+
+    if not unprobed_fields:
+        return
+    print(LOG_PROBE_JQL_STRATEGIES.format(count=len(unprobed_fields)))
+    for _ in run_concurrently(lambda field: query_issues_using_field(*field), unprobed_fields, max_workers):
+        pass
+
+
+def is_field_populated(field_value, field_type, clause_name):
+    """
+    Decide locally whether a raw field value from a search response counts as "using" the field, applying the same
+    rules as the JQL conditions built by query_issues_using_field.
+    :param field_value: The raw value of the custom field in the issue's 'fields' JSON.
+    :param field_type: Schema type of the custom field.
+    :param clause_name: The JQL-friendly `cf[...]` clause name of the custom field.
+    :return: True if the value matches the field type's JQL condition, otherwise False.
+    """
+    if field_value is None:
+        return False
+
+    # the Development summary gets returned on every issue, matching `[commits].all IS NOT EMPTY`
+    if clause_name == DEVELOPMENT_FIELD:
+        return True
+
+    is_number = isinstance(field_value, (int, float)) and not isinstance(field_value, bool)
+    if field_type == JsonFieldNames.NUMBER:
+        return is_number and field_value > 0
+    if field_type == JsonFieldNames.ANY and is_number:
+        return field_value > 0  # same as the '> 0' retry for 'any' fields
+    if field_type in SUPPORTED_FIELD_TYPES:
+        return field_value not in ("", [], {})
+
+    return False
+
+
+def count_issues_exchange(jql=""):
+    """
+    Exchange counting the issues matching the JQL without fetching any of them.
+    :param jql: (Optional) JQL to restrict the count, all issues by default.
+    :return: Exchange generator returning the number of matching issues.
+    """
+    payload = {JsonFieldNames.JQL: jql, START_AT: START_AT_VALUE, MAX_RESULTS: 0, FIELDS: []}
+    response = yield JiraRequest(HTTP_POST, SEARCH_ENDPOINT, {"json": payload})
+
+    if response.status_code != HTTPStatus.OK:
+        print(ERROR_MSG_QUERY_ISSUES.format(clause_name=jql or ALL_PROJECTS, project_info=ALL_PROJECTS,
+                                            status_code=response.status_code))
+        print(ERROR_MSG_RESPONSE_TEXT.format(response_text=response.text))
+        sys.exit(1)
+
+    return response.json().get(JsonFieldNames.TOTAL, 0)
+
+
+def count_issues(jql=""):
+    """
+    Count the issues matching the JQL without fetching any of them.
+    :param jql: (Optional) JQL to restrict the count, all issues by default.
+    :return: Number of matching issues.
+    """
+    return run_exchange(count_issues_exchange(jql))
+
+
+async def count_issues_async(jql=""):
+    """
+    Count the issues matching the JQL on the event loop, like count_issues.
+    :param jql: (Optional) JQL to restrict the count, all issues by default.
+    :return: Number of matching issues.
+    """
+    return await run_exchange_async(count_issues_exchange(jql))
+
+
+class JsonStreamReader:
+    """
+    A reader of JSON values one at a time from a stream of text chunks, using json.JSONDecoder.raw_decode on a buffer
+    that only holds the text not parsed yet, so a large document never has to be in memory (or parsed) as a whole.
+    """
+
+    def __init__(self, chunks):
+        """
+        :param chunks: Iterable of text chunks of the JSON document.
+        """
+        self.chunks = iter(chunks)
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.exhausted = False
+
+    def read_more(self):
+        """
+        Append the next chunk to the buffer, dropping the text parsed already.
+        :return: False once the stream has ended.
+        """
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.exhausted = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        """
+        Skip whitespace and look at the next character without consuming it.
+        :return: The next character, or an empty string at the end of the stream.
+        """
+        while True:
+            self.position = JSON_WHITESPACE_PATTERN.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more():
+                return ""
+
+    def skip(self, character):
+        """
+        Consume the next character if it is the given one.
+        :param character: The structural character (for example, ",").
+        :return: True if it got consumed.
+        """
+        if self.peek() != character:
+            return False
+        self.position += 1
+        return True
+
+    def expect(self, character):
+        """
+        Consume the next character, which has to be the given one.
+        :param character: The structural character (for example, "{").
+        :return: None
+        """
+        if not self.skip(character):
+            raise json.JSONDecodeError(ERROR_MSG_EXPECTED_JSON.format(expected=character, position=self.position,
+                                                                      found=self.peek()), self.buffer, self.position)
+
+    def decode(self):
+        """
+        Decode the next complete JSON value, reading more chunks while it is cut off.
+        :return: The decoded value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # a number that ends with the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.exhausted:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.exhausted:
+                    raise
+            self.read_more()
+
+
+def project_issue(issue, field_ids):
+    """
+    Strip an issue from a search response down to its ID, key, and the requested fields.
+    :param issue: Issue dictionary from the search response.
+    :param field_ids: List of the requested field IDs.
+    :return: The projected issue dictionary.
+    """
+    fields = issue.get(FIELDS) or {}
+    return {
+        str(JsonFieldNames.ID): issue.get(JsonFieldNames.ID),
+        str(JsonFieldNames.KEY): issue.get(JsonFieldNames.KEY),
+        FIELDS: {field_id: fields[field_id] for field_id in field_ids if field_id in fields},
+    }
+
+
+def stream_search_issues(response, field_ids, page):
+    """
+    Parse a streamed search response incrementally, yielding its issues one at a time (projected to the requested
+    fields) as they arrive instead of loading the whole page into memory first. The response's other top-level
+    values (such as 'total' and 'maxResults') go into the page dictionary as they get parsed.
+    :param response: The requests.Response of the search, requested with stream=True.
+    :param field_ids: List of the requested field IDs.
+    :param page: Dictionary collecting the top-level values other than the issues, updated in place.
+    :return: Generator yielding the projected issues.
+    """
+    parse_seconds = 0.0
+    try:
+        response.encoding = response.encoding or STREAM_ENCODING
+        reader = JsonStreamReader(response.iter_content(STREAM_CHUNK_SIZE, decode_unicode=True))
+        reader.expect("{")
+        while not reader.skip("}"):
+            key = reader.decode()
+            reader.expect(":")
+            if key != JsonFieldNames.ISSUES:
+                page[key] = reader.decode()
+            else:
+                reader.expect("[")
+                while not reader.skip("]"):
+                    # the decode time includes waiting for the network while an issue is cut off
+                    start_time = time.perf_counter()
+                    issue = project_issue(reader.decode(), field_ids)
+                    parse_seconds += time.perf_counter() - start_time
+                    yield issue
+                    reader.skip(",")
+            reader.skip(",")
+    finally:
+        METRICS.add_phase_time(PHASE_PARSE, parse_seconds)
+        METRICS.record_response_size(response.request.method, response.request.url, get_response_size(response))
+        response.close()
+
+
+def search_keyset_page_exchange(field_ids, jql, page_size, after_id, streaming=STREAM_SEARCH_RESPONSES,
+                                validate_query=None):
+    """
+    Exchange requesting one page of a keyset paginated search ('id > last seen id ORDER BY id'), exiting on an error.
+    :param field_ids: List of field IDs (for example, "customfield_10000") to include for each issue.
+    :param jql: JQL to restrict the search, or an empty string for all issues; must not contain an ORDER BY clause.
+    :param page_size: Number of issues to request; the server may cap it lower.
+    :param after_id: Only return issues with a higher ID.
+    :param streaming: Whether to parse the response incrementally with stream_search_issues, rather than whole; only
+        JIRA_CLIENT can stream.
+    :param validate_query: (Optional) How strictly Jira validates the JQL, for example VALIDATE_QUERY_WARN; Jira's
+        default (strict) when None.
+    :return: Exchange generator returning a tuple of an iterable of the issues and the dictionary of the response's
+        other top-level values (only complete once the issues have been consumed when streaming).
+    """
+    keyset_condition = KEYSET_CONDITION_TEMPLATE.format(after_id=after_id)
+    keyset_jql = f"({jql}) AND {keyset_condition}" if jql else keyset_condition
+    payload = {JsonFieldNames.JQL: f"{keyset_jql} {ORDER_BY_ID}", START_AT: START_AT_VALUE,
+               MAX_RESULTS: page_size, FIELDS: field_ids}
+    if validate_query:
+        payload[VALIDATE_QUERY] = validate_query
+    response = yield JiraRequest(HTTP_POST, SEARCH_ENDPOINT, {"json": payload, "stream": streaming})
+
+    if response.status_code != HTTPStatus.OK:
+        print(ERROR_MSG_QUERY_ISSUES.format(clause_name=FIELDS, project_info=ALL_PROJECTS,
+                                            status_code=response.status_code))
+        print(ERROR_MSG_RESPONSE_TEXT.format(response_text=response.text))
+        sys.exit(1)  # a partial scan would under-count every field
+
+    if streaming:
+        page = {}
+        return stream_search_issues(response, field_ids, page), page
+    with METRICS.phase(PHASE_PARSE):
+        page = response.json()
+    return page.pop(JsonFieldNames.ISSUES, []), page
+
+
+def search_keyset_page(field_ids, jql, page_size, after_id, streaming=STREAM_SEARCH_RESPONSES, validate_query=None):
+    """
+    Request one page of a keyset paginated search ('id > last seen id ORDER BY id'), exiting on an error.
+    :param field_ids: List of field IDs (for example, "customfield_10000") to include for each issue.
+    :param jql: JQL to restrict the search, or an empty string for all issues; must not contain an ORDER BY clause.
+    :param page_size: Number of issues to request; the server may cap it lower.
+    :param after_id: Only return issues with a higher ID.
+    :param streaming: Whether to parse the response incrementally with stream_search_issues, rather than whole.
+    :param validate_query: (Optional) How strictly Jira validates the JQL, for example VALIDATE_QUERY_WARN.
+    :return: Tuple of an iterable of the issues and the dictionary of the response's other top-level values (only
+        complete once the issues have been consumed when streaming).
+    """
+    return run_exchange(search_keyset_page_exchange(field_ids, jql, page_size, after_id, streaming, validate_query))
+
+
+async def search_keyset_page_async(field_ids, jql, page_size, after_id):
+    """
+    Request one page of a keyset paginated search on the event loop, parsing the page once it has been read whole.
+    :param field_ids: List of field IDs (for example, "customfield_10000") to include for each issue.
+    :param jql: JQL to restrict the search, or an empty string for all issues; must not contain an ORDER BY clause.
+    :param page_size: Number of issues to request; the server may cap it lower.
+    :param after_id: Only return issues with a higher ID.
+    :return: Tuple of the list of the issues and the dictionary of the response's other top-level values.
+    """
+    return await run_exchange_async(search_keyset_page_exchange(field_ids, jql, page_size, after_id, False))
+
+
+def scan_issue_pages(field_ids, jql="", page_size=SCAN_PAGE_SIZE, after_id=0, streaming=STREAM_SEARCH_RESPONSES):
+    """
+    Page through every issue matching the JQL once with keyset pagination ('id > last seen id ORDER BY id'), so each
+    page costs the same regardless of depth and issues changed mid-scan never get skipped or repeated.
+    :param field_ids: List of field IDs (for example, "customfield_10000") to include for each issue.
+    :param jql: (Optional) JQL to restrict the scan, all issues by default; must not contain an ORDER BY clause.
+    :param page_size: Number of issues to request per page; the server may cap it lower.
+    :param after_id: (Optional) Only return issues with a higher ID, for example to resume an earlier scan.
+    :param streaming: Whether to parse each page incrementally, keeping only the requested fields of its issues.
+    :return: Generator yielding the pages (as lists of issue dictionaries) one at a time.
+    """
+    scanned_count = 0
+    while True:
+        issues, page = search_keyset_page(field_ids, jql, page_size, after_id, streaming)
+        issues = list(issues)
+        if not issues:
+            break
+
+        scanned_count += len(issues)
+        print(LOG_SCAN_PROGRESS.format(count=scanned_count,
+                                       remaining=page.get(JsonFieldNames.TOTAL, len(issues)) - len(issues)))
+        yield issues
+
+        # a page shorter than the server's (possibly capped) maxResults is the last one
+        if len(issues) < page.get(MAX_RESULTS, page_size):
+            break
+        after_id = int(issues[-1][JsonFieldNames.ID])
+
+
+async def scan_issue_pages_async(field_ids, jql="", page_size=SCAN_PAGE_SIZE, after_id=0):
+    """
+    Page through every issue matching the JQL once on the event loop, like scan_issue_pages.
+    :param field_ids: List of field IDs (for example, "customfield_10000") to include for each issue.
+    :param jql: (Optional) JQL to restrict the scan, all issues by default; must not contain an ORDER BY clause.
+    :param page_size: Number of issues to request per page; the server may cap it lower.
+    :param after_id: (Optional) Only return issues with a higher ID, for example to resume an earlier scan.
+    :return: Async generator yielding the pages (as lists of issue dictionaries) one at a time.
+    """
+    scanned_count = 0
+    while True:
+        issues, page = await search_keyset_page_async(field_ids, jql, page_size, after_id)
+        if not issues:
+            break
+
+        scanned_count += len(issues)
+        print(LOG_SCAN_PROGRESS.format(count=scanned_count,
+                                       remaining=page.get(JsonFieldNames.TOTAL, len(issues)) - len(issues)))
+        yield issues
+
+        # a page shorter than the server's (possibly capped) maxResults is the last one
+        if len(issues) < page.get(MAX_RESULTS, page_size):
+            break
+        after_id = int(issues[-1][JsonFieldNames.ID])
+
+
+def scan_issues(field_ids, jql="", page_size=SCAN_PAGE_SIZE, streaming=STREAM_SEARCH_RESPONSES, validate_query=None):
+    """
+    Page through every issue matching the JQL once, requesting only the given field columns. When streaming, each
+    issue gets passed on as soon as it has been parsed from the response, so neither memory nor the time to the first
+    issue grows with the page size.
+    :param field_ids: List of field IDs (for example, "customfield_10000") to include for each issue.
+    :param jql: (Optional) JQL to restrict the scan, all issues by default; must not contain an ORDER BY clause.
+    :param page_size: Number of issues to request per page; the server may cap it lower.
+    :param streaming: Whether to parse each page incrementally, keeping only the requested fields of its issues.
+    :param validate_query: (Optional) How strictly Jira validates the JQL, for example VALIDATE_QUERY_WARN to skip
+        issue keys that no longer exist instead of failing the scan.
+    :return: Generator yielding the issues (as dictionaries) one at a time.
+    """
+    after_id = 0
+    scanned_count = 0
+    while True:
+        issues, page = search_keyset_page(field_ids, jql, page_size, after_id, streaming, validate_query)
+        page_count = 0
+        for issue in issues:
+            page_count += 1
+            after_id = int(issue[JsonFieldNames.ID])
+            yield issue
+        if not page_count:
+            break
+
+        scanned_count += page_count
+        print(LOG_SCAN_PROGRESS.format(count=scanned_count,
+                                       remaining=page.get(JsonFieldNames.TOTAL, page_count) - page_count))
+
+        # a page shorter than the server's (possibly capped) maxResults is the last one
+        if page_count < page.get(MAX_RESULTS, page_size):
+            break
+
+
+def get_scannable_fields(custom_fields):
+    """
+    Collect the (field ID, schema type, clause name) triples a scan needs to evaluate each custom field, skipping
+    the unsupported schema types the same way query_issues_using_field does.
+    :param custom_fields: List of custom fields (as dictionaries) from fetch_custom_fields.
+    :return: List of (field ID, schema type, clause name) tuples.
+    """
+    field_specs = []
+    for field in custom_fields:
+        schema_type = field.get(JsonFieldNames.SCHEMA, {}).get(JsonFieldNames.TYPE, JsonFieldNames.UNKNOWN)
+        if schema_type not in SUPPORTED_FIELD_TYPES:
+            print(ERROR_MSG_UNSUPPORTED_FIELD_TYPE.format(field_type=schema_type))
+            continue
+        field_specs.append((field[JsonFieldNames.ID], schema_type, field[JsonFieldNames.CLAUSE_NAMES][0]))
+    return field_specs
+
+
+def scan_field_usage(custom_fields):
+    """
+    Count the issues using each custom field from a single paged scan over all issues, instead of running one
+    query_issues_using_field count query per field.
+    :param custom_fields: List of custom fields (as dictionaries) from fetch_custom_fields.
+    :return: Dictionary mapping each custom field ID to the number of issues using it.
+    """
+    usage = {field[JsonFieldNames.ID]: 0 for field in custom_fields}
+    field_specs = get_scannable_fields(custom_fields)
+
+    for issue in scan_issues([field_id for field_id, _, _ in field_specs]):
+        issue_fields = issue.get(FIELDS, {})
+        for field_id, schema_type, clause_name in field_specs:
+            if is_field_populated(issue_fields.get(field_id), schema_type, clause_name):
+                usage[field_id] += 1
+
+    return usage
+
+
+def scan_field_usage_by_project(custom_fields):
+    """
+    Build the full custom field x project usage matrix from a single paged scan over all issues, instead of running
+    one query_issues_using_field count query per (field, project) pair.
+    :param custom_fields: List of custom fields (as dictionaries) from fetch_custom_fields.
+    :return: Dictionary mapping each custom field ID to a Counter of issues using it per project key.
+    """
+    usage = {field[JsonFieldNames.ID]: Counter() for field in custom_fields}
+    field_specs = get_scannable_fields(custom_fields)
+
+    for issue in scan_issues([PROJECT] + [field_id for field_id, _, _ in field_specs]):
+        issue_fields = issue.get(FIELDS, {})
+        project_key = issue_fields.get(PROJECT, {}).get(JsonFieldNames.KEY)
+        for field_id, schema_type, clause_name in field_specs:
+            if is_field_populated(issue_fields.get(field_id), schema_type, clause_name):
+                usage[field_id][project_key] += 1
+
+    return usage
@@ -0,0 +1,228 @@
+import csv
+import json
+import os
+import sqlite3
+import sys
+from abc import ABC, abstractmethod
+from utils.jira_utils import FILE_WRITE_MODE
+from utils.run_metrics import METRICS, PHASE_WRITE
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # only the Parquet sink needs pyarrow; the other formats run on the standard library alone
+    pyarrow = None
+
+# key global variables
+REPORT_FORMAT_CSV = "csv"
+REPORT_FORMAT_JSONL = "jsonl"
+REPORT_FORMAT_PARQUET = "parquet"
+REPORT_FORMAT_SQLITE = "sqlite"
+REPORT_FORMATS = [REPORT_FORMAT_CSV, REPORT_FORMAT_JSONL, REPORT_FORMAT_PARQUET, REPORT_FORMAT_SQLITE]
+REPORT_BATCH_SIZE = int(os.getenv("JIRA_REPORT_BATCH_SIZE", "1000"))  # rows held in memory between flushes
+
+# additional global variables
+SQLITE_TABLE_NAME = "report"
+TEXT_ENCODING = "utf-8"
+
+# console error messages
+ERROR_MSG_PYARROW_MISSING = "Error: Writing Parquet reports requires pyarrow; install it with 'pip install pyarrow'."
+
+
+class ReportSink(ABC):
+    """
+    A report file that takes rows as soon as they get produced and writes them in batches, so a report never has to
+    be built in memory before its first byte reaches the disk. The rows go to a temporary file next to the report,
+    which replaces the report only once the run completes, so a failed or interrupted run leaves the previous report
+    as it was. Subclasses write one batch in their format; open them with open_report_sink, as a context manager.
+    """
+    extension = None
+
+    def __init__(self, filename, header, batch_size=REPORT_BATCH_SIZE):
+        """
+        :param filename: Path of the report file, replaced when the sink closes without an error.
+        :param header: List of the column names.
+        :param batch_size: Number of rows to collect before writing them in one batch.
+        """
+        self.filename = filename
+        self.temporary_filename = f"{filename}.{os.getpid()}.tmp"
+        self.header = header
+        self.batch_size = max(1, batch_size)
+        self.rows = []
+        self.row_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def add(self, row):
+        """
+        Queue a row, writing the batch once it is full.
+        :param row: List of the column values, in header order.
+        :return: None
+        """
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the queued rows in one batch.
+        :return: None
+        """
+        if not self.rows:
+            return
+        with METRICS.phase(PHASE_WRITE):
+            self.write_batch(self.rows)
+        self.row_count += len(self.rows)
+        self.rows = []
+
+    @abstractmethod
+    def write_batch(self, rows):
+        """
+        Write a batch of rows to the report file.
+        :param rows: List of rows, each a list of the column values in header order.
+        :return: None
+        """
+
+    @abstractmethod
+    def close_file(self):
+        """
+        Close the temporary file as it is, without writing the queued rows.
+        :return: None
+        """
+
+    def close(self):
+        """
+        Write any queued rows, close the temporary file and move it over the report.
+        :return: None
+        """
+        self.flush()
+        self.close_file()
+        os.replace(self.temporary_filename, self.filename)
+
+    def discard(self):
+        """
+        Close and delete the temporary file after a failed run, keeping the previous report.
+        :return: None
+        """
+        self.close_file()
+        if os.path.exists(self.temporary_filename):
+            os.remove(self.temporary_filename)
+
+
+class CsvReportSink(ReportSink):
+    """
+    Writes the report as a CSV file with a header row.
+    """
+    extension = REPORT_FORMAT_CSV
+
+    def __init__(self, filename, header, batch_size=REPORT_BATCH_SIZE):
+        super().__init__(filename, header, batch_size)
+        self.report_file = open(self.temporary_filename, FILE_WRITE_MODE, newline="", encoding=TEXT_ENCODING)
+        self.csv_writer = csv.writer(self.report_file)
+        self.csv_writer.writerow(header)
+
+    def write_batch(self, rows):
+        self.csv_writer.writerows(rows)
+
+    def close_file(self):
+        self.report_file.close()
+
+
+class JsonLinesReportSink(ReportSink):
+    """
+    Writes the report as JSON lines, one object keyed by the header per row.
+    """
+    extension = REPORT_FORMAT_JSONL
+
+    def __init__(self, filename, header, batch_size=REPORT_BATCH_SIZE):
+        super().__init__(filename, header, batch_size)
+        self.report_file = open(self.temporary_filename, FILE_WRITE_MODE, encoding=TEXT_ENCODING)
+
+    def write_batch(self, rows):
+        self.report_file.write("".join(json.dumps(dict(zip(self.header, row))) + "\n" for row in rows))
+
+    def close_file(self):
+        self.report_file.close()
+
+
+class ParquetReportSink(ReportSink):
+    """
+    Writes the report as a columnar Parquet file, one row group per batch, with the column types taken from the
+    first batch.
+    """
+    extension = REPORT_FORMAT_PARQUET
+
+    def __init__(self, filename, header, batch_size=REPORT_BATCH_SIZE):
+        if pyarrow is None:
+            print(ERROR_MSG_PYARROW_MISSING)
+            sys.exit(1)
+        super().__init__(filename, header, batch_size)
+        self.parquet_writer = None
+
+    def write_batch(self, rows):
+        columns = [list(column) for column in zip(*rows)]
+        if self.parquet_writer is None:
+            table = pyarrow.Table.from_arrays(columns, names=self.header)
+            self.parquet_writer = pyarrow.parquet.ParquetWriter(self.temporary_filename, table.schema)
+        else:
+            table = pyarrow.Table.from_arrays(columns, schema=self.parquet_writer.schema)
+        self.parquet_writer.write_table(table)
+
+    def close(self):
+        self.flush()
+        if self.parquet_writer is None:
+            # no rows came, so there is no first batch to take the column types from
+            self.parquet_writer = pyarrow.parquet.ParquetWriter(
+                self.temporary_filename, pyarrow.schema([(column, pyarrow.string()) for column in self.header]))
+        super().close()
+
+    def close_file(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+
+
+class SqliteReportSink(ReportSink):
+    """
+    Writes the report to a SQLite database, as the table 'report' with a column per header, committing each batch.
+    """
+    extension = REPORT_FORMAT_SQLITE
+
+    def __init__(self, filename, header, batch_size=REPORT_BATCH_SIZE):
+        super().__init__(filename, header, batch_size)
+        self.connection = sqlite3.connect(self.temporary_filename)
+        columns = ", ".join(f'"{column}"' for column in header)
+        self.connection.execute(f"DROP TABLE IF EXISTS {SQLITE_TABLE_NAME}")
+        self.connection.execute(f"CREATE TABLE {SQLITE_TABLE_NAME} ({columns})")
+        self.insert_statement = f"INSERT INTO {SQLITE_TABLE_NAME} VALUES ({', '.join('?' * len(header))})"
+
+    def write_batch(self, rows):
+        with self.connection:
+            self.connection.executemany(self.insert_statement, rows)
+
+    def close_file(self):
+        self.connection.close()
+
+
+# the sink class for each of REPORT_FORMATS
+REPORT_SINKS = {sink.extension: sink for sink in [CsvReportSink, JsonLinesReportSink, ParquetReportSink,
+                                                  SqliteReportSink]}
+
+
+def open_report_sink(filename_stem, header, report_format=REPORT_FORMAT_CSV, batch_size=REPORT_BATCH_SIZE):
+    """
+    Open a report file in a format, named after the format.
+    :param filename_stem: File name without the extension (for example, "1_custom_field_usage_report").
+    :param header: List of the column names.
+    :param report_format: One of REPORT_FORMATS.
+    :param batch_size: (Optional) Number of rows to collect before writing them in one batch.
+    :return: The ReportSink, to use as a context manager.
+    """
+    sink_class = REPORT_SINKS[report_format]
+    return sink_class(f"{filename_stem}.{sink_class.extension}", header, batch_size)
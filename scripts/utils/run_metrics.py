@@ -0,0 +1,491 @@
+import atexit
+import bisect
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# key global variables
+METRICS_DIRECTORY = os.getenv("JIRA_METRICS_DIR", ".jira_metrics")  # an empty value turns the reports off
+PROFILE_ENABLED = os.getenv("JIRA_PROFILE", "0") != "0"
+RUN_NAME = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+LATENCY_BUCKETS_SECONDS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+SIZE_BUCKETS_BYTES = [1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024, 100 * 1024 * 1024]
+SUMMARY_QUANTILES = [0.5, 0.95, 0.99]
+PROFILE_TOP_FUNCTIONS = 25
+
+# phases of a run, timed separately from the requests they make
+PHASE_FETCH = "fetch"
+PHASE_PARSE = "parse"
+PHASE_QUERY = "query"
+PHASE_WRITE = "write"
+
+# additional global variables
+ENDPOINT_ID_PATTERN = re.compile(r"(?<!/api)/\d+(?=/|$)")  # numeric path segments, except the API version
+ENDPOINT_ISSUE_PATTERN = re.compile(r"/issue/[^/]+")
+ENDPOINT_ID_TEMPLATE = "/{id}"
+ENDPOINT_ISSUE_TEMPLATE = "/issue/{key}"
+FILE_READ_MODE = "r"
+FILE_WRITE_MODE = "w"
+INFINITY_LABEL = "+Inf"
+JSON_SUMMARY_EXTENSION = ".json"
+PROFILE_EXTENSION = ".prof"
+PROFILE_SORT_KEY = "cumulative"
+PROMETHEUS_EXTENSION = ".prom"
+STATUS_ERROR = "error"
+TEMPORARY_SUFFIX = ".tmp"
+
+# console log messages
+LOG_METRICS_SUMMARY = ("Made {requests} Jira requests ({retries} retried) spending {request_seconds:.1f} seconds in "
+                       "Jira; phases: {phases}. Metrics written to {json_filename} and {prometheus_filename}.")
+LOG_PROFILE_WRITTEN = "Profile of the main thread written to {filename} (view with: python -m pstats {filename})."
+
+
+class Histogram:
+    """
+    A cumulative histogram with fixed bucket bounds, like a Prometheus histogram, that also estimates quantiles.
+    """
+
+    def __init__(self, bounds):
+        """
+        :param bounds: Sorted list of the bucket upper bounds; an implicit +Inf bucket follows the last one.
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """
+        Count a value into its bucket.
+        :param value: The observed value (for example, seconds or bytes).
+        :return: None
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, quantile):
+        """
+        Estimate a quantile by linear interpolation within its bucket, the way Prometheus' histogram_quantile does,
+        capped at the largest observed value.
+        :param quantile: The quantile, between 0 and 1 (for example, 0.95).
+        :return: The estimated value, or 0.0 without observations.
+        """
+        if not self.count:
+            return 0.0
+        rank = quantile * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - cumulative) / bucket_count, self.max)
+            cumulative += bucket_count
+        return self.max
+
+    def cumulative_counts(self):
+        """
+        List the cumulative bucket counts with their upper bound labels, for the Prometheus exposition format.
+        :return: List of (upper bound label, cumulative count) tuples, ending with the +Inf bucket.
+        """
+        labels = [repr(float(bound)) for bound in self.bounds] + [INFINITY_LABEL]
+        cumulative = 0
+        buckets = []
+        for label, bucket_count in zip(labels, self.counts):
+            cumulative += bucket_count
+            buckets.append((label, cumulative))
+        return buckets
+
+    def to_dict(self):
+        """
+        Summarize the histogram for the JSON report.
+        :return: Dictionary of the count, sum, max, and estimated quantiles.
+        """
+        return {"count": self.count, "sum": self.sum, "max": self.max,
+                **{f"p{round(quantile * 100)}": self.quantile(quantile) for quantile in SUMMARY_QUANTILES}}
+
+
+class EndpointMetrics:
+    """
+    The request metrics of one (method, endpoint) pair.
+    """
+
+    def __init__(self):
+        """
+        Start with empty histograms and counters.
+        """
+        self.latency = Histogram(LATENCY_BUCKETS_SECONDS)
+        self.response_size = Histogram(SIZE_BUCKETS_BYTES)
+        self.statuses = Counter()
+        self.retries = 0
+        self.wall_seconds = 0.0
+
+
+class RunMetrics:
+    """
+    The thread-safe request and phase metrics of a script run: per endpoint latency and response size histograms,
+    status code counters (including the responses that got retried) and retry counts for every request made through
+    JiraClient, and accumulated wall time per phase. Written out as a JSON summary and a Prometheus textfile (for
+    node_exporter's textfile collector) when the run exits.
+    """
+
+    def __init__(self, run_name=RUN_NAME):
+        """
+        :param run_name: Name of the run for the report file names and the 'script' label, by default the script's.
+        """
+        self.run_name = run_name
+        self.start_time = time.monotonic()
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.phase_seconds = Counter()
+        self.phase_calls = Counter()
+
+    @staticmethod
+    def get_endpoint(url):
+        """
+        Turn a request URL into a low cardinality endpoint label, replacing issue keys and numeric IDs.
+        :param url: Full request URL.
+        :return: The endpoint path template (for example, "/rest/api/2/issue/{key}").
+        """
+        path = ENDPOINT_ISSUE_PATTERN.sub(ENDPOINT_ISSUE_TEMPLATE, urlparse(url).path)
+        return ENDPOINT_ID_PATTERN.sub(ENDPOINT_ID_TEMPLATE, path)
+
+    def get_endpoint_metrics(self, method, url):
+        """
+        Get (creating if needed) the metrics of a request's endpoint; the caller holds the lock.
+        :param method: HTTP method of the request.
+        :param url: Full request URL.
+        :return: The EndpointMetrics.
+        """
+        key = (method, self.get_endpoint(url))
+        if key not in self.endpoints:
+            self.endpoints[key] = EndpointMetrics()
+        return self.endpoints[key]
+
+    def record_response(self, method, url, response, wall_seconds, streamed=False):
+        """
+        Record a completed request: the latency of its final attempt, its status codes (including the ones that got
+        retried), its retries, the time spent on it including retries and backoff, and its size on the wire.
+        :param method: HTTP method of the request.
+        :param url: Full request URL.
+        :param response: The final requests.Response.
+        :param wall_seconds: Time the request took, including retries and backoff.
+        :param streamed: Whether the body has not been read yet; its size then gets recorded by record_response_size.
+        :return: None
+        """
+        retries = getattr(response.raw, "retries", None)
+        history = retries.history if retries else ()
+        self.record_request(method, url, response.status_code, response.elapsed.total_seconds(), wall_seconds,
+                            [attempt.status for attempt in history], None if streamed else get_response_size(response))
+
+    def record_request(self, method, url, status_code, latency_seconds, wall_seconds, retried_statuses=(), size=None):
+        """
+        Record a completed request from its parts, for clients other than requests (such as the aiohttp one).
+        :param method: HTTP method of the request.
+        :param url: Full request URL.
+        :param status_code: Status code of the final response.
+        :param latency_seconds: Latency of the final attempt.
+        :param wall_seconds: Time the request took, including retries and backoff.
+        :param retried_statuses: Status codes of the attempts that got retried (None for a connection error).
+        :param size: (Optional) Size of the response body in bytes, when it has been read.
+        :return: None
+        """
+        with self.lock:
+            metrics = self.get_endpoint_metrics(method, url)
+            metrics.latency.observe(latency_seconds)
+            metrics.wall_seconds += wall_seconds
+            metrics.retries += len(retried_statuses)
+            metrics.statuses[str(status_code)] += 1
+            for status in retried_statuses:
+                metrics.statuses[str(status or STATUS_ERROR)] += 1
+            if size is not None:
+                metrics.response_size.observe(size)
+
+    def record_response_size(self, method, url, size):
+        """
+        Record the size of a streamed response once its body has been read.
+        :param method: HTTP method of the request.
+        :param url: Full request URL.
+        :param size: Number of bytes read from the wire.
+        :return: None
+        """
+        with self.lock:
+            self.get_endpoint_metrics(method, url).response_size.observe(size)
+
+    def record_error(self, method, url, wall_seconds):
+        """
+        Record a request that failed without a response (for example, a connection error after all retries).
+        :param method: HTTP method of the request.
+        :param url: Full request URL.
+        :param wall_seconds: Time the request took until it failed.
+        :return: None
+        """
+        with self.lock:
+            metrics = self.get_endpoint_metrics(method, url)
+            metrics.wall_seconds += wall_seconds
+            metrics.statuses[STATUS_ERROR] += 1
+
+    def add_phase_time(self, phase, seconds):
+        """
+        Add time to a phase, for code that measures it itself.
+        :param phase: Name of the phase (for example, PHASE_PARSE).
+        :param seconds: Time spent in the phase.
+        :return: None
+        """
+        with self.lock:
+            self.phase_seconds[phase] += seconds
+            self.phase_calls[phase] += 1
+
+    @contextmanager
+    def phase(self, phase):
+        """
+        Time a block of code as part of a phase of the run.
+        :param phase: Name of the phase (for example, PHASE_FETCH).
+        :return: Context manager.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase_time(phase, time.perf_counter() - start_time)
+
+    def get_matching_metrics(self, method=None, url=None):
+        """
+        Collect the metrics of the endpoints matching a method and URL; the caller holds the lock.
+        :param method: (Optional) Only match the requests with this HTTP method.
+        :param url: (Optional) Only match the requests to this URL's endpoint.
+        :return: List of the matching EndpointMetrics.
+        """
+        endpoint = self.get_endpoint(url) if url else None
+        return [metrics for (request_method, request_endpoint), metrics in self.endpoints.items()
+                if method in (None, request_method) and endpoint in (None, request_endpoint)]
+
+    def get_request_count(self, method=None, url=None):
+        """
+        Count the run's requests, not counting their retries.
+        :param method: (Optional) Only count the requests with this HTTP method.
+        :param url: (Optional) Only count the requests to this URL's endpoint.
+        :return: The number of requests.
+        """
+        with self.lock:
+            return sum(sum(metrics.statuses.values()) - metrics.retries
+                       for metrics in self.get_matching_metrics(method, url))
+
+    def get_request_seconds(self, method=None, url=None):
+        """
+        Average the time the run's requests took, retries and backoff included, for example to estimate how long
+        more of them will take.
+        :param method: (Optional) Only average the requests with this HTTP method.
+        :param url: (Optional) Only average the requests to this URL's endpoint.
+        :return: The average seconds per request, or None when no such request got made.
+        """
+        with self.lock:
+            matching = self.get_matching_metrics(method, url)
+            requests = sum(sum(metrics.statuses.values()) - metrics.retries for metrics in matching)
+            return sum(metrics.wall_seconds for metrics in matching) / requests if requests else None
+
+    @contextmanager
+    def separate_run(self, run_name):
+        """
+        Report the requests and phases of a block of code as a run of its own under another name, for example to keep
+        them out of the reports of the script's regular runs. The block's reports get written when it ends, and the
+        metrics from before it carry on under their own name afterwards.
+        :param run_name: Name of the block's run for its report file names and 'script' label.
+        :return: Context manager.
+        """
+        with self.lock:
+            outer_run = (self.run_name, self.start_time, self.endpoints, self.phase_seconds, self.phase_calls)
+            self.run_name, self.start_time = run_name, time.monotonic()
+            self.endpoints, self.phase_seconds, self.phase_calls = {}, Counter(), Counter()
+        try:
+            yield
+        finally:
+            self.write_reports()
+            with self.lock:
+                self.run_name, self.start_time, self.endpoints, self.phase_seconds, self.phase_calls = outer_run
+
+    def summary(self):
+        """
+        Summarize the run's metrics for the JSON report.
+        :return: Dictionary of the run, per endpoint, and per phase metrics.
+        """
+        with self.lock:
+            endpoints = [
+                {"method": method, "endpoint": endpoint, "requests": sum(metrics.statuses.values()) - metrics.retries,
+                 "retries": metrics.retries, "wall_seconds": metrics.wall_seconds,
+                 "statuses": dict(metrics.statuses), "latency_seconds": metrics.latency.to_dict(),
+                 "response_bytes": metrics.response_size.to_dict()}
+                for (method, endpoint), metrics in sorted(self.endpoints.items())
+            ]
+            phases = {phase: {"seconds": seconds, "calls": self.phase_calls[phase]}
+                      for phase, seconds in sorted(self.phase_seconds.items())}
+        return {"script": self.run_name, "duration_seconds": time.monotonic() - self.start_time,
+                "requests": sum(endpoint["requests"] for endpoint in endpoints),
+                "retries": sum(endpoint["retries"] for endpoint in endpoints),
+                "request_seconds": sum(endpoint["wall_seconds"] for endpoint in endpoints),
+                "endpoints": endpoints, "phases": phases}
+
+    def to_prometheus(self):
+        """
+        Render the run's metrics in the Prometheus text exposition format.
+        :return: The textfile content.
+        """
+        script = f'script="{self.run_name}"'
+        lines = [
+            "# HELP jira_request_duration_seconds Latency of the final attempt of each Jira request.",
+            "# TYPE jira_request_duration_seconds histogram",
+        ]
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            for (method, endpoint), metrics in endpoints:
+                labels = f'{script},method="{method}",endpoint="{endpoint}"'
+                for bound, count in metrics.latency.cumulative_counts():
+                    lines.append(f'jira_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"jira_request_duration_seconds_sum{{{labels}}} {metrics.latency.sum}")
+                lines.append(f"jira_request_duration_seconds_count{{{labels}}} {metrics.latency.count}")
+
+            lines += ["# HELP jira_response_size_bytes Size on the wire of each Jira response body.",
+                      "# TYPE jira_response_size_bytes histogram"]
+            for (method, endpoint), metrics in endpoints:
+                labels = f'{script},method="{method}",endpoint="{endpoint}"'
+                for bound, count in metrics.response_size.cumulative_counts():
+                    lines.append(f'jira_response_size_bytes_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"jira_response_size_bytes_sum{{{labels}}} {metrics.response_size.sum}")
+                lines.append(f"jira_response_size_bytes_count{{{labels}}} {metrics.response_size.count}")
+
+            lines += ["# HELP jira_responses_total Jira responses by status code, including retried ones.",
+                      "# TYPE jira_responses_total counter"]
+            for (method, endpoint), metrics in endpoints:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(f'jira_responses_total{{{script},method="{method}",endpoint="{endpoint}",'
+                                 f'status="{status}"}} {count}')
+
+            lines += ["# HELP jira_request_retries_total Jira request attempts that got retried.",
+                      "# TYPE jira_request_retries_total counter"]
+            for (method, endpoint), metrics in endpoints:
+                lines.append(f'jira_request_retries_total{{{script},method="{method}",endpoint="{endpoint}"}} '
+                             f"{metrics.retries}")
+
+            lines += ["# HELP jira_request_wall_seconds_total Time spent in Jira requests, including retries.",
+                      "# TYPE jira_request_wall_seconds_total counter"]
+            for (method, endpoint), metrics in endpoints:
+                lines.append(f'jira_request_wall_seconds_total{{{script},method="{method}",endpoint="{endpoint}"}} '
+                             f"{metrics.wall_seconds}")
+
+            lines += ["# HELP jira_phase_seconds_total Time spent per phase of the run.",
+                      "# TYPE jira_phase_seconds_total counter"]
+            for phase, seconds in sorted(self.phase_seconds.items()):
+                lines.append(f'jira_phase_seconds_total{{{script},phase="{phase}"}} {seconds}')
+
+        lines += ["# HELP jira_run_duration_seconds Duration of the run.",
+                  "# TYPE jira_run_duration_seconds gauge",
+                  f"jira_run_duration_seconds{{{script}}} {time.monotonic() - self.start_time}",
+                  "# HELP jira_run_timestamp_seconds Time the run ended.",
+                  "# TYPE jira_run_timestamp_seconds gauge",
+                  f"jira_run_timestamp_seconds{{{script}}} {time.time()}"]
+        return "\n".join(lines) + "\n"
+
+    def write_reports(self, directory=METRICS_DIRECTORY):
+        """
+        Write the JSON summary and the Prometheus textfile of the run (atomically, so a collector never reads half a
+        file), and log a one line summary. Does nothing when no directory is configured or no request got made.
+        :param directory: Directory for the report files.
+        :return: None
+        """
+        if not directory or not self.endpoints:
+            return
+        summary = self.summary()
+        os.makedirs(directory, exist_ok=True)
+        json_filename = os.path.join(directory, f"{self.run_name}{JSON_SUMMARY_EXTENSION}")
+        prometheus_filename = os.path.join(directory, f"{self.run_name}{PROMETHEUS_EXTENSION}")
+        write_file_atomically(json_filename, json.dumps(summary, indent=2))
+        write_file_atomically(prometheus_filename, self.to_prometheus())
+
+        phases = ", ".join(f"{phase} {metrics['seconds']:.1f}s" for phase, metrics in summary["phases"].items())
+        print(LOG_METRICS_SUMMARY.format(requests=summary["requests"], retries=summary["retries"],
+                                         request_seconds=summary["request_seconds"], phases=phases or "none",
+                                         json_filename=json_filename, prometheus_filename=prometheus_filename))
+
+
+def load_request_seconds(method, url, run_name=RUN_NAME, directory=METRICS_DIRECTORY):
+    """
+    Average the time an endpoint's requests took, retries and backoff included, in the last reported run of a script.
+    :param method: HTTP method of the requests.
+    :param url: A request URL of the endpoint.
+    :param run_name: Name of the run whose JSON summary to read, by default the script's.
+    :param directory: Directory of the report files.
+    :return: The average seconds per request, or None when there is no report or it made no such request.
+    """
+    if not directory:
+        return None
+    try:
+        with open(os.path.join(directory, f"{run_name}{JSON_SUMMARY_EXTENSION}"), FILE_READ_MODE) as summary_file:
+            summary = json.load(summary_file)
+    except (OSError, ValueError):
+        return None
+    endpoint = RunMetrics.get_endpoint(url)
+    for metrics in summary.get("endpoints", []):
+        if metrics["method"] == method and metrics["endpoint"] == endpoint and metrics["requests"]:
+            return metrics["wall_seconds"] / metrics["requests"]
+    return None
+
+
+def get_response_size(response):
+    """
+    Get the number of bytes a fully read response body took on the wire (before gzip decoding, when available).
+    :param response: A requests.Response whose body has been read.
+    :return: The size in bytes.
+    """
+    tell = getattr(response.raw, "tell", None)
+    size = tell() if tell else 0
+    return size or len(response.content or b"")
+
+
+def write_file_atomically(filename, content):
+    """
+    Write a text file through a temporary file and a rename, so readers only ever see a complete file.
+    :param filename: Path of the file.
+    :param content: The text to write.
+    :return: None
+    """
+    temporary_filename = f"{filename}{TEMPORARY_SUFFIX}"
+    with open(temporary_filename, FILE_WRITE_MODE) as temporary_file:
+        temporary_file.write(content)
+    os.replace(temporary_filename, filename)
+
+
+def start_profiler():
+    """
+    Start profiling the main thread with cProfile, writing the stats to the metrics directory at exit and printing the
+    functions with the most cumulative time. Worker threads are not covered, since cProfile profiles one thread.
+    :return: None
+    """
+    profiler = cProfile.Profile()
+
+    def write_profile():
+        profiler.disable()
+        os.makedirs(METRICS_DIRECTORY or os.curdir, exist_ok=True)
+        filename = os.path.join(METRICS_DIRECTORY or os.curdir, f"{RUN_NAME}{PROFILE_EXTENSION}")
+        profiler.dump_stats(filename)
+        pstats.Stats(profiler).sort_stats(PROFILE_SORT_KEY).print_stats(PROFILE_TOP_FUNCTIONS)
+        print(LOG_PROFILE_WRITTEN.format(filename=filename))
+
+    atexit.register(write_profile)
+    profiler.enable()
+
+
+# the one set of metrics every request of the run goes into, reported when the run exits (even through sys.exit)
+METRICS = RunMetrics()
+atexit.register(METRICS.write_reports)
+if PROFILE_ENABLED:
+    start_profiler()
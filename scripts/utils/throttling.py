@@ -0,0 +1,278 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from http import HTTPStatus
+from utils.run_metrics import LATENCY_BUCKETS_SECONDS, Histogram
+
+# key global variables
+THROTTLE_ENABLED = os.getenv("JIRA_ADAPTIVE_THROTTLE", "1") != "0"
+LATENCY_SLO_SECONDS = float(os.getenv("JIRA_LATENCY_SLO_MS", "2000")) / 1000  # target p95 latency of a request
+# target p95 latency of a search page, which takes longer the more issues and fields it returns
+SEARCH_LATENCY_SLO_SECONDS = float(os.getenv("JIRA_SEARCH_LATENCY_SLO_MS", "10000")) / 1000
+THROTTLE_INITIAL_LIMIT = int(os.getenv("JIRA_THROTTLE_INITIAL", "2"))
+THROTTLE_MAX_LIMIT = int(os.getenv("JIRA_THROTTLE_MAX", "16"))
+THROTTLE_MAINTENANCE_MAX_LIMIT = int(os.getenv("JIRA_THROTTLE_MAINTENANCE_MAX", "64"))
+# local times when Jira is quiet enough for the higher ceiling, for example "Sat-Sun 00:00-24:00, Mon-Fri 22:00-06:00"
+MAINTENANCE_WINDOWS = os.getenv("JIRA_MAINTENANCE_WINDOWS", "")
+THROTTLE_WINDOW_REQUESTS = int(os.getenv("JIRA_THROTTLE_WINDOW", "20"))  # completed requests per adjustment
+THROTTLE_ERROR_RATE = float(os.getenv("JIRA_THROTTLE_ERROR_RATE", "0.1"))  # tolerated share of 429/503/failed requests
+
+# AIMD settings
+DECREASE_FACTOR = 0.5
+LATENCY_QUANTILE = 0.95
+PAUSE_MIN_SECONDS = 0.1
+PAUSE_MAX_SECONDS = 10.0
+THROTTLE_STATUS_CODES = {HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE}  # both tell us to back off
+WAIT_POLL_SECONDS = 0.01
+
+# additional global variables
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+MAINTENANCE_WINDOW_PATTERN = re.compile(
+    r"^\s*(?P<first_day>[a-z]{3})(?:-(?P<last_day>[a-z]{3}))?\s+(?P<start>\d{1,2}:\d{2})-(?P<end>\d{1,2}:\d{2})\s*$",
+    re.IGNORECASE)
+MINUTES_PER_DAY = 24 * 60
+REQUEST_KIND_SEARCH = "search"  # a page of issues from the search endpoint
+REQUEST_KIND_OTHER = "other"  # every other request, for example an update, a count query or metadata
+REQUEST_KINDS = [REQUEST_KIND_SEARCH, REQUEST_KIND_OTHER]
+
+# console error and log messages
+ERROR_MSG_MAINTENANCE_WINDOW = ("Invalid maintenance window '{window}' in JIRA_MAINTENANCE_WINDOWS; expected for "
+                                "example 'Mon-Fri 22:00-06:00'")
+WARNING_MAINTENANCE_WINDOWS_IGNORED = "Warning: {error}; ignoring the maintenance windows."
+LOG_THROTTLE_DECREASED = ("Jira is under pressure (p95 {p95:.2f}s against a {slo:.2f}s SLO, {throttled} throttled or "
+                          "failed of {count}); lowering concurrency to {limit}{pause}...")
+LOG_THROTTLE_INCREASED = "Jira is keeping up (p95 {p95:.2f}s); raising concurrency to {limit}..."
+LOG_THROTTLE_PAUSE_DROPPED = "Jira is keeping up (p95 {p95:.2f}s); no longer pausing between requests..."
+LOG_THROTTLE_PAUSE_SHORTENED = "Jira is keeping up (p95 {p95:.2f}s); pausing {seconds:.1f}s between requests..."
+LOG_THROTTLE_PAUSE = ", pausing {seconds:.1f}s between requests"
+
+
+def parse_minutes(clock_time):
+    """
+    Turn an "HH:MM" clock time into minutes since midnight; "24:00" is the end of the day.
+    :param clock_time: The clock time.
+    :return: Minutes since midnight.
+    """
+    hours, minutes = clock_time.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def parse_maintenance_windows(schedule):
+    """
+    Parse a maintenance window schedule: comma-separated "<day>[-<day>] HH:MM-HH:MM" entries in local time, where a
+    window ending before it starts runs past midnight into the next day.
+    :param schedule: The schedule, for example "Sat-Sun 00:00-24:00, Mon-Fri 22:00-06:00".
+    :return: List of (set of weekday numbers, start minute, end minute) tuples.
+    """
+    windows = []
+    for window in filter(str.strip, schedule.split(",")):
+        match = MAINTENANCE_WINDOW_PATTERN.match(window)
+        if (not match or match["first_day"].lower() not in DAY_NAMES
+                or (match["last_day"] and match["last_day"].lower() not in DAY_NAMES)):
+            raise ValueError(ERROR_MSG_MAINTENANCE_WINDOW.format(window=window.strip()))
+        first_day = DAY_NAMES.index(match["first_day"].lower())
+        last_day = DAY_NAMES.index((match["last_day"] or match["first_day"]).lower())
+        days = {(first_day + offset) % 7 for offset in range((last_day - first_day) % 7 + 1)}
+        start, end = parse_minutes(match["start"]), parse_minutes(match["end"])
+        if not (0 <= start <= MINUTES_PER_DAY and 0 <= end <= MINUTES_PER_DAY):
+            raise ValueError(ERROR_MSG_MAINTENANCE_WINDOW.format(window=window.strip()))
+        windows.append((days, start, end))
+    return windows
+
+
+def is_in_maintenance_window(windows, now=None):
+    """
+    Decide whether a time falls into one of the maintenance windows.
+    :param windows: List of windows from parse_maintenance_windows.
+    :param now: (Optional) The local datetime to check, the current time by default.
+    :return: True if the time is inside a window, otherwise False.
+    """
+    now = now or datetime.now()
+    weekday, minute = now.weekday(), now.hour * 60 + now.minute
+    for days, start, end in windows:
+        if start <= end and weekday in days and start <= minute < end:
+            return True
+        if start > end and ((weekday in days and minute >= start) or ((weekday - 1) % 7 in days and minute < end)):
+            return True
+    return False
+
+
+class AdaptiveThrottle:
+    """
+    A thread-safe AIMD (additive increase, multiplicative decrease) limit on the number of Jira requests in flight,
+    shared by every request of the run whatever client or worker pool sends it. After every window of completed
+    requests it compares their p95 latency with the latency SLO of their kind (search pages get a looser one than
+    the rest, as big pages are slow without Jira being under pressure) and the share of throttled (429),
+    unavailable (503) and failed ones with the tolerated error rate: when Jira keeps up and the limit got used, the
+    limit grows by one up to the ceiling (a higher one inside a maintenance window), and when it falls behind, the
+    limit halves. At a limit of one, a pause between requests keeps doubling instead, so even serial traffic such as
+    search paging backs off. The ceilings are never below the number of workers a run asks for, see fit_workers.
+    """
+
+    def __init__(self, initial_limit=THROTTLE_INITIAL_LIMIT, max_limit=THROTTLE_MAX_LIMIT,
+                 maintenance_max_limit=THROTTLE_MAINTENANCE_MAX_LIMIT, latency_slo_seconds=LATENCY_SLO_SECONDS,
+                 search_latency_slo_seconds=SEARCH_LATENCY_SLO_SECONDS, maintenance_windows=MAINTENANCE_WINDOWS,
+                 window_requests=THROTTLE_WINDOW_REQUESTS, error_rate=THROTTLE_ERROR_RATE, enabled=THROTTLE_ENABLED):
+        """
+        :param initial_limit: Number of requests allowed in flight at the start.
+        :param max_limit: Ceiling of the limit outside the maintenance windows.
+        :param maintenance_max_limit: Ceiling of the limit inside the maintenance windows.
+        :param latency_slo_seconds: Target p95 latency of a request other than a search page.
+        :param search_latency_slo_seconds: Target p95 latency of a search page.
+        :param maintenance_windows: Maintenance window schedule, see parse_maintenance_windows.
+        :param window_requests: Number of completed requests between adjustments.
+        :param error_rate: Share of a window's requests that may get throttled or fail before the limit comes down.
+        :param enabled: Whether to limit at all; when False, acquire and release do nothing.
+        """
+        self.enabled = enabled
+        self.max_limit = max(1, max_limit)
+        self.maintenance_max_limit = max(1, maintenance_max_limit)
+        self.maintenance_windows = maintenance_windows
+        self.windows = None  # parsed on first use, see get_windows
+        self.limit = max(1, min(initial_limit, self.max_limit))
+        self.latency_slos = {REQUEST_KIND_SEARCH: search_latency_slo_seconds, REQUEST_KIND_OTHER: latency_slo_seconds}
+        self.window_requests = max(1, window_requests)
+        self.error_rate = error_rate
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.pause_seconds = 0.0
+        self.next_start_time = 0.0
+        self.reset_window()
+
+    def reset_window(self):
+        """
+        Start a new adjustment window; the caller holds the condition's lock (or is the constructor).
+        :return: None
+        """
+        self.latencies = {kind: Histogram(LATENCY_BUCKETS_SECONDS) for kind in REQUEST_KINDS}
+        self.request_count = 0
+        self.throttled_count = 0
+        self.saturated = False
+
+    def get_windows(self):
+        """
+        Parse the maintenance window schedule the first time it is needed; a schedule that doesn't parse gets reported
+        and ignored, so it neither stops the run nor fails a request.
+        :return: List of windows from parse_maintenance_windows.
+        """
+        if self.windows is None:
+            try:
+                self.windows = parse_maintenance_windows(self.maintenance_windows)
+            except ValueError as schedule_error:
+                print(WARNING_MAINTENANCE_WINDOWS_IGNORED.format(error=schedule_error))
+                self.windows = []
+        return self.windows
+
+    def get_ceiling(self):
+        """
+        :return: The highest limit allowed right now, depending on whether a maintenance window is open.
+        """
+        return self.maintenance_max_limit if is_in_maintenance_window(self.get_windows()) else self.max_limit
+
+    def fit_workers(self, workers):
+        """
+        Make room for the number of requests a run asks to keep in flight (its --workers): the limit starts there
+        unless it is already higher, and neither ceiling stays below it, so the throttle only ever lowers the
+        concurrency asked for when Jira falls behind.
+        :param workers: Number of requests the run keeps in flight at once.
+        :return: None
+        """
+        with self.condition:
+            self.max_limit = max(self.max_limit, workers)
+            self.maintenance_max_limit = max(self.maintenance_max_limit, workers)
+            self.limit = max(self.limit, min(workers, self.get_ceiling()))
+
+    def try_acquire(self):
+        """
+        Take a slot if one is free and no pause is pending.
+        :return: 0 when a slot got taken, otherwise the number of seconds to wait before trying again.
+        """
+        with self.condition:
+            now = time.monotonic()
+            if now < self.next_start_time:
+                return self.next_start_time - now
+            if self.in_flight >= self.limit:
+                return WAIT_POLL_SECONDS
+            self.in_flight += 1
+            self.saturated = self.saturated or self.in_flight >= self.limit
+            self.next_start_time = now + self.pause_seconds
+            return 0
+
+    def acquire(self):
+        """
+        Block until the request may start.
+        :return: None
+        """
+        if not self.enabled:
+            return
+        while wait_seconds := self.try_acquire():
+            with self.condition:
+                self.condition.wait(wait_seconds)
+
+    async def acquire_async(self):
+        """
+        Wait on the event loop until the request may start.
+        :return: None
+        """
+        if not self.enabled:
+            return
+        while wait_seconds := self.try_acquire():
+            await asyncio.sleep(wait_seconds)
+
+    def release(self, latency_seconds, status_codes, kind=REQUEST_KIND_OTHER):
+        """
+        Free the request's slot, recording how it went, and adjust the limit once the window is complete.
+        :param latency_seconds: Latency of the request's final attempt.
+        :param status_codes: Status codes of all its attempts, None for an attempt that failed without a response.
+        :param kind: (Optional) One of REQUEST_KINDS, choosing the latency SLO the request gets held to.
+        :return: None
+        """
+        if not self.enabled:
+            return
+        with self.condition:
+            self.in_flight -= 1
+            self.latencies[kind].observe(latency_seconds)
+            self.request_count += 1
+            if any(status is None or status in THROTTLE_STATUS_CODES for status in status_codes):
+                self.throttled_count += 1
+            if self.request_count >= self.window_requests:
+                self.adjust()
+            self.condition.notify_all()
+
+    def adjust(self):
+        """
+        Apply the additive increase or multiplicative decrease for the completed window; the caller holds the
+        condition's lock.
+        :return: None
+        """
+        # the kind of request furthest over (or closest to) its latency SLO speaks for the window
+        kind = max((kind for kind in REQUEST_KINDS if self.latencies[kind].count),
+                   key=lambda kind: self.latencies[kind].quantile(LATENCY_QUANTILE) / self.latency_slos[kind])
+        p95, slo = self.latencies[kind].quantile(LATENCY_QUANTILE), self.latency_slos[kind]
+        count = self.request_count
+        ceiling = self.get_ceiling()
+        if self.throttled_count > self.error_rate * count or p95 > slo:
+            if self.limit > 1:
+                self.limit = max(1, int(self.limit * DECREASE_FACTOR))
+            else:
+                self.pause_seconds = min(PAUSE_MAX_SECONDS, max(PAUSE_MIN_SECONDS, self.pause_seconds * 2))
+            pause = LOG_THROTTLE_PAUSE.format(seconds=self.pause_seconds) if self.pause_seconds else ""
+            print(LOG_THROTTLE_DECREASED.format(p95=p95, slo=slo, throttled=self.throttled_count, count=count,
+                                                limit=self.limit, pause=pause))
+        elif self.pause_seconds:
+            self.pause_seconds = self.pause_seconds / 2 if self.pause_seconds > PAUSE_MIN_SECONDS else 0.0
+            print(LOG_THROTTLE_PAUSE_SHORTENED.format(p95=p95, seconds=self.pause_seconds) if self.pause_seconds
+                  else LOG_THROTTLE_PAUSE_DROPPED.format(p95=p95))
+        elif self.limit > ceiling:
+            self.limit = ceiling  # a maintenance window closed
+        elif self.saturated and self.limit < ceiling:
+            self.limit += 1
+            print(LOG_THROTTLE_INCREASED.format(p95=p95, limit=self.limit))
+        self.reset_window()
+
+
+# the one limit every Jira request of the run goes through, whichever client sends it
+THROTTLE = AdaptiveThrottle()